@@ -0,0 +1,76 @@
+# Run from the repository root: python -m benchmarks.asset_pipeline_benchmark
+import time
+
+from functools import partial
+
+from engine3d.actor import Actor
+from engine3d.assets import AssetPipeline
+from engine3d.mesh_cache import mesh_cache
+from engine3d.meshes import gen_sphere_lods
+from engine3d.textures import decode_texture
+
+
+TEXTURES = ("assets/textures/sun_texture.png", "assets/textures/earth_planet_texture.png",
+            "assets/textures/mars_planet_texture.png")
+PLANETS = ((3.1, (128, 48, 16)), (0.8, (256, 64, 16)), (1.6, (256, 64, 16)), (2.4, (192, 48, 16)))
+FRAME_BUDGET = 0.004
+
+
+def release(actors: list):
+    for actor in actors:
+        actor.release()
+    assert len(mesh_cache) == 0
+
+
+def load_serial():
+    # What game.py did before: everything on the main thread, which cannot present frames meanwhile
+    images = [decode_texture(file) for file in TEXTURES]
+    actors = []
+    for radius, segments in PLANETS:
+        actor = Actor(position=(0, 0, 0), rotation=(0, 0, 0), mesh=gen_sphere_lods(radius=radius, segments=segments),
+                      texture=None, collision=True)
+        for resource in actor.lod_resources:
+            resource.build_vertex_buffers()
+        actors.append(actor)
+    return images, actors
+
+
+def load_pipeline(processes: bool):
+    # The GL steps are left out (no context here), the loop stands in for frames calling process_uploads()
+    pipeline = AssetPipeline(processes=processes)
+    images = [pipeline.submit(decode_texture, file) for file in TEXTURES]
+    actors = [pipeline.add_actor(partial(gen_sphere_lods, radius=radius, segments=segments), position=(0, 0, 0),
+                                 rotation=(0, 0, 0), collision=True) for radius, segments in PLANETS]
+
+    frames = 0
+    longest_frame = 0.0
+    while pipeline.busy:
+        start = time.perf_counter()
+        pipeline.process_uploads(budget=FRAME_BUDGET)
+        longest_frame = max(longest_frame, time.perf_counter() - start)
+        frames += 1
+        time.sleep(0.001)
+
+    pipeline.shutdown()
+    return [image.result() for image in images], [actor.result() for actor in actors], frames, longest_frame
+
+
+def main():
+    start = time.perf_counter()
+    images, actors = load_serial()
+    serial = time.perf_counter() - start
+    release(actors)
+    print(f"serial: {serial * 1000:.0f} ms, main thread blocked for all of it")
+
+    for processes in (False, True):
+        start = time.perf_counter()
+        pipeline_images, actors, frames, longest_frame = load_pipeline(processes)
+        elapsed = time.perf_counter() - start
+        assert [image.levels[0][2] for image in pipeline_images] == [image.levels[0][2] for image in images]
+        release(actors)
+        print(f"pipeline ({'processes' if processes else 'threads'}): {elapsed * 1000:.0f} ms over {frames} frames, "
+              f"longest main-thread step {longest_frame * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
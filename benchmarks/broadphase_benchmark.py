@@ -0,0 +1,64 @@
+# Run from the repository root: python -m benchmarks.broadphase_benchmark
+import time
+import random
+
+from pygame.math import Vector3
+
+from engine3d.actor import Actor
+from engine3d.broadphase import BruteForce, SweepAndPrune, SpatialHashGrid
+from engine3d.physics import PhysicsEngine
+from engine3d.meshes import gen_cube
+
+
+BODY_COUNTS = (100, 1000, 5000, 10000)
+BRUTE_FORCE_LIMIT = 2000
+STEPS = 20
+
+
+def create_scene(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    world_size = (count ** (1 / 3)) * 6
+    mesh = gen_cube(0.5, 0.5, 0.5)
+
+    actors = []
+    for _ in range(count):
+        actor = Actor(
+            position=(rng.uniform(0, world_size), rng.uniform(0, world_size), rng.uniform(0, world_size)),
+            rotation=(0, 0, 0),
+            mesh=mesh,
+            texture=1,
+            collision=True,
+            physic=True
+        )
+        actor.velocity = Vector3(rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-1, 1))
+        actors.append(actor)
+    return actors
+
+
+def run(broad_phase, actors):
+    physics = PhysicsEngine(broad_phase=broad_phase)
+    physics.add_objects(actors)
+
+    pair_count = 0
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        for actor in actors:
+            actor.position += actor.velocity * (1 / 60)
+        physics.broad_phase.update()
+        pair_count = len(physics.broad_phase.find_pairs()[0])
+    return (time.perf_counter() - start) / STEPS * 1000, pair_count
+
+
+def main():
+    print(f"{'bodies':>8} {'broad phase':>16} {'ms/step':>10} {'pairs':>8}")
+    for count in BODY_COUNTS:
+        for name, factory in (("brute_force", BruteForce), ("sweep_and_prune", SweepAndPrune),
+                              ("spatial_hash", SpatialHashGrid)):
+            if factory is BruteForce and count > BRUTE_FORCE_LIMIT:
+                continue
+            elapsed, pairs = run(factory(), create_scene(count))
+            print(f"{count:>8} {name:>16} {elapsed:>10.2f} {pairs:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Run from the repository root: python -m benchmarks.collision_shapes_benchmark
+import time
+
+import numpy as np
+
+from engine3d.collision_shapes import CollisionShape, ShapeTable, SHAPE_KINDS
+from engine3d.narrowphase import shape_contacts
+from engine3d.transforms import model_matrices, normalize_quaternions
+
+
+PAIR_COUNT = 20000
+CHECK_COUNT = 2000
+REPEATS = 5
+
+
+def random_shape(kind: str, rng: np.random.Generator) -> CollisionShape:
+    center = rng.uniform(-0.3, 0.3, 3)
+    if kind == "sphere":
+        return CollisionShape.sphere(rng.uniform(0.3, 1.5), center)
+    if kind == "capsule":
+        return CollisionShape.capsule(rng.uniform(0.2, 1.0), rng.uniform(0.0, 1.5), int(rng.integers(3)), center)
+    return CollisionShape.box(rng.uniform(0.2, 1.5, 3), center, oriented=kind == "obb")
+
+
+def create_pairs(kind_1: str, kind_2: str, count: int, rng: np.random.Generator):
+    # Bodies 2k and 2k + 1 form a pair, randomly turned and close enough for their boxes to overlap often
+    shapes = [random_shape(kind, rng) for _ in range(count) for kind in (kind_1, kind_2)]
+    positions = rng.uniform(-2.0, 2.0, (2 * count, 3))
+    positions[::2] = 0.0
+    matrices = model_matrices(positions, normalize_quaternions(rng.normal(size=(2 * count, 4))))
+    first = np.arange(0, 2 * count, 2)
+    return ShapeTable(shapes), matrices, first, first + 1
+
+
+def world_boxes_overlap(table: ShapeTable, matrices: np.ndarray, first: np.ndarray, second: np.ndarray):
+    # What the broad phase bounds of the rotated mesh boxes and the old box-only narrow phase would report
+    centers, rotations, half_extents, half_segments = table.world(matrices)
+    radii = table.radii[:, np.newaxis]
+    extents = np.where((table.kinds == SHAPE_KINDS.index("sphere"))[:, np.newaxis], radii,
+                       np.einsum("nij,nj->ni", np.abs(rotations), half_extents) + np.abs(half_segments) + radii)
+    return np.all(np.abs(centers[second] - centers[first]) <= extents[first] + extents[second], axis=1)
+
+
+def check_separation(table: ShapeTable, matrices: np.ndarray, first: np.ndarray, second: np.ndarray):
+    # Moving the second shape out along the normal by the depth must separate every touching pair, and moving it
+    # half that far must not
+    normals, depths = shape_contacts(table, matrices, first, second)
+    touching = np.flatnonzero(depths > 1e-3)
+    for scale, apart in ((1.0, True), (0.5, False)):
+        moved = matrices.copy()
+        moved[second[touching], :3, 3] += normals[touching] * (depths[touching] * scale + 1e-6 * apart)[:, np.newaxis]
+        _, moved_depths = shape_contacts(table, moved, first[touching], second[touching])
+        wrong = moved_depths > 1e-6 if apart else moved_depths < 0
+        if np.any(wrong):
+            raise SystemExit(f"{np.count_nonzero(wrong)} contacts with a wrong normal or depth")
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'shapes':>16} {'box overlaps':>13} {'touching':>9} {'ms / {} pairs'.format(PAIR_COUNT):>17}")
+    for index, kind_1 in enumerate(SHAPE_KINDS):
+        for kind_2 in SHAPE_KINDS[index:]:
+            check_separation(*create_pairs(kind_1, kind_2, CHECK_COUNT, rng))
+
+            table, matrices, first, second = create_pairs(kind_1, kind_2, PAIR_COUNT, rng)
+            start = time.perf_counter()
+            for _ in range(REPEATS):
+                _, depths = shape_contacts(table, matrices, first, second)
+            elapsed = (time.perf_counter() - start) / REPEATS
+
+            overlapping = np.count_nonzero(world_boxes_overlap(table, matrices, first, second))
+            touching = np.count_nonzero(depths >= 0)
+            print(f"{kind_1 + ' - ' + kind_2:>16} {overlapping:>13} {touching:>9} {elapsed * 1000:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
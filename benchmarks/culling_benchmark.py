@@ -0,0 +1,76 @@
+# Run from the repository root: python -m benchmarks.culling_benchmark
+import time
+import random
+
+from pygame.math import Vector3
+
+from engine3d.actor import Actor
+from engine3d.camera import Camera
+from engine3d.culling import FrustumCuller, Frustum, perspective_matrix
+from engine3d.meshes import gen_cube
+
+
+ACTOR_COUNTS = (1000, 10000, 50000)
+FRAMES = 20
+
+
+def create_scene(count: int, seed: int = 0, static: bool = True):
+    rng = random.Random(seed)
+    world_size = (count ** (1 / 3)) * 8
+    mesh = gen_cube(0.5, 0.5, 0.5)
+    actors = [
+        Actor(
+            position=(rng.uniform(-world_size, world_size), rng.uniform(-world_size, world_size),
+                      rng.uniform(-world_size, world_size)),
+            rotation=(0, 0, 0),
+            mesh=mesh,
+            texture=1,
+            collision=False
+        )
+        for _ in range(count)
+    ]
+    for actor in actors:
+        actor.static = static
+    return actors
+
+
+def main():
+    camera = Camera((0, 0, 0), collision=False)
+    for count in ACTOR_COUNTS:
+        actors = create_scene(count)
+        projection = perspective_matrix(45, 16 / 9, 0.1, 1000)
+
+        results = {}
+        for mode in ("flat", "bvh"):
+            culler = FrustumCuller(mode=mode)
+            culler.cull(actors, Frustum.from_matrix(projection @ camera.view_matrix()))
+
+            visible = []
+            start = time.perf_counter()
+            for frame in range(FRAMES):
+                camera.yaw = -90 + frame * 18
+                camera.rotate(0, 0)
+                frustum = Frustum.from_matrix(projection @ camera.view_matrix())
+                visible.append(set(map(id, culler.cull(actors, frustum))))
+            elapsed = (time.perf_counter() - start) / FRAMES
+            results[mode] = visible
+
+            print(f"{count:>6} actors, {mode:>4}: {elapsed * 1000:7.2f} ms/frame, "
+                  f"drawn {culler.stats.drawn}, culled {culler.stats.culled}, nodes tested {culler.stats.nodes_tested}")
+        camera.yaw = -90
+        camera.rotate(0, 0)
+
+        assert results["flat"] == results["bvh"], "flat and bvh culling disagree"
+
+        # Dynamic actors mixed into the hierarchy mode are tested flat every frame
+        for actor in actors[::10]:
+            actor.static = False
+            actor.position = actor.position + Vector3(1, 0, 0)
+        flat = FrustumCuller(mode="flat")
+        bvh = FrustumCuller(mode="bvh")
+        frustum = Frustum.from_matrix(projection @ camera.view_matrix())
+        assert set(map(id, flat.cull(actors, frustum))) == set(map(id, bvh.cull(actors, frustum)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Run from the repository root: python -m benchmarks.importer_benchmark
+import json
+import os
+import struct
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from engine3d.classes import Mesh
+from engine3d.importers import load_obj, load_gltf
+from engine3d.meshes import gen_sphere
+
+
+SPHERE_SEGMENTS = (128, 256, 512)
+
+
+def legacy_load_obj(file: str) -> Mesh:
+    # Line by line reader building nested Python lists, the reference for the streaming importer
+    positions = []
+    texture_coords = []
+    faces = []
+    corner_uvs = []
+    with open(file, mode="r") as stream:
+        for line in stream:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "v":
+                positions.append([float(value) for value in parts[1:4]])
+            elif parts[0] == "vt":
+                texture_coords.append([float(value) for value in parts[1:3]])
+            elif parts[0] == "f":
+                corners = [[int(field) - 1 for field in corner.split("/")[:2]] for corner in parts[1:]]
+                for index in range(1, len(corners) - 1):
+                    triangle = (corners[0], corners[index], corners[index + 1])
+                    faces.append([vertex for vertex, _ in triangle])
+                    corner_uvs.append([[texture_coords[uv][0], 1 - texture_coords[uv][1]] for _, uv in triangle])
+    return Mesh(vertices=positions, faces=faces, uvs=corner_uvs)
+
+
+def write_obj(file: str, mesh: Mesh):
+    # One vt per corner, as exporters write seams; quads are kept as polygons to exercise triangulation
+    uvs = mesh.uvs.reshape(-1, 2)
+    with open(file, "w") as stream:
+        np.savetxt(stream, mesh.vertices, fmt="v %.6f %.6f %.6f")
+        np.savetxt(stream, np.column_stack((uvs[:, 0], 1 - uvs[:, 1])), fmt="vt %.6f %.6f")
+        corners = mesh.faces + 1
+        uv_corners = np.arange(1, len(uvs) + 1).reshape(-1, 3)
+        rows = np.stack((corners, uv_corners), axis=-1).reshape(len(corners), 6)
+        np.savetxt(stream, rows, fmt="f %d/%d %d/%d %d/%d")
+
+
+def write_glb(file: str, mesh: Mesh):
+    positions = mesh.vertices[mesh.faces].reshape(-1, 3).astype(np.float32)
+    uvs = mesh.uvs.reshape(-1, 2).astype(np.float32)
+    indices = np.arange(len(positions), dtype=np.uint32)
+    binary = positions.tobytes() + uvs.tobytes() + indices.tobytes()
+
+    document = {
+        "asset": {"version": "2.0"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "translation": [0.0, 1.0, 0.0]}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0, "TEXCOORD_0": 1}, "indices": 2}]}],
+        "buffers": [{"byteLength": len(binary)}],
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": positions.nbytes},
+            {"buffer": 0, "byteOffset": positions.nbytes, "byteLength": uvs.nbytes},
+            {"buffer": 0, "byteOffset": positions.nbytes + uvs.nbytes, "byteLength": indices.nbytes},
+        ],
+        "accessors": [
+            {"bufferView": 0, "componentType": 5126, "count": len(positions), "type": "VEC3"},
+            {"bufferView": 1, "componentType": 5126, "count": len(uvs), "type": "VEC2"},
+            {"bufferView": 2, "componentType": 5125, "count": len(indices), "type": "SCALAR"},
+        ],
+    }
+    text = json.dumps(document).encode()
+    text += b" " * (-len(text) % 4)
+    with open(file, "wb") as stream:
+        stream.write(struct.pack("<4sII", b"glTF", 2, 12 + 8 + len(text) + 8 + len(binary)))
+        stream.write(struct.pack("<II", len(text), 0x4E4F534A) + text)
+        stream.write(struct.pack("<II", len(binary), 0x004E4942) + binary)
+
+
+def measure(loader, file: str):
+    start = time.perf_counter()
+    mesh = loader(file)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    loader(file)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, mesh
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        for segments in SPHERE_SEGMENTS:
+            source = gen_sphere(1.0, segments)
+            obj_file = os.path.join(directory, "sphere.obj")
+            glb_file = os.path.join(directory, "sphere.glb")
+            write_obj(obj_file, source)
+            write_glb(glb_file, source)
+            print(f"sphere segments={segments} ({len(source.faces)} triangles), "
+                  f"OBJ {os.path.getsize(obj_file) / 2 ** 20:.1f} MiB, "
+                  f"GLB {os.path.getsize(glb_file) / 2 ** 20:.1f} MiB")
+
+            results = {}
+            for name, loader, file in (("legacy obj", legacy_load_obj, obj_file), ("obj", load_obj, obj_file),
+                                       ("glb", load_gltf, glb_file)):
+                elapsed, peak, mesh = measure(loader, file)
+                results[name] = mesh
+                print(f"  {name:>10}: {elapsed * 1000:8.1f} ms, peak Python memory {peak / 2 ** 20:7.1f} MiB")
+
+            legacy, streamed, binary = results["legacy obj"], results["obj"], results["glb"]
+            assert np.array_equal(legacy.faces, streamed.faces)
+            assert np.allclose(legacy.vertices, streamed.vertices) and np.allclose(legacy.uvs, streamed.uvs)
+            assert np.allclose(binary.vertices[binary.faces], source.vertices[source.faces] + [0, 1, 0])
+            assert np.allclose(binary.uvs, source.uvs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Run from the repository root: python -m benchmarks.light_assignment_benchmark
+import time
+
+import numpy as np
+
+from engine3d.light import Light
+from engine3d.lighting import ShaderLighting
+from engine3d.culling import look_at_matrix
+
+
+LIGHT_COUNTS = (8, 64, 256)
+ACTOR_COUNTS = (100, 1000)
+REPEATS = 20
+# What Light.setup and Light.update issue per light in the fixed-function path when lights change every frame
+FIXED_FUNCTION_CALLS = 9
+
+
+def make_lights(count: int, rng: np.random.Generator) -> list:
+    return [Light(position=tuple(rng.uniform(-50, 50, 3)), color=tuple(rng.uniform(0.2, 1.0, 3)), diffuse=0.5)
+            for _ in range(count)]
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        fn()
+    return (time.perf_counter() - start) / REPEATS
+
+
+def main():
+    rng = np.random.default_rng(3)
+    view = look_at_matrix((0, 10, 60), (0, 0, 0), (0, 1, 0))
+    # No GL context: pack() builds the uniform block update() would upload, assign() is pure NumPy
+    lighting = ShaderLighting(max_lights=256, max_object_lights=8)
+
+    for light_count in LIGHT_COUNTS:
+        lights = make_lights(light_count, rng)
+        block = lighting.pack(lights, view)
+        pack_time = timed(lambda: lighting.pack(lights, view))
+        print(f"{light_count:4d} lights: one {block.nbytes} byte upload instead of "
+              f"{light_count * FIXED_FUNCTION_CALLS} glLight calls, packed in {pack_time * 1000:.2f} ms")
+
+        for actor_count in ACTOR_COUNTS:
+            centers = rng.uniform(-50, 50, (actor_count, 3))
+            radii = rng.uniform(0.5, 3.0, actor_count)
+            indices, counts = lighting.assign(centers, radii)
+            assert counts.max() <= lighting.max_object_lights
+            assert indices.max() < light_count
+            assign_time = timed(lambda: lighting.assign(centers, radii))
+            print(f"      {actor_count:5d} actors: {counts.mean():.1f} lights per actor, "
+                  f"assigned in {assign_time * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Run from the repository root: python -m benchmarks.light_clustering_benchmark
+import time
+
+import numpy as np
+
+from engine3d.light import Light
+from engine3d.light_clusters import ClusterGrid, ClusteredLighting
+from engine3d.lighting import influence_radii
+from engine3d.culling import look_at_matrix
+
+
+LIGHT_COUNTS = (1000, 2000, 5000, 10000)
+REPEATS = 5
+WORLD_SIZE = 400
+VERIFIED_LIGHTS = 1000
+SAMPLES_PER_LIGHT = 64
+
+
+def make_lights(count: int, rng: np.random.Generator) -> list:
+    # Mostly short-range lights (lamps, effects) and a few wide ones
+    lights = []
+    for _ in range(count):
+        falloff = 0.5 if rng.random() < 0.05 else rng.uniform(2.0, 20.0)
+        position = (rng.uniform(-WORLD_SIZE / 2, WORLD_SIZE / 2), rng.uniform(0, 20), rng.uniform(-WORLD_SIZE, 0))
+        lights.append(Light(position=position, color=tuple(rng.uniform(0.2, 1.0, 3)), ambient=0.0, diffuse=0.6,
+                            specular=0.3, linear_attenuation=falloff / 4, quadratic_attenuation=falloff))
+    return lights
+
+
+def brute_force(grid: ClusterGrid, centers: np.ndarray, radii: np.ndarray) -> list:
+    # Every light against every cluster box. The boxes are larger than the frustum pieces, so this is a superset
+    cells = np.indices((grid.slices, grid.tiles_y, grid.tiles_x)).reshape(3, -1)
+    low, high = grid.cluster_bounds(cells[2], cells[1], cells[0])
+    clusters = []
+    for cluster in range(len(grid)):
+        nearest = np.clip(centers, low[cluster], high[cluster])
+        clusters.append(np.flatnonzero(np.sum((centers - nearest) ** 2, axis=1) <= radii ** 2))
+    return clusters
+
+
+def sampled_clusters(grid: ClusterGrid, centers: np.ndarray, radii: np.ndarray, rng: np.random.Generator):
+    # (light, cluster) of random points inside each light's sphere that land in the view frustum
+    directions = rng.normal(size=(len(centers), SAMPLES_PER_LIGHT, 3))
+    directions /= np.linalg.norm(directions, axis=2, keepdims=True)
+    distances = radii[:, None, None] * rng.random((len(centers), SAMPLES_PER_LIGHT, 1)) ** (1 / 3)
+    points = (centers[:, None, :] + directions * distances).reshape(-1, 3)
+    lights = np.repeat(np.arange(len(centers)), SAMPLES_PER_LIGHT)
+
+    depth = -points[:, 2]
+    inside = (depth > grid.near) & (depth < grid.far)
+    points, lights, depth = points[inside], lights[inside], depth[inside]
+    ndc_x = points[:, 0] / depth * grid.scale_x
+    ndc_y = points[:, 1] / depth * grid.scale_y
+    inside = (np.abs(ndc_x) < 1) & (np.abs(ndc_y) < 1)
+    cell_x = grid.tile_of(ndc_x[inside], grid.tiles_x)
+    cell_y = grid.tile_of(ndc_y[inside], grid.tiles_y)
+    cell_z = grid.slice_of(depth[inside])
+    return lights[inside], (cell_z * grid.tiles_y + cell_y) * grid.tiles_x + cell_x
+
+
+def verify(grid: ClusterGrid, centers: np.ndarray, radii: np.ndarray, rng: np.random.Generator):
+    offsets, counts, binned = grid.bin(centers, radii)
+    clusters = [set(binned[offsets[cluster]:offsets[cluster] + counts[cluster]]) for cluster in range(len(grid))]
+    for cluster, candidates in enumerate(brute_force(grid, centers, radii)):
+        assert clusters[cluster] <= set(candidates)
+    for light, cluster in zip(*sampled_clusters(grid, centers, radii, rng)):
+        assert light in clusters[cluster]
+
+
+def main():
+    rng = np.random.default_rng(5)
+    view = look_at_matrix((0, 10, 20), (0, 5, -100), (0, 1, 0))
+    grid = ClusterGrid(16, 9, 24, fov=45, aspect=16 / 9, near=0.1, far=1000)
+    # No GL context: bin() is the CPU work of ClusteredLighting.update, without the three buffer uploads
+    lighting = ClusteredLighting(grid)
+    print(f"{len(grid)} clusters ({grid.tiles_x}x{grid.tiles_y} tiles, {grid.slices} slices)")
+
+    for count in LIGHT_COUNTS:
+        lights = make_lights(count, rng)
+        light_data, ranges, indices = lighting.bin(lights, view)
+
+        if count == VERIFIED_LIGHTS:
+            centers = lighting.positions @ view[:3, :3].T + view[:3, 3]
+            radii = influence_radii(lighting.strengths, lighting.attenuation)
+            verify(grid, centers, radii, rng)
+
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            lighting.bin(lights, view)
+        elapsed = (time.perf_counter() - start) / REPEATS
+
+        counts = ranges[:, 1]
+        upload = light_data.nbytes + ranges.nbytes + indices.nbytes
+        print(f"{count:6d} lights: {lighting.visible_lights} reach the view, {len(indices)} light references, "
+              f"{counts.mean():.1f} lights per cluster (max {counts.max()}), {upload} bytes to upload, "
+              f"binned in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Run from the repository root: python -m benchmarks.mesh_generation_benchmark
+import math
+import time
+
+import numpy as np
+
+from engine3d.classes import Mesh
+from engine3d.mesh_cache import calculate_normals
+from engine3d.meshes import gen_sphere, gen_plane, gen_cylinder, gen_capsule, gen_icosphere
+
+
+SPHERE_SEGMENTS = (16, 64, 128, 256)
+
+
+def legacy_gen_sphere(radius: float, segments: int = 16) -> Mesh:
+    # The loop based generator gen_sphere replaced, kept here as the reference
+    vertices = []
+    faces = []
+    uvs = []
+
+    for i in range(segments + 1):
+        theta = i * math.pi / segments
+        sin_theta = math.sin(theta)
+        cos_theta = math.cos(theta)
+
+        for j in range(segments + 1):
+            phi = j * 2 * math.pi / segments
+            sin_phi = math.sin(phi)
+            cos_phi = math.cos(phi)
+
+            vertices.append([radius * sin_theta * cos_phi, radius * cos_theta, radius * sin_theta * sin_phi])
+
+    for i in range(segments):
+        for j in range(segments):
+            v0 = i * (segments + 1) + j
+            v1 = v0 + 1
+            v2 = (i + 1) * (segments + 1) + j + 1
+            v3 = v2 - 1
+
+            faces.append([v0, v1, v2])
+            faces.append([v0, v2, v3])
+
+            u0 = j / segments
+            u1 = (j + 1) / segments
+            v0 = i / segments
+            v1 = (i + 1) / segments
+
+            uvs.append([[u0, v0], [u1, v0], [u1, v1]])
+            uvs.append([[u0, v0], [u1, v1], [u0, v1]])
+
+    return Mesh(vertices=vertices, faces=faces, uvs=uvs)
+
+
+def timed(function, *args, repeat: int = 3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def outward_ratio(mesh: Mesh, center=(0.0, 0.0, 0.0)) -> float:
+    normals = calculate_normals(mesh.vertices, mesh.faces)
+    used = np.unique(mesh.faces)
+    return float(np.mean(np.einsum("ij,ij->i", normals[used], mesh.vertices[used] - center) > 0))
+
+
+def main():
+    for segments in SPHERE_SEGMENTS:
+        legacy_time, legacy = timed(legacy_gen_sphere, 1.0, segments)
+        new_time, mesh = timed(gen_sphere, 1.0, segments)
+        assert np.allclose(legacy.vertices, mesh.vertices, atol=1e-6)
+        assert np.array_equal(legacy.faces, mesh.faces)
+        assert np.allclose(legacy.uvs, mesh.uvs)
+        print(f"gen_sphere segments={segments:>3}: {legacy_time * 1000:8.2f} ms -> {new_time * 1000:6.2f} ms "
+              f"({legacy_time / new_time:.0f}x)")
+
+    # Normals should point away from the given interior point
+    primitives = {
+        "gen_plane(10, 10, 64)": (lambda: gen_plane(10, 10, 64), (0.0, -1.0, 0.0)),
+        "gen_cylinder(1, 2, 64)": (lambda: gen_cylinder(1, 2, 64), (0.0, 0.0, 0.0)),
+        "gen_capsule(1, 2, 64, 16)": (lambda: gen_capsule(1, 2, 64, 16), (0.0, 0.0, 0.0)),
+        "gen_icosphere(1, 5)": (lambda: gen_icosphere(1, 5), (0.0, 0.0, 0.0)),
+    }
+    for name, (factory, inside) in primitives.items():
+        elapsed, mesh = timed(factory)
+        print(f"{name:>26}: {elapsed * 1000:6.2f} ms, {len(mesh.vertices)} vertices, {len(mesh.faces)} triangles, "
+              f"outward normals {outward_ratio(mesh, inside) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Run from the repository root: python -m benchmarks.mesh_load_benchmark
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from engine3d.mesh_cache import MeshCache
+from engine3d.mesh_format import save_mesh
+from engine3d.meshes import gen_sphere
+from engine3d.methods import load_mesh_on_file
+
+
+SPHERE_SEGMENTS = (64, 128, 256)
+
+
+def prepare(file: str):
+    # Load the file and build the GPU-ready buffers, as Actor.__setup_vbo__ would before uploading
+    mesh = load_mesh_on_file(file)
+    resource = MeshCache().acquire(mesh)
+    resource.build_vertex_buffers()
+    return resource
+
+
+def measure(file: str):
+    start = time.perf_counter()
+    resource = prepare(file)
+    elapsed = time.perf_counter() - start
+
+    # Traced separately, tracemalloc slows the list-heavy JSON path down several times
+    tracemalloc.start()
+    prepare(file)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, resource
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        for segments in SPHERE_SEGMENTS:
+            mesh = gen_sphere(1.0, segments)
+            json_file = os.path.join(directory, f"sphere_{segments}.json")
+            binary_file = os.path.join(directory, f"sphere_{segments}.mkmesh")
+            with open(json_file, "w") as stream:
+                json.dump({"vertices": mesh.vertices.tolist(), "faces": mesh.faces.tolist(),
+                           "uvs": mesh.uvs.tolist()}, stream)
+            save_mesh(binary_file, mesh)
+
+            print(f"sphere segments={segments} ({len(mesh.faces)} triangles): "
+                  f"JSON {os.path.getsize(json_file) / 2 ** 20:.1f} MiB, "
+                  f"binary {os.path.getsize(binary_file) / 2 ** 20:.1f} MiB")
+            results = {}
+            for name, file in (("json", json_file), ("binary", binary_file)):
+                elapsed, peak, resource = measure(file)
+                results[name] = resource
+                print(f"  {name:>6}: buffers ready in {elapsed * 1000:8.1f} ms, "
+                      f"peak Python memory {peak / 2 ** 20:7.1f} MiB")
+
+            json_resource, binary_resource = results["json"], results["binary"]
+            assert (json_resource.index_data == binary_resource.index_data).all()
+            assert (json_resource.vertex_data["position"] == binary_resource.indexed.positions).all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+# Run from the repository root: python -m benchmarks.mesh_memory_report
+from engine3d.mesh_cache import MeshCache
+from engine3d.meshes import gen_cube, gen_sphere
+
+
+MESHES = {
+    "cube": lambda: gen_cube(1, 1, 1),
+    "sphere segments=32": lambda: gen_sphere(1, 32),
+    "sphere segments=128": lambda: gen_sphere(3.1, 128),
+    "sphere segments=256": lambda: gen_sphere(0.8, 256),
+}
+
+
+def main():
+    cache = MeshCache()
+    for name, factory in MESHES.items():
+        cache.acquire(factory())
+        _, report = cache.memory_report()[-1]
+        print(f"{name:>20}: {report}")
+
+    optimized = MeshCache(optimize_vertex_cache=True)
+    optimized.acquire(gen_sphere(1, 32))
+    _, report = optimized.memory_report()[0]
+    print(f"{'sphere 32 optimized':>20}: {report}")
+
+    compressed = MeshCache(compress_vertices=True)
+    compressed.acquire(gen_sphere(0.8, 256))
+    _, report = compressed.memory_report()[0]
+    print(f"{'sphere 256 compressed':>20}: {report}")
+
+
+if __name__ == "__main__":
+    main()
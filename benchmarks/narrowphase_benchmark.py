@@ -0,0 +1,85 @@
+# Run from the repository root: python -m benchmarks.narrowphase_benchmark
+import time
+import random
+
+import numpy as np
+
+from pygame.math import Vector3
+
+from engine3d.actor import Actor
+from engine3d.physics import PhysicsWorld
+from engine3d.meshes import gen_cube
+
+
+PAIR_COUNTS = (100, 1000, 5000)
+COMPARE_SEEDS = range(20)
+TOLERANCE = 1e-9  # both paths resolve the same shape contacts, only the rounding of the impulse math differs
+
+
+def random_vector(rng, scale: float):
+    return Vector3(rng.uniform(-scale, scale), rng.uniform(-scale, scale), rng.uniform(-scale, scale))
+
+
+def create_pair_scene(pair_count: int, seed: int):
+    # Overlapping pairs spread far enough apart that no body takes part in two contacts
+    rng = random.Random(seed)
+    mesh = gen_cube(0.5, 0.5, 0.5)
+
+    actors = []
+    for index in range(pair_count):
+        center = Vector3(index * 10, rng.uniform(-2, 2), rng.uniform(-2, 2))
+        for offset in (Vector3(0, 0, 0), random_vector(rng, 0.9)):
+            actor = Actor(
+                position=center + offset,
+                rotation=(0, 0, 0),
+                mesh=mesh,
+                texture=1,
+                collision=True,
+                physic=rng.random() > 0.2,
+                mass=rng.uniform(0.5, 5.0),
+                restitution=rng.uniform(0.0, 1.0)
+            )
+            actor.velocity = random_vector(rng, 3)
+            actor.angular_velocity = random_vector(rng, 1)
+            actor.friction = rng.uniform(0.0, 0.6)
+            actors.append(actor)
+    return actors
+
+
+def solve(pair_count: int, seed: int, batched: bool):
+    world = PhysicsWorld(batched_narrow_phase=batched)
+    world.add_objects(create_pair_scene(pair_count, seed))
+
+    start = time.perf_counter()
+    world.handle_collisions()
+    elapsed = time.perf_counter() - start
+
+    count = world.count
+    state = np.hstack((world.positions[:count], world.velocities[:count], world.angular_velocities[:count]))
+    return state, elapsed
+
+
+def compare():
+    worst = 0.0
+    for seed in COMPARE_SEEDS:
+        scalar, _ = solve(50, seed, batched=False)
+        batched, _ = solve(50, seed, batched=True)
+        worst = max(worst, float(np.max(np.abs(scalar - batched))))
+
+    print(f"max difference between scalar and batched narrow phase: {worst:.3e}")
+    if worst > TOLERANCE:
+        raise SystemExit(f"batched narrow phase differs from the scalar path by more than {TOLERANCE}")
+
+
+def main():
+    compare()
+
+    print(f"{'pairs':>8} {'scalar ms':>10} {'batched ms':>11}")
+    for count in PAIR_COUNTS:
+        _, scalar = solve(count, 0, batched=False)
+        _, batched = solve(count, 0, batched=True)
+        print(f"{count:>8} {scalar * 1000:>10.2f} {batched * 1000:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
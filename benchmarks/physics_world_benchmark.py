@@ -0,0 +1,32 @@
+# Run from the repository root: python -m benchmarks.physics_world_benchmark
+import time
+
+from pygame.math import Vector3
+
+from engine3d.physics import PhysicsEngine, PhysicsWorld
+from benchmarks.broadphase_benchmark import create_scene
+
+
+BODY_COUNTS = (200, 2000, 20000)
+STEPS = 10
+
+
+def run(physics, actors):
+    physics.add_objects(actors)
+
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        physics.update(dt=1 / 60)
+    return (time.perf_counter() - start) / STEPS * 1000
+
+
+def main():
+    print(f"{'bodies':>8} {'backend':>14} {'ms/step':>10}")
+    for count in BODY_COUNTS:
+        for name, factory in (("PhysicsEngine", PhysicsEngine), ("PhysicsWorld", PhysicsWorld)):
+            elapsed = run(factory(basic_gravity=Vector3(0, -9.8, 0)), create_scene(count))
+            print(f"{count:>8} {name:>14} {elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
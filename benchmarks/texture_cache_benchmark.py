@@ -0,0 +1,38 @@
+# Run from the repository root: python -m benchmarks.texture_cache_benchmark
+import os
+import tempfile
+import time
+
+from engine3d.textures import TextureManager, decode_texture
+
+
+TEXTURES = ("assets/textures/sun_texture.png", "assets/textures/earth_planet_texture.png",
+            "assets/textures/mars_planet_texture.png")
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    # CPU side only, DXT compression needs a GL context and is not measured here
+    with tempfile.TemporaryDirectory() as directory:
+        manager = TextureManager(cache_directory=directory)
+        for file in TEXTURES:
+            decode_time, decoded = timed(decode_texture, file)
+            mip_time, _ = timed(decode_texture, file, True)
+            first_time, _ = timed(manager.read, file)
+            cached_time, cached = timed(manager.read, file)
+
+            assert bytes(cached.levels[0][2]) == decoded.levels[0][2]
+            size = os.path.getsize(manager.cache_file(os.path.abspath(file)))
+            print(f"{file} ({decoded.width}x{decoded.height}, {decoded.channels} channels): "
+                  f"PIL {decode_time * 1000:.1f} ms, with mip chain {mip_time * 1000:.1f} ms, "
+                  f"first run writing the cache {first_time * 1000:.1f} ms, "
+                  f"cached {cached_time * 1000:.2f} ms ({len(cached.levels)} levels, {size / 2 ** 20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Run from the repository root: python -m benchmarks.transform_update_benchmark
+import time
+
+import numpy as np
+
+from engine3d.transforms import Transform, SceneGraph, euler_model_matrices, model_matrices
+
+from pygame.math import Vector3
+
+
+NODE_COUNTS = (1000, 10000)
+ROOT_SHARE = 0.1
+MOVED_SHARE = 0.01
+REPEATS = 10
+
+
+def make_nodes(count: int, rng: np.random.Generator) -> list:
+    nodes = []
+    for index in range(count):
+        parent = None
+        if nodes and rng.random() >= ROOT_SHARE:
+            parent = nodes[rng.integers(len(nodes))]
+        nodes.append(Transform(rng.uniform(-10, 10, 3), rng.uniform(-180, 180, 3), parent))
+    return nodes
+
+
+def composed_matrix(node: Transform) -> np.ndarray:
+    matrix = euler_model_matrices([tuple(node.position)], [tuple(node.rotation)], np.float64)[0]
+    return matrix if node.parent is None else composed_matrix(node.parent) @ matrix
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        fn()
+    return (time.perf_counter() - start) / REPEATS
+
+
+def main():
+    rng = np.random.default_rng(11)
+    for count in NODE_COUNTS:
+        nodes = make_nodes(count, rng)
+        graph = SceneGraph()
+        graph.add_many(nodes)
+
+        start = time.perf_counter()
+        graph.update()
+        build_time = time.perf_counter() - start
+        for index in rng.choice(count, 50, replace=False).tolist():
+            assert np.allclose(nodes[index].world_matrix(), composed_matrix(nodes[index]))
+
+        idle_time = timed(graph.update)
+        assert graph.updated_worlds == 0
+
+        moved = rng.choice(count, max(1, int(count * MOVED_SHARE)), replace=False).tolist()
+
+        def move_some():
+            for index in moved:
+                nodes[index].position = nodes[index].position + Vector3(0.1, 0, 0)
+            graph.update()
+
+        moved_time = timed(move_some)
+        moved_worlds = graph.updated_worlds
+        for index in moved[:20]:
+            assert np.allclose(nodes[index].world_matrix(), composed_matrix(nodes[index]))
+
+        # Without the cache every transform is read and turned into a matrix every frame, parents not included
+        rebuild_time = timed(lambda: model_matrices([tuple(node.position) for node in nodes],
+                                                    [node.orientation for node in nodes]))
+
+        print(f"{count:6d} nodes, {len(graph._levels)} levels: first update {build_time * 1000:.1f} ms, "
+              f"unchanged {idle_time * 1000:.2f} ms, {len(moved)} moved ({moved_worlds} world matrices) "
+              f"{moved_time * 1000:.2f} ms, rebuilding every local matrix {rebuild_time * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
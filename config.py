@@ -6,3 +6,37 @@ WINDOW_ICON = "assets/icon/app_icon.png"
 DRAW_DISTANCE = 1000
 MSAA_X = 8
 TARGET_FPS = 70
+VSYNC = False  # wait for the display refresh in swap_buffers instead of pacing to TARGET_FPS
+ADAPTIVE_FPS = False  # lower the target FPS (down to MIN_FPS) while frames keep missing their budget
+MIN_FPS = 30
+
+LIGHTING = "clustered"  # "clustered" - any number of lights, "shader" - per-object lights, "fixed" - GL_LIGHTi
+LIGHT_CLUSTERS = (16, 9, 24)  # clustered only: screen tiles across, tiles down, depth slices
+MAX_LIGHTS = 256  # "shader" only, also bounded by GL_MAX_UNIFORM_BLOCK_SIZE; fixed-function allows 8
+MAX_LIGHTS_PER_OBJECT = 8  # "shader" only: strongest lights shaded per actor or instanced group
+SHADOWS = True  # cube shadow maps for lights created with cast_shadows=True (not with "fixed" lighting)
+SHADOW_MAP_SIZE = 1024  # pixels per cube face, Light(shadow_resolution=...) overrides it per light
+MAX_SHADOW_MAPS = 4  # shadowed lights at once (up to 4), further cast_shadows lights are unshadowed
+INSTANCED_RENDERING = True  # one instanced draw per group of actors sharing mesh and texture (needs OpenGL 3.3)
+INSTANCING_MIN_GROUP = 2
+FRUSTUM_CULLING = "flat"  # "flat" - test every actor, "bvh" - hierarchy refit on movement (large static worlds), None - off
+CULLING_BVH_LEAF_SIZE = 16
+OPTIMIZE_VERTEX_CACHE = False  # reorder mesh triangles for the post-transform vertex cache (slow on big meshes)
+COMPRESS_VERTICES = False  # pack normals as normalized shorts and UVs as half floats, 24 instead of 32 bytes per vertex
+
+ASSET_WORKERS = None  # asset loader threads (and processes), None - picked by concurrent.futures from the CPU count
+ASSET_PROCESSES = False  # decode textures and generate meshes in worker processes instead of threads
+ASSET_UPLOAD_BUDGET = 0.004  # seconds per frame spent on texture and buffer uploads of streamed assets
+TEXTURE_MIPMAPS = True  # trilinear filtering through a mip chain, avoids aliasing on minified large textures
+TEXTURE_CACHE_DIRECTORY = ".texture_cache"  # decoded textures with their mip chains, None - decode with PIL every run
+TEXTURE_COMPRESSION = False  # DXT1/DXT5 in video memory and in the cache (needs EXT_texture_compression_s3tc)
+ATLAS_SIZE = 2048  # texture atlases for load_texture_on_file(atlas=True) and untextured actors
+ATLAS_MAX_TEXTURE_SIZE = 512  # larger textures keep a texture of their own
+
+PHYSICS_RATE = 60  # fixed physics steps per second
+MAX_PHYSICS_SUBSTEPS = 8  # physics steps allowed per rendered frame, the rest of the backlog is dropped
+MAX_FRAME_TIME = 0.25  # longer frames (hitches) are clamped to this many seconds of simulation
+PHYSICS_INTERPOLATION = True  # render actors between the previous and the current physics state
+PHYSICS_BACKEND = "objects"  # "objects" - per-actor integration, "world" - batched NumPy PhysicsWorld
+BROAD_PHASE = "sweep_and_prune"  # "sweep_and_prune", "spatial_hash" or "brute_force"
+BROAD_PHASE_CELL_SIZE = None  # spatial_hash only, None - picked from the average actor size
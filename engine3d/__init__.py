@@ -6,8 +6,20 @@ from .core import Engine3D
 
 from .camera import Camera
 from .actor import Actor
+from .transforms import Transform, SceneGraph
 from .hud import HUDElement, BaseHUDElement
 from .light import Light
+from .physics import PhysicsEngine, PhysicsWorld
+from .collision_shapes import CollisionShape
+from .broadphase import SweepAndPrune, SpatialHashGrid, BruteForce
 from .loading_screen import LoadingScreen
+from .assets import AssetPipeline, TextureHandle
+from .textures import TextureManager, texture_manager
+from .atlas import AtlasBuilder, TextureAtlas, texture_atlases
+from .render_queue import RenderQueue, GLBackend, RecordingBackend
+from .lighting import ShaderLighting, ShaderBackend
+from .light_clusters import ClusteredLighting, ClusterGrid
+from .shadows import ShadowRenderer
+from .materials import Material, DEFAULT_MATERIAL
 
 from .methods import load_mesh_on_file, load_texture_on_file
@@ -3,14 +3,102 @@ import numpy as np
 from pygame.math import Vector3
 from OpenGL.GL import *
 
-from .methods import gen_base_texture
+from .classes import LODChain
+from .transforms import Transform, TrackedVector, normalize_quaternions
+from .collision_shapes import CollisionShape
+from .atlas import texture_atlases
+from .mesh_cache import mesh_cache, calculate_normals, calculate_bounding_box, calculate_inertia_tensor
+
+
+# When the actor belongs to a PhysicsWorld its body state lives in the world arrays. Vectors read from it write
+# in-place edits like `actor.velocity.x = 1` back, arrays are read-only copies so edits fail instead of being lost
+class BodyState:
+    def __init__(self, array: str, convert, transform: bool = False):
+        self.array = array
+        self.convert = convert
+        # Assigning a transform field counts as a move (Transform.transform_version)
+        self.transform = transform
+        self.local = None
+
+    def __set_name__(self, owner, name):
+        self.local = "_" + name
+
+    def __get__(self, actor, owner=None):
+        if actor is None:
+            return self
+        if actor._world is not None:
+            value = self.convert(getattr(actor._world, self.array)[actor._index])
+            return self._view(value, lambda vector: self.__set__(actor, vector))
+        return getattr(actor, self.local)
+
+    def __set__(self, actor, value):
+        if self.transform:
+            actor.transform_version += 1
+        if actor._world is not None:
+            getattr(actor._world, self.array)[actor._index] = value
+        elif self.transform:
+            # Stored like Transform stores them, in-place edits of the position count as moves
+            setattr(actor, self.local, self._view(self.convert(value), actor._moved))
+        else:
+            setattr(actor, self.local, self.convert(value))
 
+    @staticmethod
+    def _view(value, on_change):
+        if isinstance(value, Vector3):
+            return TrackedVector(value, on_change)
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        return value
+
+
+DEFAULT_COLOR = (0, 255, 180)
+
+
+def _to_vector(value) -> Vector3:
+    return Vector3(*value)
+
+
+def _to_matrix(value) -> np.ndarray:
+    return np.array(value, dtype=np.float64)
+
+
+class Actor(Transform):
+    position = BodyState("positions", _to_vector, transform=True)
+    orientation = BodyState("orientations", normalize_quaternions, transform=True)
+    # A body array, so PhysicsWorld can mark the bodies it moves in bulk
+    transform_version = BodyState("transform_versions", int)
+    velocity = BodyState("velocities", _to_vector)
+    angular_velocity = BodyState("angular_velocities", _to_vector)
+    applied_force = BodyState("forces", _to_vector)
+    mass = BodyState("masses", float)
+    inv_mass = BodyState("inv_masses", float)
+    restitution = BodyState("restitutions", float)
+    friction = BodyState("frictions", float)
+    # In body space, world_inv_inertia_tensor turns it with the orientation
+    inv_inertia_tensor = BodyState("inv_inertia_tensors", _to_matrix)
+    physic = BodyState("physic", bool)
+    collision = BodyState("collision", bool)
+    sleeping = BodyState("sleeping", bool)
+    sleep_counter = BodyState("sleep_counters", int)
+    island_id = BodyState("island_ids", int)
+    rest_position = BodyState("rest_positions", _to_vector)
+
+    _body_state = ("position", "velocity", "angular_velocity", "applied_force", "mass", "inv_mass", "restitution",
+                   "friction", "inv_inertia_tensor", "physic", "collision", "sleeping", "sleep_counter", "island_id",
+                   "rest_position", "orientation", "transform_version")
+
+    # Bumped whenever an actor gets another collision shape, physics engines rebuild their ShapeTable then
+    shape_version = 0
 
-class Actor:
     def __init__(self, position, rotation, mesh, texture, collision: bool, physic: bool = False, mass: float = 1.0,
-                 restitution: float = 0.5):
-        self.position = Vector3(position)
-        self.rotation = Vector3(rotation)
+                 restitution: float = 0.5, material=None, cast_shadows: bool = True, parent: Transform = None,
+                 collision_shape=None):
+        self._world = None
+        self._index = None
+        # Physics simulates positions as world positions, a parented actor should not be physic. Its collision
+        # bounds still follow the world matrix
+        super().__init__(position, rotation, parent)
+
         self.velocity = Vector3(0, 0, 0)
         self.angular_velocity = Vector3(0, 0, 0)
         self.vector = Vector3(0, 0, 0)
@@ -20,133 +108,194 @@ class Actor:
         self.inv_mass = 1 / mass if mass != 0 else 0
         self.restitution = restitution
 
-        self.vertices = np.array(mesh.vertices, dtype=np.float32)
-        self.faces = np.array(mesh.faces, dtype=np.int32)
-        self.uvs = np.array(mesh.uvs, dtype=np.float32)
-        self.texture = texture if texture else gen_base_texture()
-        self.bounding_box = self.calculate_bounding_box()
+        # Actors built from the same mesh share its arrays, derived data and GPU buffers. With a LODChain the
+        # finest level is the actor mesh (physics, bounds), the coarser ones are only used for drawing
+        # Untextured actors share one texel of a solid color atlas. Atlas regions (texture_atlases) come with a
+        # uv_rect the mesh UVs are remapped into, which gives the actor its own mesh resource
+        if not texture:
+            texture = texture_atlases.solid_color(DEFAULT_COLOR)
+        self.uv_rect = getattr(texture, "uv_rect", None)
+
+        self.lod_chain = mesh if isinstance(mesh, LODChain) else None
+        self.mesh = self.lod_chain.meshes[0] if self.lod_chain else mesh
+        self.mesh_resource = mesh_cache.acquire(self.mesh, self.uv_rect)
+        self.lod_resources = [self.mesh_resource]
+        if self.lod_chain:
+            self.lod_resources += [mesh_cache.acquire(level, self.uv_rect) for level in self.lod_chain.meshes[1:]]
+        self.lod_level = 0
+        self.render_resource = self.mesh_resource
+        self.vertices = self.mesh_resource.vertices
+        self.faces = self.mesh_resource.faces
+        # An int texture id, an atlas region or a handle whose texture_id changes once it finished streaming in
+        self.texture = texture
+        self.bounding_box = self.mesh_resource.bounding_box
+        self.bounding_radius = self.mesh_resource.bounding_radius
         self.collision = collision
-        self.normals = self.calculate_normals()
-
-        self.inertia_tensor = self.calculate_inertia_tensor()
+        self.collision_shape = collision_shape
+        # Static actors are not expected to move, the "bvh" frustum culling keeps them in a prebuilt hierarchy
+        self.static = False
+        # Transparent actors are drawn after the opaque ones, back to front and with blending
+        self.transparent = False
+        # A materials.Material, None - DEFAULT_MATERIAL
+        self.material = material
+        self.cast_shadows = cast_shadows
+        self.normals = self.mesh_resource.normals
+
+        self.inertia_tensor = self.mesh_resource.unit_inertia_tensor * self.mass
         self.inv_inertia_tensor = np.linalg.inv(self.inertia_tensor)
         self.friction = 0.3
         self.applied_force = Vector3(0, 0, 0)
 
-    def __setup_vbo__(self):
-        self.vbo = glGenBuffers(1)
-        self.ibo = glGenBuffers(1)
-        self.nbo = glGenBuffers(1)
-        self.tbo = glGenBuffers(1)
-
-        num_faces = len(self.faces)
-        num_vertices_per_face = 3
+        self.sleeping = False
+        self.sleep_counter = 0
+        self.island_id = -1
+        self.rest_position = Vector3(position)
 
-        faces_flat = self.faces.flatten()
+    def _attach(self, world, index: int):
+        for name in self._body_state:
+            getattr(world, getattr(Actor, name).array)[index] = getattr(self, name)
 
-        vertex_data = self.vertices[faces_flat].flatten().astype(np.float32)
-        normal_data = self.normals[faces_flat].flatten().astype(np.float32)
+        self._world = world
+        self._index = index
 
-        uv_data = self.uvs.reshape(num_faces * num_vertices_per_face, 2).flatten().astype(np.float32)
+    def _detach(self):
+        values = {name: getattr(self, name) for name in self._body_state}
 
-        index_data = np.arange(num_faces * num_vertices_per_face, dtype=np.uint32)
+        self._world = None
+        self._index = None
+        for name, value in values.items():
+            setattr(self, name, value)
 
-        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-        glBufferData(GL_ARRAY_BUFFER, vertex_data.nbytes, vertex_data, GL_STATIC_DRAW)
-
-        glBindBuffer(GL_ARRAY_BUFFER, self.nbo)
-        glBufferData(GL_ARRAY_BUFFER, normal_data.nbytes, normal_data, GL_STATIC_DRAW)
-
-        glBindBuffer(GL_ARRAY_BUFFER, self.tbo)
-        glBufferData(GL_ARRAY_BUFFER, uv_data.nbytes, uv_data, GL_STATIC_DRAW)
-
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
-        glBufferData(GL_ELEMENT_ARRAY_BUFFER, index_data.nbytes, index_data, GL_STATIC_DRAW)
-
-        self.num_indices = len(index_data)
+    def __setup_vbo__(self):
+        for resource in self.lod_resources:
+            resource.upload()
+
+        self.set_lod(self.lod_level)
+
+    def __release_vbo__(self):
+        if getattr(self, "vbo", None) is None:
+            return
+
+        for resource in self.lod_resources:
+            resource.release_gpu()
+        self.vao = self.vbo = self.ibo = None
+
+    def release(self):
+        self.__release_vbo__()
+        if self.mesh_resource is not None:
+            for resource in self.lod_resources:
+                mesh_cache.release(resource)
+            self.mesh_resource = self.render_resource = None
+            self.lod_resources = []
+            # The mesh arrays are shared with the released resources
+            self.mesh = self.lod_chain = None
+            self.vertices = self.faces = self.normals = None
+
+    def set_lod(self, level: int):
+        resource = self.lod_resources[level]
+        self.lod_level = level
+        self.render_resource = resource
+
+        self.vao = resource.vao
+        self.vbo = resource.vbo
+        self.ibo = resource.ibo
+        self.num_indices = resource.num_indices
+        self.index_type = resource.index_type
+
+    @property
+    def texture(self):
+        return getattr(self._texture, "texture_id", self._texture)
+
+    @texture.setter
+    def texture(self, value):
+        self._texture = value
+
+    @property
+    def uvs(self):
+        return self.mesh_resource.uvs
 
     def calculate_normals(self):
-        normals = np.zeros_like(self.vertices)
-        v0 = self.vertices[self.faces[:, 0]]
-        v1 = self.vertices[self.faces[:, 1]]
-        v2 = self.vertices[self.faces[:, 2]]
-        face_normals = np.cross(v1 - v0, v2 - v0)
-        face_normals /= np.linalg.norm(face_normals, axis=1)[:, np.newaxis] + 1e-6
-
-        np.add.at(normals, self.faces[:, 0], face_normals)
-        np.add.at(normals, self.faces[:, 1], face_normals)
-        np.add.at(normals, self.faces[:, 2], face_normals)
-
-        return normals / (np.linalg.norm(normals, axis=1)[:, np.newaxis] + 1e-6)
-
-    def render(self):
-        glPushMatrix()
-        glTranslatef(self.position.x, self.position.y, self.position.z)
-        glRotatef(self.rotation.x, 1, 0, 0)
-        glRotatef(self.rotation.y, 0, 1, 0)
-        glRotatef(self.rotation.z, 0, 0, 1)
+        return calculate_normals(self.vertices, self.faces)
 
+    def render(self, alpha: float = 1.0):
         glBindTexture(GL_TEXTURE_2D, self.texture)
         glEnable(GL_TEXTURE_2D)
+        self.draw(alpha)
+        glDisable(GL_TEXTURE_2D)
 
-        glEnableClientState(GL_VERTEX_ARRAY)
-        glEnableClientState(GL_NORMAL_ARRAY)
-        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
-
-        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-        glVertexPointer(3, GL_FLOAT, 0, None)
+    def draw(self, alpha: float = 1.0):
+        # render() without the texture state, the engine binds textures once per run of actors sharing one
+        glPushMatrix()
+        # GL reads matrices column by column
+        glMultMatrixd(self.world_matrix(alpha).T)
 
-        glBindBuffer(GL_ARRAY_BUFFER, self.nbo)
-        glNormalPointer(GL_FLOAT, 0, None)
+        self.bind_buffers()
+        glDrawElements(GL_TRIANGLES, self.num_indices, self.index_type, None)
+        self.unbind_buffers()
 
-        glBindBuffer(GL_ARRAY_BUFFER, self.tbo)
-        glTexCoordPointer(2, GL_FLOAT, 0, None)
+        glPopMatrix()
 
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
-        glDrawElements(GL_TRIANGLES, self.num_indices, GL_UNSIGNED_INT, None)
+    def bind_buffers(self):
+        self.render_resource.bind()
 
-        glDisableClientState(GL_VERTEX_ARRAY)
-        glDisableClientState(GL_NORMAL_ARRAY)
-        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
-
-        glDisable(GL_TEXTURE_2D)
-        glPopMatrix()
+    def unbind_buffers(self):
+        self.render_resource.unbind()
 
     def calculate_bounding_box(self):
-        min_cords = np.min(self.vertices, axis=0)
-        max_cords = np.max(self.vertices, axis=0)
-        return min_cords, max_cords
+        return calculate_bounding_box(self.vertices)
 
     def calculate_inertia_tensor(self):
-        x_, y, z = self.vertices[:, 0], self.vertices[:, 1], self.vertices[:, 2]
-
-        inertia = np.zeros((3, 3))
-        inertia[0, 0] = np.sum(x_ ** 2 + z ** 2)
-        inertia[1, 1] = np.sum(x_ ** 2 + z ** 2)
-        inertia[2, 2] = np.sum(x_ ** 2 + y ** 2)
-        inertia[0, 1] = -np.sum(x_ * y)
-        inertia[0, 2] = -np.sum(x_ * z)
-        inertia[1, 2] = -np.sum(y * z)
-        inertia[1, 0] = inertia[0, 1]
-        inertia[2, 0] = inertia[0, 2]
-        inertia[2, 1] = inertia[1, 2]
-        return inertia * self.mass
+        return calculate_inertia_tensor(self.vertices, self.mass)
+
+    @property
+    def collision_shape(self) -> CollisionShape:
+        return self._collision_shape
+
+    @collision_shape.setter
+    def collision_shape(self, shape):
+        # A CollisionShape, a kind of collision_shapes.SHAPE_KINDS fitted to the mesh or None - the best fitting one
+        if not isinstance(shape, CollisionShape):
+            shape = self.mesh_resource.collision_shape(shape)
+        self._collision_shape = shape
+        Actor.shape_version += 1
 
     def check_collision(self, point):
-        min_cords, max_cords = self.bounding_box
-        return all(min_cords[i] + self.position[i] <= point[i] <= max_cords[i] + self.position[i] for i in range(3))
+        return self.collision_shape.contains(point, self.world_matrix())
+
+    def closest_point(self, point) -> Vector3:
+        return Vector3(*self.collision_shape.closest_point(point, self.world_matrix()))
 
     def apply_force(self, force: Vector3):
+        self.wake()
         self.applied_force += force
 
     def apply_impulse(self, impulse: Vector3, point: Vector3 = None):
+        self.wake()
         self.velocity += impulse * self.inv_mass
-        if point:
+        if point is not None:
             torque = Vector3.cross(point - self.position, impulse)
             self.apply_torque(torque)
 
     def apply_torque(self, torque: Vector3):
-        self.angular_velocity += Vector3(*np.dot(self.inv_inertia_tensor, torque))
+        self.wake()
+        self.angular_velocity += Vector3(*np.dot(self.world_inv_inertia_tensor, torque))
+
+    @property
+    def world_inv_inertia_tensor(self) -> np.ndarray:
+        rotation = self.rotation_matrix
+        return rotation @ self.inv_inertia_tensor @ rotation.T
+
+    def wake(self):
+        if self.sleeping:
+            self.sleeping = False
+            self.sleep_counter = 0
+
+    def sleep(self, island_id: int = -1):
+        self.sleeping = True
+        self.island_id = island_id
+        self.velocity = Vector3(0, 0, 0)
+        self.angular_velocity = Vector3(0, 0, 0)
+        self.rest_position = self.position
 
     def update(self, dt: float):
         dt = float(dt)
@@ -161,18 +310,3 @@ class Actor:
             self.rotate(angle, axis)
 
         self.applied_force = Vector3(0, 0, 0)
-
-    def rotate(self, angle: float, axis: Vector3):
-        quat = [axis.x * np.sin(angle / 2), axis.y * np.sin(angle / 2), axis.z * np.sin(angle / 2), np.cos(angle / 2)]
-        self.rotation = Vector3(*self.quaternion_multiply(quat, [*self.rotation, 0])[:3])
-
-    @staticmethod
-    def quaternion_multiply(q1, q2):
-        w1, x1, y1, z1 = q1
-        w2, x2, y2, z2 = q2
-        return [
-            w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
-            w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
-            w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
-            w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2
-        ]
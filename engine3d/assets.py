@@ -0,0 +1,153 @@
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+
+from .actor import Actor
+from .methods import gen_base_texture, load_mesh_on_file
+from .textures import texture_manager, read_texture
+
+
+class TextureHandle:
+    def __init__(self, file: str, placeholder: int):
+        self.file = file
+        self.texture_id = placeholder
+        self.ready = False
+
+
+class AssetPipeline:
+    def __init__(self, max_workers: int = None, processes: bool = False, upload_budget: float = 0.004,
+                 placeholder_color=(128, 128, 128), clock=time.perf_counter):
+        self.upload_budget = upload_budget
+        self.placeholder_color = placeholder_color
+        self.clock = clock
+
+        # Actors are always built on threads because they share the process-wide mesh cache. Decoding and mesh
+        # generation can go to worker processes instead, functions passed to submit() must then be picklable
+        self.threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="assets")
+        self.decoders = ProcessPoolExecutor(max_workers=max_workers) if processes else self.threads
+
+        # (status, finished worker future, main-thread step, future resolved by that step), in completion order
+        self.uploads = deque()
+        self.placeholder = None
+
+        self.total = 0
+        self.completed = 0
+        self.status = ""
+        self.last_upload_time = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self.completed < self.total
+
+    @property
+    def progress(self) -> float:
+        return self.completed / self.total if self.total else 1.0
+
+    def submit(self, function, *args, status: str = None) -> Future:
+        # For work without GL calls, the future resolves on the worker
+        self._begin(status or getattr(function, "__name__", "Loading..."))
+        future = self.decoders.submit(function, *args)
+        future.add_done_callback(self._finish)
+        return future
+
+    def load_mesh(self, file: str) -> Future:
+        return self.submit(load_mesh_on_file, str(file), status=f"Loading mesh ({file})")
+
+    def load_texture(self, file: str) -> TextureHandle:
+        # Must be called from the GL thread, the handle shows the placeholder until its upload ran. Textures the
+        # texture manager already holds are ready right away
+        key = texture_manager.key(file)
+        texture_id = texture_manager.acquire(key)
+        if texture_id is not None:
+            handle = TextureHandle(str(file), texture_id)
+            handle.ready = True
+            return handle
+
+        if self.placeholder is None:
+            self.placeholder = gen_base_texture(self.placeholder_color)
+        handle = TextureHandle(str(file), self.placeholder)
+
+        def finish(image):
+            handle.texture_id = texture_manager.upload(key, image)
+            handle.ready = True
+            return handle
+
+        work = self.decoders.submit(read_texture, key[0], texture_manager.mipmaps, texture_manager.cache_directory,
+                                    texture_manager.compression)
+        self._queue(f"Loading texture ({file})", work, finish)
+        return handle
+
+    def add_actor(self, mesh, texture=None, on_ready=None, **actor_kwargs) -> Future:
+        # mesh is a Mesh/LODChain, a future from submit()/load_mesh() or a function returning one. Derived data
+        # and vertex buffers are built on a worker, on_ready(actor) runs on the GL thread (Engine3D.add_game_object)
+        def build():
+            resolved = mesh
+            if isinstance(resolved, Future):
+                resolved = resolved.result()
+            elif callable(resolved):
+                resolved = self.decoders.submit(resolved).result() if self.decoders is not self.threads \
+                    else resolved()
+
+            actor = Actor(mesh=resolved, texture=texture, **actor_kwargs)
+            for resource in actor.lod_resources:
+                resource.build_vertex_buffers()
+            return actor
+
+        def finish(actor):
+            if on_ready is not None:
+                on_ready(actor)
+            return actor
+
+        return self._queue("Loading scene (actors)", self.threads.submit(build), finish)
+
+    def process_uploads(self, budget: float = None):
+        # Runs finished main-thread steps until the budget is spent; at least one per call so a step that is
+        # longer than the budget on its own (a large texture) still gets through
+        budget = self.upload_budget if budget is None else budget
+        start = self.clock()
+        while self.uploads:
+            status, work, step, result = self.uploads.popleft()
+            self.status = status
+            try:
+                result.set_result(step(work.result()))
+            except BaseException as error:
+                result.set_exception(error)
+                raise
+            finally:
+                self._finish()
+
+            if self.clock() - start >= budget:
+                break
+        self.last_upload_time = self.clock() - start
+
+    def wait(self):
+        # Blocks until everything submitted so far is loaded and uploaded, for scenes that need all of it
+        while self.busy:
+            self.process_uploads(budget=float("inf"))
+            if self.busy:
+                time.sleep(0.001)
+
+    def shutdown(self):
+        self.threads.shutdown(wait=False, cancel_futures=True)
+        if self.decoders is not self.threads:
+            self.decoders.shutdown(wait=False, cancel_futures=True)
+
+    def _queue(self, status: str, work: Future, step) -> Future:
+        self._begin(status)
+        result = Future()
+        work.add_done_callback(lambda done: self.uploads.append((status, done, step, result)))
+        return result
+
+    def _begin(self, status: str):
+        with self._lock:
+            if not self.busy:
+                self.total = self.completed = 0
+            self.total += 1
+            self.status = status
+
+    def _finish(self, _=None):
+        with self._lock:
+            self.completed += 1
@@ -0,0 +1,180 @@
+import threading
+
+import numpy as np
+
+from PIL import Image
+from OpenGL.GL import *
+
+from .textures import texture_manager, decode_texture
+
+
+class AtlasRegion:
+    def __init__(self, atlas, uv_rect: tuple):
+        self.atlas = atlas
+        self.uv_rect = uv_rect
+
+    @property
+    def texture_id(self) -> int:
+        return self.atlas.texture_id
+
+
+class TextureAtlas:
+    def __init__(self, size: int = 2048, padding: int = 4):
+        self.size = size
+        self.padding = padding
+        self.pixels = np.zeros((size, size, 4), dtype=np.uint8)
+
+        # Shelf packing: rows of [y, height, next free x]
+        self.shelves = []
+        self.next_shelf = 0
+        self.regions = 0
+
+        self._texture_id = None
+        self._dirty = []
+        self._lock = threading.Lock()
+
+    @property
+    def texture_id(self) -> int:
+        # Regions can be added from asset loader threads, the pixels reach the GPU on the next GL-thread access
+        if self._dirty or self._texture_id is None:
+            self.upload()
+        return self._texture_id
+
+    def allocate(self, width: int, height: int):
+        for shelf in self.shelves:
+            if height <= shelf[1] and shelf[2] + width <= self.size:
+                x = shelf[2]
+                shelf[2] += width
+                return x, shelf[0]
+
+        if self.next_shelf + height > self.size or width > self.size:
+            return None
+        self.shelves.append([self.next_shelf, height, width])
+        self.next_shelf += height
+        return 0, self.shelves[-1][0]
+
+    def add(self, pixels: np.ndarray, solid: bool = False):
+        # pixels is (height, width, 4) RGBA. The border is filled with copies of the edge pixels so linear
+        # filtering and the first mip levels never pick up a neighbour
+        height, width = pixels.shape[:2]
+        padding = self.padding
+        with self._lock:
+            origin = self.allocate(width + 2 * padding, height + 2 * padding)
+            if origin is None:
+                return None
+
+            x, y = origin
+            self.pixels[y:y + height + 2 * padding, x:x + width + 2 * padding] = np.pad(
+                pixels, ((padding, padding), (padding, padding), (0, 0)), mode="edge")
+            self._dirty.append((x, y, width + 2 * padding, height + 2 * padding))
+            self.regions += 1
+
+        u0, v0 = (x + padding) / self.size, (y + padding) / self.size
+        u1, v1 = u0 + width / self.size, v0 + height / self.size
+        if solid:
+            # Every UV of a solid color region collapses to its center texel
+            u0 = u1 = (u0 + u1) / 2
+            v0 = v1 = (v0 + v1) / 2
+        return AtlasRegion(self, (u0, v0, u1, v1))
+
+    def upload(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, []
+
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        if self._texture_id is None:
+            self._texture_id = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self._texture_id)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, self.size, self.size, 0, GL_RGBA, GL_UNSIGNED_BYTE, self.pixels)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        else:
+            glBindTexture(GL_TEXTURE_2D, self._texture_id)
+            for x, y, width, height in dirty:
+                glTexSubImage2D(GL_TEXTURE_2D, 0, x, y, width, height, GL_RGBA, GL_UNSIGNED_BYTE,
+                                np.ascontiguousarray(self.pixels[y:y + height, x:x + width]))
+
+        if bool(glGenerateMipmap):
+            # Only as many levels as the padding keeps apart, deeper ones would blend neighbouring regions
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, max(int(np.log2(max(self.padding, 1))), 0))
+            glGenerateMipmap(GL_TEXTURE_2D)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+        else:
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+
+    def release_gpu(self):
+        if self._texture_id is not None:
+            glDeleteTextures(1, [self._texture_id])
+            self._texture_id = None
+
+
+class AtlasBuilder:
+    def __init__(self, atlas_size: int = 2048, max_texture_size: int = 512, padding: int = 4):
+        self.atlas_size = atlas_size
+        self.max_texture_size = max_texture_size
+        self.padding = padding
+        self.atlases = []
+
+        self._regions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.atlases)
+
+    def add(self, key, pixels: np.ndarray, solid: bool = False):
+        # None when the image is too large for an atlas, it should then keep a texture of its own
+        height, width = pixels.shape[:2]
+        if not self.fits(width, height):
+            return None
+
+        with self._lock:
+            region = self._regions.get(key)
+            if region is not None:
+                return region
+
+            for atlas in self.atlases:
+                region = atlas.add(pixels, solid)
+                if region is not None:
+                    break
+            else:
+                atlas = TextureAtlas(self.atlas_size, self.padding)
+                self.atlases.append(atlas)
+                region = atlas.add(pixels, solid)
+
+            self._regions[key] = region
+            return region
+
+    def fits(self, width: int, height: int) -> bool:
+        return max(width, height) <= min(self.max_texture_size, self.atlas_size - 2 * self.padding)
+
+    def solid_color(self, color) -> AtlasRegion:
+        # Replaces the 1x1 texture every untextured actor used to get. No GL calls, usable from any thread
+        color = tuple(int(value) for value in color)
+        rgba = color + (255,) * (4 - len(color))
+        return self.add(("color", color), np.full((2, 2, 4), rgba, dtype=np.uint8), solid=True)
+
+    def load(self, file: str):
+        key = texture_manager.key(file)
+        with self._lock:
+            region = self._regions.get(key)
+        if region is not None:
+            return region
+
+        with Image.open(key[0]) as header:
+            if not self.fits(*header.size):
+                return None
+        image = decode_texture(key[0])
+        width, height, data = image.levels[0]
+        pixels = np.frombuffer(data, dtype=np.uint8).reshape(height, width, image.channels)
+        if image.channels == 3:
+            pixels = np.concatenate((pixels, np.full((height, width, 1), 255, dtype=np.uint8)), axis=2)
+        return self.add(key, pixels)
+
+    def release_gpu(self):
+        for atlas in self.atlases:
+            atlas.release_gpu()
+
+
+texture_atlases = AtlasBuilder()
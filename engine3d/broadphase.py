@@ -0,0 +1,306 @@
+import numpy as np
+
+
+class BroadPhase:
+    def __init__(self):
+        self.objects = []
+        self.mins = np.zeros((0, 3))
+        self.maxs = np.zeros((0, 3))
+        self.collidable = np.zeros(0, dtype=bool)
+        self.dynamic = np.zeros(0, dtype=bool)
+        self.awake = np.zeros(0, dtype=bool)
+
+        self._local_min = np.zeros((0, 3))
+        self._local_max = np.zeros((0, 3))
+        self._local_center = np.zeros((0, 3))
+        self._local_extent = np.zeros((0, 3))
+        self._local_radius = np.zeros(0)
+        self._membership_changed = True
+
+    def add(self, obj):
+        self.objects.append(obj)
+        self._membership_changed = True
+        self._on_add(obj, len(self.objects) - 1)
+
+    def add_many(self, objects: list):
+        for obj in objects:
+            self.add(obj)
+
+    def remove(self, obj):
+        index = self.objects.index(obj)
+        del self.objects[index]
+        self._membership_changed = True
+        self._on_remove(obj, index)
+
+    def invalidate_bounds(self):
+        # The collision shapes changed, local bounds are read again on the next update
+        self._membership_changed = True
+
+    def clear(self):
+        for obj in list(self.objects):
+            self.remove(obj)
+
+    def update(self, positions: np.ndarray = None, collidable: np.ndarray = None, dynamic: np.ndarray = None,
+               awake: np.ndarray = None, matrices: np.ndarray = None):
+        # Bounds of the collision shapes. With world matrices they follow rotation and parents and positions is not
+        # read, otherwise the local box is only moved to the position
+        if self._membership_changed:
+            self._rebuild_local_bounds()
+
+        if matrices is None and positions is None:
+            positions = self._gather_positions()
+        if collidable is None:
+            collidable = np.fromiter((obj.collision for obj in self.objects), dtype=bool, count=len(self.objects))
+        if dynamic is None:
+            dynamic = np.fromiter((obj.physic for obj in self.objects), dtype=bool, count=len(self.objects))
+        if awake is None:
+            awake = np.ones(len(self.objects), dtype=bool)
+
+        if matrices is None:
+            self.mins = positions + self._local_min
+            self.maxs = positions + self._local_max
+        else:
+            # Box of the rotated mesh box, clipped to the box of the bounding sphere which never grows with rotation
+            rotations = matrices[:, :3, :3]
+            positions = matrices[:, :3, 3]
+            centers = positions + np.einsum("nij,nj->ni", rotations, self._local_center)
+            extents = np.einsum("nij,nj->ni", np.abs(rotations), self._local_extent)
+            radii = self._local_radius[:, np.newaxis]
+            self.mins = np.maximum(centers - extents, positions - radii)
+            self.maxs = np.minimum(centers + extents, positions + radii)
+        self.collidable = collidable
+        self.dynamic = dynamic
+        self.awake = awake
+
+        self._update_structure()
+        self._membership_changed = False
+
+    def find_pairs(self):
+        raise NotImplementedError
+
+    def candidate_pairs(self):
+        first, second = self.find_pairs()
+        objects = self.objects
+        return [(objects[i], objects[j]) for i, j in zip(first.tolist(), second.tolist())]
+
+    def _on_add(self, obj, index: int):
+        pass
+
+    def _on_remove(self, obj, index: int):
+        pass
+
+    def _update_structure(self):
+        pass
+
+    def _rebuild_local_bounds(self):
+        count = len(self.objects)
+        self._local_min = np.empty((count, 3))
+        self._local_max = np.empty((count, 3))
+        for index, obj in enumerate(self.objects):
+            self._local_min[index], self._local_max[index] = obj.collision_shape.local_bounds()
+        self._local_center = (self._local_min + self._local_max) / 2
+        self._local_extent = (self._local_max - self._local_min) / 2
+        self._local_radius = np.fromiter((obj.collision_shape.bounding_radius for obj in self.objects), np.float64,
+                                         count)
+
+    def _gather_positions(self):
+        count = len(self.objects)
+        flat = np.fromiter((c for obj in self.objects for c in obj.position), dtype=np.float64, count=count * 3)
+        return flat.reshape(count, 3)
+
+    def _filter_pairs(self, first: np.ndarray, second: np.ndarray):
+        if len(first) == 0:
+            return first, second
+
+        keep = self.collidable[first] & self.collidable[second]
+        # A pair needs an awake dynamic body, a static one never wakes a body resting on it
+        moving = self.dynamic & self.awake
+        keep &= moving[first] | moving[second]
+        first, second = first[keep], second[keep]
+
+        for axis in range(3):
+            mins, maxs = self.mins[:, axis], self.maxs[:, axis]
+            keep = (maxs[first] >= mins[second]) & (mins[first] <= maxs[second])
+            first, second = first[keep], second[keep]
+
+        low = np.minimum(first, second)
+        high = np.maximum(first, second)
+        order = np.lexsort((high, low))
+        return low[order], high[order]
+
+    @staticmethod
+    def _expand_ranges(starts: np.ndarray, counts: np.ndarray):
+        total = int(counts.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+        owners = np.repeat(np.arange(len(starts)), counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return owners, np.repeat(starts, counts) + offsets
+
+
+class BruteForce(BroadPhase):
+    def find_pairs(self):
+        count = len(self.objects)
+        first, second = np.triu_indices(count, k=1)
+        return self._filter_pairs(first, second)
+
+
+class SweepAndPrune(BroadPhase):
+    def __init__(self, capacity: int = 64, strip_size: float = None):
+        super().__init__()
+        self.axis = 0
+        # Bodies are also binned into strips along the axis of the second largest spread and only swept against the
+        # bodies of their own strips, a single axis leaves far too many candidates in dense scenes. None - picked
+        # from the average body size like SpatialHashGrid cells
+        self.strip_axis = 1
+        self.strip_size = strip_size
+        self._auto_strip_size = strip_size is None
+        # Body indices sorted along the axis in the first len(self.objects) rows, grown by doubling like the body
+        # arrays of PhysicsWorld so streaming bodies in one by one stays linear
+        self._order_buffer = np.zeros(capacity, dtype=np.intp)
+
+    @property
+    def _order(self) -> np.ndarray:
+        return self._order_buffer[:len(self.objects)]
+
+    def _on_add(self, obj, index: int):
+        current = len(self._order_buffer)
+        if index >= current:
+            grown = np.zeros(max(index + 1, current * 2), dtype=np.intp)
+            grown[:current] = self._order_buffer
+            self._order_buffer = grown
+        self._order_buffer[index] = index
+
+    def _on_remove(self, obj, index: int):
+        count = len(self.objects)
+        order = self._order_buffer[:count + 1]
+        order = order[order != index]
+        order[order > index] -= 1
+        self._order_buffer[:count] = order
+
+    def _update_structure(self):
+        if len(self.objects) < 2:
+            return
+
+        centers = (self.mins + self.maxs) * 0.5
+        self.axis, self.strip_axis = np.argsort(np.var(centers, axis=0))[:0:-1].tolist()
+        if self._auto_strip_size:
+            extents = self.maxs[:, self.strip_axis] - self.mins[:, self.strip_axis]
+            self.strip_size = max(float(np.mean(extents)) * 2.0, 1e-3)
+
+        # The order from the previous step is almost sorted, which the stable sort handles in near-linear time
+        order = self._order
+        order[:] = order[np.argsort(self.mins[order, self.axis], kind="stable")]
+
+    def find_pairs(self):
+        count = len(self.objects)
+        if count < 2:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty
+
+        # One entry per body and strip it reaches, in strip order and sorted along the axis within a strip
+        low = np.floor(self.mins[:, self.strip_axis] / self.strip_size).astype(np.int64)
+        high = np.floor(self.maxs[:, self.strip_axis] / self.strip_size).astype(np.int64)
+        spans = (high - low + 1)[self._order]
+        entries, strips = self._expand_ranges(low[self._order], spans)
+        grouped = np.argsort(strips, kind="stable")
+        bodies = self._order[entries[grouped]]
+        strips = strips[grouped]
+
+        # Shifting each strip past the previous one lets a single searchsorted stop every sweep at its strip end
+        mins, maxs = self.mins[:, self.axis], self.maxs[:, self.axis]
+        shift = (strips - low.min()) * (maxs.max() - mins.min() + 1.0)
+        sorted_mins = mins[bodies] + shift
+        sorted_maxs = maxs[bodies] + shift
+
+        starts = np.arange(1, len(bodies) + 1)
+        ends = np.searchsorted(sorted_mins, sorted_maxs, side="right")
+        counts = np.maximum(ends - starts, 0)
+
+        owners, others = self._expand_ranges(starts, counts)
+        # Bodies sharing several strips meet in each of them, the pair is kept in the first one
+        first, second = bodies[owners], bodies[others]
+        shared = strips[owners] == np.maximum(low[first], low[second])
+        return self._filter_pairs(first[shared], second[shared])
+
+
+class SpatialHashGrid(BroadPhase):
+    def __init__(self, cell_size: float = None):
+        super().__init__()
+        self.cell_size = cell_size
+        self.cells = {}
+
+        self._auto_cell_size = cell_size is None
+        self._ranges = {}
+
+    def _on_remove(self, obj, index: int):
+        cell_range = self._ranges.pop(id(obj), None)
+        if cell_range is not None:
+            self._remove_from_cells(id(obj), *cell_range)
+
+    def _update_structure(self):
+        if len(self.objects) == 0:
+            return
+
+        if self._auto_cell_size and self._membership_changed:
+            extents = self.maxs - self.mins
+            cell_size = max(float(np.mean(np.max(extents, axis=1))) * 2.0, 1e-3)
+            if cell_size != self.cell_size:
+                self.cell_size = cell_size
+                self.cells.clear()
+                self._ranges.clear()
+
+        low = np.floor(self.mins / self.cell_size).astype(np.int64)
+        high = np.floor(self.maxs / self.cell_size).astype(np.int64)
+
+        for index, obj in enumerate(self.objects):
+            key = id(obj)
+            cell_range = (tuple(low[index].tolist()), tuple(high[index].tolist()))
+            previous = self._ranges.get(key)
+            if previous == cell_range:
+                continue
+
+            if previous is not None:
+                self._remove_from_cells(key, *previous)
+            self._insert_into_cells(key, *cell_range)
+            self._ranges[key] = cell_range
+
+    def find_pairs(self):
+        index_of = {id(obj): index for index, obj in enumerate(self.objects)}
+
+        pairs = set()
+        for members in self.cells.values():
+            if len(members) < 2:
+                continue
+            indices = sorted(index_of[key] for key in members)
+            for position, first in enumerate(indices):
+                for second in indices[position + 1:]:
+                    pairs.add((first, second))
+
+        if not pairs:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty
+
+        pair_array = np.array(list(pairs), dtype=np.intp)
+        return self._filter_pairs(pair_array[:, 0], pair_array[:, 1])
+
+    def _insert_into_cells(self, key: int, low: tuple, high: tuple):
+        for cell in self._iterate_cells(low, high):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def _remove_from_cells(self, key: int, low: tuple, high: tuple):
+        for cell in self._iterate_cells(low, high):
+            members = self.cells.get(cell)
+            if members is None:
+                continue
+            members.discard(key)
+            if not members:
+                del self.cells[cell]
+
+    @staticmethod
+    def _iterate_cells(low: tuple, high: tuple):
+        for x in range(low[0], high[0] + 1):
+            for y in range(low[1], high[1] + 1):
+                for z in range(low[2], high[2] + 1):
+                    yield x, y, z
@@ -5,6 +5,7 @@ from pygame.math import Vector3
 from OpenGL.GLU import *
 
 from engine3d.actor import Actor
+from engine3d.culling import look_at_matrix
 
 
 class Camera:
@@ -26,6 +27,9 @@ class Camera:
             self.up.x, self.up.y, self.up.z
         )
 
+    def view_matrix(self):
+        return look_at_matrix(self.position, self.position + self.front, self.up)
+
     def rotate(self, x_offset, y_offset):
         sensitivity = 0.1
         self.yaw += x_offset * sensitivity
@@ -51,8 +55,4 @@ class Camera:
 
     @staticmethod
     def find_closest_point(point, obj):
-        min_cords, max_cords = obj.bounding_box
-        closest = Vector3()
-        for i in range(3):
-            closest[i] = max(min_cords[i] + obj.position[i], min(point[i], max_cords[i] + obj.position[i]))
-        return closest
+        return obj.closest_point(point)
@@ -1,5 +1,63 @@
+import numpy as np
+
+
 class Mesh:
-    def __init__(self, vertices: list, faces: list, uvs: list):
-        self.vertices = vertices
-        self.faces = faces
-        self.uvs = uvs
+    def __init__(self, vertices, faces, uvs):
+        # Arrays are kept as passed when they already have the right dtype, lists are converted once
+        self.vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+        self.faces = np.asarray(faces, dtype=np.int32).reshape(-1, 3)
+        self.uvs = np.asarray(uvs, dtype=np.float32).reshape(-1, 3, 2)
+
+
+class IndexedMesh(Mesh):
+    def __init__(self, positions, normals, uvs, indices, bounding_box=None, vertex_block=None,
+                 vertex_offsets: tuple = None):
+        # Already welded per-vertex attributes, as stored in binary mesh files. When the three attributes lie
+        # in one contiguous block (a memory-mapped file) it is uploaded as is, vertex_offsets giving where
+        # positions, normals and UVs start in it
+        self.positions = positions
+        self.normals = normals
+        self.vertex_uvs = uvs
+        self.indices = indices
+        self.bounding_box = bounding_box
+        self.vertex_block = vertex_block
+        self.vertex_offsets = vertex_offsets
+        self._corner_uvs = None
+
+    @property
+    def vertices(self):
+        return self.positions
+
+    @property
+    def faces(self):
+        faces = self.indices.reshape(-1, 3)
+        return faces.view(np.int32) if faces.dtype == np.uint32 else faces.astype(np.int32)
+
+    @property
+    def uvs(self):
+        # Per-corner UVs like Mesh.uvs, only built when something asks for them
+        if self._corner_uvs is None:
+            self._corner_uvs = self.vertex_uvs[self.faces]
+        return self._corner_uvs
+
+
+class LODChain:
+    def __init__(self, meshes: list, screen_sizes: list = None, hysteresis: float = 0.15):
+        # meshes go from the finest to the coarsest, screen_sizes[i] is the projected diameter in pixels
+        # below which level i + 1 is drawn instead of level i
+        self.meshes = meshes
+        self.screen_sizes = screen_sizes if screen_sizes is not None else [
+            400 / 3 ** level for level in range(len(meshes) - 1)
+        ]
+        self.hysteresis = hysteresis
+
+    def __len__(self):
+        return len(self.meshes)
+
+    def select(self, level: int, screen_size: float) -> int:
+        # Switching needs to cross the threshold by the hysteresis margin, so sizes hovering around it don't pop
+        while level < len(self.screen_sizes) and screen_size < self.screen_sizes[level] * (1 - self.hysteresis):
+            level += 1
+        while level > 0 and screen_size > self.screen_sizes[level - 1] * (1 + self.hysteresis):
+            level -= 1
+        return level
@@ -0,0 +1,151 @@
+import math
+
+import numpy as np
+
+
+# Shape kinds, their index is the kind code of ShapeTable. An "aabb" keeps its box aligned with the world axes
+# (the box around the rotated local box), an "obb" turns with the actor
+SPHERE = "sphere"
+AABB = "aabb"
+OBB = "obb"
+CAPSULE = "capsule"
+SHAPE_KINDS = (SPHERE, AABB, OBB, CAPSULE)
+
+
+class CollisionShape:
+    # Collision volume in the local space of an actor. Boxes use center and half_extents, spheres center and
+    # radius, capsules a segment of 2 * half_height along the local axis `axis` through center, grown by radius
+    def __init__(self, kind: str, center=(0.0, 0.0, 0.0), half_extents=(0.0, 0.0, 0.0), radius: float = 0.0,
+                 axis: int = 1, half_height: float = 0.0):
+        if kind not in SHAPE_KINDS:
+            raise ValueError(f"Unknown collision shape {kind!r}, expected one of {SHAPE_KINDS}")
+        self.kind = kind
+        self.center = np.array(center, dtype=np.float64)
+        self.half_extents = np.array(half_extents, dtype=np.float64)
+        self.radius = float(radius)
+        self.axis = int(axis)
+        self.half_height = float(half_height)
+
+    @classmethod
+    def sphere(cls, radius: float, center=(0.0, 0.0, 0.0)):
+        return cls(SPHERE, center, radius=radius)
+
+    @classmethod
+    def box(cls, half_extents, center=(0.0, 0.0, 0.0), oriented: bool = True):
+        return cls(OBB if oriented else AABB, center, half_extents)
+
+    @classmethod
+    def capsule(cls, radius: float, half_height: float, axis: int = 1, center=(0.0, 0.0, 0.0)):
+        return cls(CAPSULE, center, radius=radius, axis=axis, half_height=half_height)
+
+    @classmethod
+    def fit(cls, vertices: np.ndarray, kind: str = None):
+        # Shape of the given kind around the vertices, None - the smallest of a sphere, a capsule and an obb,
+        # in that order on (nearly) equal volumes
+        if kind is not None and kind not in SHAPE_KINDS:
+            raise ValueError(f"Unknown collision shape {kind!r}, expected one of {SHAPE_KINDS}")
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        if not len(vertices):
+            return cls(kind or SPHERE)
+
+        low, high = vertices.min(axis=0), vertices.max(axis=0)
+        center = (low + high) / 2
+        half_extents = (high - low) / 2
+        offsets = vertices - center
+        if kind in (AABB, OBB):
+            return cls(kind, center, half_extents)
+
+        shapes = [cls(SPHERE, center, radius=np.sqrt(np.max(np.einsum("ij,ij->i", offsets, offsets))))]
+        if kind is None or kind == CAPSULE:
+            # Along the longest side, radius from the farthest vertex off the axis, then a segment just long
+            # enough for the vertices past the hemispheres
+            axis = int(np.argmax(half_extents))
+            along = np.abs(offsets[:, axis])
+            across = np.sum(np.delete(offsets, axis, axis=1) ** 2, axis=1)
+            radius = np.sqrt(np.max(across))
+            half_height = max(float(np.max(along - np.sqrt(np.maximum(radius ** 2 - across, 0.0)))), 0.0)
+            shapes.append(cls(CAPSULE, center, radius=radius, axis=axis, half_height=half_height))
+        if kind is None:
+            shapes.append(cls(OBB, center, half_extents))
+            smallest = min(shape.volume for shape in shapes)
+            return next(shape for shape in shapes if shape.volume <= smallest * (1 + 1e-6))
+        return shapes[-1]
+
+    @property
+    def volume(self) -> float:
+        if self.kind == SPHERE:
+            return 4 / 3 * math.pi * self.radius ** 3
+        if self.kind == CAPSULE:
+            return math.pi * self.radius ** 2 * (2 * self.half_height + 4 / 3 * self.radius)
+        return float(np.prod(2 * self.half_extents))
+
+    def local_bounds(self):
+        # (min, max) of the local box around the shape
+        if self.kind in (AABB, OBB):
+            extent = self.half_extents
+        else:
+            extent = np.full(3, self.radius)
+            extent[self.axis] += self.half_height
+        return self.center - extent, self.center + extent
+
+    @property
+    def bounding_radius(self) -> float:
+        # Of the sphere around the shape centered on the local origin, it bounds the shape however it turns
+        if self.kind in (AABB, OBB):
+            return float(np.linalg.norm(self.center) + np.linalg.norm(self.half_extents))
+        return float(np.linalg.norm(self.center)) + self.half_height + self.radius
+
+    def closest_point(self, point, matrix: np.ndarray) -> np.ndarray:
+        # Closest world space point of the shape placed by a model matrix, the point itself when inside
+        point = np.asarray(point, dtype=np.float64)
+        rotation, position = matrix[:3, :3], matrix[:3, 3]
+        center = position + rotation @ self.center
+        if self.kind == AABB:
+            half_extents = np.abs(rotation) @ self.half_extents
+            return np.clip(point, center - half_extents, center + half_extents)
+        if self.kind == OBB:
+            local = np.clip(rotation.T @ (point - center), -self.half_extents, self.half_extents)
+            return center + rotation @ local
+
+        if self.kind == CAPSULE:
+            direction = rotation[:, self.axis]
+            center = center + direction * np.clip((point - center) @ direction, -self.half_height, self.half_height)
+        offset = point - center
+        distance = np.linalg.norm(offset)
+        if distance <= self.radius:
+            return point
+        return center + offset * (self.radius / distance)
+
+    def contains(self, point, matrix: np.ndarray) -> bool:
+        point = np.asarray(point, dtype=np.float64)
+        return bool(np.linalg.norm(self.closest_point(point, matrix) - point) <= 1e-9)
+
+
+class ShapeTable:
+    # The shapes of a list of bodies as arrays for the batched tests in narrowphase
+    def __init__(self, shapes: list):
+        count = len(shapes)
+        self.kinds = np.fromiter((SHAPE_KINDS.index(shape.kind) for shape in shapes), np.int8, count)
+        self.centers = np.array([shape.center for shape in shapes], dtype=np.float64).reshape(count, 3)
+        self.half_extents = np.array([shape.half_extents for shape in shapes], dtype=np.float64).reshape(count, 3)
+        self.radii = np.fromiter((shape.radius for shape in shapes), np.float64, count)
+        self.axes = np.fromiter((shape.axis for shape in shapes), np.intp, count)
+        self.half_heights = np.fromiter((shape.half_height for shape in shapes), np.float64, count)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def world(self, matrices: np.ndarray):
+        # (centers, rotations, half extents, half segments) in world space. Boxes of AABB shapes get the identity
+        # rotation and the extents of the rotated box, capsule segments run from center - half to center + half
+        rotations = np.array(matrices[:, :3, :3], dtype=np.float64)
+        centers = matrices[:, :3, 3] + np.einsum("nij,nj->ni", rotations, self.centers)
+        half_segments = rotations[np.arange(len(self)), :, self.axes] * self.half_heights[:, np.newaxis]
+
+        half_extents = self.half_extents
+        aligned = self.kinds == SHAPE_KINDS.index(AABB)
+        if np.any(aligned):
+            half_extents = half_extents.copy()
+            half_extents[aligned] = np.einsum("nij,nj->ni", np.abs(rotations[aligned]), half_extents[aligned])
+            rotations[aligned] = np.identity(3)
+        return centers, rotations, half_extents, half_segments
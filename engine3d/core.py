@@ -5,110 +5,32 @@ from OpenGL.GLU import *
 
 import importlib
 
+import numpy as np
+
 import sys
 import glfw
 import imgui
 from imgui.integrations.glfw import GlfwRenderer
 
 from .actor import Actor
+from .broadphase import SweepAndPrune, SpatialHashGrid, BruteForce
+from .physics import PhysicsEngine, PhysicsWorld
 from .hud import HUDComponent
+from .timestep import FixedTimestep
+from .frame_pacer import FramePacer
+from .instancing import InstancedRenderer
+from .mesh_cache import mesh_cache
+from .textures import texture_manager
+from .atlas import texture_atlases
+from .render_queue import RenderQueue
+from .lighting import ShaderLighting, ShaderBackend
+from .light_clusters import ClusteredLighting, ClusterGrid
+from .shadows import ShadowRenderer
+from .transforms import SceneGraph
+from .culling import FrustumCuller, Frustum, perspective_matrix, projected_diameters
 from .light import Light
 from .loading_screen import LoadingScreen
-
-
-class PhysicsEngine:
-    def __init__(self, basic_gravity: Vector3 = Vector3(0, 0, 0)):  # Vector3(0, -9.8, 0) - earth gravity
-        self.basic_gravity = basic_gravity
-        self.objects = []
-
-    def update(self, dt: float):
-        for obj in self.objects:
-            if obj.physic:
-                gravitational_force = self.basic_gravity * obj.mass
-                obj.apply_force(gravitational_force)
-            obj.update(dt=float(dt))
-
-        self.handle_collisions()
-
-    def handle_collisions(self):
-        for i, obj1 in enumerate(self.objects):
-            for obj2 in self.objects[i + 1:]:
-                if obj1.collision and obj2.collision:
-                    if self.check_collision(obj1, obj2):
-                        self.resolve_collision(obj1, obj2)
-
-    def resolve_collision(self, obj1, obj2):
-        if not (obj1.physic or obj2.physic):
-            return
-
-        collision_point = self.find_collision_point(obj1, obj2)
-        collision_normal = (obj2.position - obj1.position).normalize()
-
-        rel_velocity = obj2.velocity - obj1.velocity
-        if obj1.physic and obj2.physic:
-            rel_velocity += Vector3.cross(obj2.angular_velocity, collision_point - obj2.position)
-            rel_velocity -= Vector3.cross(obj1.angular_velocity, collision_point - obj1.position)
-
-        rel_normal_velocity = rel_velocity.dot(collision_normal)
-        if rel_normal_velocity > 0:
-            return
-
-        e = min(obj1.restitution, obj2.restitution)
-        j = -(1 + e) * rel_normal_velocity
-        j /= obj1.inv_mass + obj2.inv_mass
-
-        impulse = collision_normal * j
-
-        if obj1.physic:
-            obj1.apply_impulse(-impulse, collision_point - obj1.position)
-        if obj2.physic:
-            obj2.apply_impulse(impulse, collision_point - obj2.position)
-
-        tangent = rel_velocity - (rel_velocity.dot(collision_normal) * collision_normal)
-        if tangent.magnitude() > 0:
-            tangent = tangent.normalize()
-            friction_impulse = -tangent * j * min(obj1.friction, obj2.friction)
-
-            if obj1.physic:
-                obj1.apply_impulse(-friction_impulse, collision_point - obj1.position)
-            if obj2.physic:
-                obj2.apply_impulse(friction_impulse, collision_point - obj2.position)
-
-        penetration_depth = self.calculate_penetration_depth(obj1, obj2)
-        percent = 0.8
-        slop = 0.01
-        correction = max(penetration_depth - slop, 0) / (obj1.inv_mass + obj2.inv_mass) * percent * collision_normal
-
-        if obj1.physic:
-            obj1.position -= correction * obj1.inv_mass
-        if obj2.physic:
-            obj2.position += correction * obj2.inv_mass
-
-    @staticmethod
-    def find_collision_point(obj1, obj2):
-        # Simplified collision point calculation (center of overlap)
-        return (obj1.position + obj2.position) * 0.5
-
-    @staticmethod
-    def check_collision(obj1, obj2):
-        min1, max1 = obj1.bounding_box
-        min2, max2 = obj2.bounding_box
-        return all(
-            max1[i] + obj1.position[i] >= min2[i] + obj2.position[i] and
-            min1[i] + obj1.position[i] <= max2[i] + obj2.position[i]
-            for i in range(3)
-        )
-
-    @staticmethod
-    def calculate_penetration_depth(obj1, obj2):
-        min1, max1 = obj1.bounding_box
-        min2, max2 = obj2.bounding_box
-        overlap = [
-            min(max1[i] + obj1.position[i], max2[i] + obj2.position[i]) -
-            max(min1[i] + obj1.position[i], min2[i] + obj2.position[i])
-            for i in range(3)
-        ]
-        return min(overlap)
+from .assets import AssetPipeline
 
 
 class Engine3D:
@@ -126,6 +48,9 @@ class Engine3D:
         self.window = self.init_window(width=width, height=height, title=self.config.WINDOW_TITLE, monitor=monitor)
         glfw.make_context_current(self.window)
 
+        vsync = getattr(self.config, "VSYNC", False)
+        glfw.swap_interval(1 if vsync else 0)
+
         imgui.create_context()
         self.impl = GlfwRenderer(self.window)
 
@@ -139,13 +64,22 @@ class Engine3D:
         glMaterialf(GL_FRONT_AND_BACK, GL_SHININESS, 32.0)
         glLightModelfv(GL_LIGHT_MODEL_AMBIENT, [0.0, 0.0, 0.0, 1.0])
 
+        draw_distance = getattr(self.config, "DRAW_DISTANCE", 1000)
+        self.fov = 45
+        self.viewport_size = (width, height)
         glViewport(0, 0, width, height)
         glMatrixMode(GL_PROJECTION)
-        gluPerspective(45, (width / height), 0.1, 1000.0)
+        gluPerspective(self.fov, (width / height), 0.1, draw_distance)
         glMatrixMode(GL_MODELVIEW)
-
-        self.frame_time = 1.0 / self.config.TARGET_FPS
-        self._frame_start_time = None
+        self.projection_matrix = perspective_matrix(self.fov, width / height, 0.1, draw_distance)
+
+        self.frame_pacer = FramePacer(
+            target_fps=self.config.TARGET_FPS,
+            clock=glfw.get_time,
+            vsync=vsync,
+            adaptive=getattr(self.config, "ADAPTIVE_FPS", False),
+            min_fps=getattr(self.config, "MIN_FPS", 30)
+        )
 
         self.running = True
 
@@ -153,11 +87,64 @@ class Engine3D:
         self.game_objects = []
         self.lights = []
         self.max_lights = 8
-        self.physics_engine = PhysicsEngine()
-        self.fixed_time_step = 1 / 60
-        self.accumulated_time = 0
+        # Cached model matrices of every game object and its parents, for drawing and the physics bounds
+        self.scene_graph = SceneGraph()
+        self.physics_engine = self.create_physics_engine()
+        self.physics_engine.scene_graph = self.scene_graph
+        self.timestep = FixedTimestep(
+            step=1 / getattr(self.config, "PHYSICS_RATE", 60),
+            max_substeps=getattr(self.config, "MAX_PHYSICS_SUBSTEPS", 8),
+            max_frame_time=getattr(self.config, "MAX_FRAME_TIME", 0.25)
+        )
+        self.interpolate_transforms = getattr(self.config, "PHYSICS_INTERPOLATION", True)
         self.hud_component = HUDComponent()
+
+        mesh_cache.optimize_vertex_cache = getattr(self.config, "OPTIMIZE_VERTEX_CACHE", False)
+        mesh_cache.compress_vertices = getattr(self.config, "COMPRESS_VERTICES", False)
+        texture_manager.mipmaps = getattr(self.config, "TEXTURE_MIPMAPS", True)
+        texture_manager.cache_directory = getattr(self.config, "TEXTURE_CACHE_DIRECTORY", None)
+        texture_manager.compression = getattr(self.config, "TEXTURE_COMPRESSION", False)
+        texture_atlases.atlas_size = getattr(self.config, "ATLAS_SIZE", 2048)
+        texture_atlases.max_texture_size = getattr(self.config, "ATLAS_MAX_TEXTURE_SIZE", 512)
+
+        # Per-pixel lighting, fixed-function GL_LIGHTi when unsupported. Shadows need the shader path
+        self.lighting = None
+        self.shadows = None
+        lighting_mode = getattr(self.config, "LIGHTING", "clustered")
+        shadows = None
+        if getattr(self.config, "SHADOWS", True):
+            shadows = ShadowRenderer(resolution=getattr(self.config, "SHADOW_MAP_SIZE", 1024),
+                                     max_maps=getattr(self.config, "MAX_SHADOW_MAPS", 4), far=draw_distance)
+        if lighting_mode == "clustered":
+            tiles_x, tiles_y, slices = getattr(self.config, "LIGHT_CLUSTERS", (16, 9, 24))
+            lighting = ClusteredLighting(ClusterGrid(tiles_x, tiles_y, slices, self.fov, width / height, 0.1,
+                                                     draw_distance), viewport=(width, height), shadows=shadows)
+        elif lighting_mode == "shader":
+            lighting = ShaderLighting(max_lights=getattr(self.config, "MAX_LIGHTS", 256),
+                                      max_object_lights=getattr(self.config, "MAX_LIGHTS_PER_OBJECT", 8),
+                                      shadows=shadows)
+        else:
+            lighting = None
+        if lighting is not None and lighting.setup():
+            self.lighting = lighting
+            self.shadows = shadows
+            self.max_lights = lighting.max_lights
+
+        self.instanced_renderer = InstancedRenderer(min_group_size=getattr(self.config, "INSTANCING_MIN_GROUP", 2))
+        if getattr(self.config, "INSTANCED_RENDERING", True):
+            self.instanced_renderer.setup(self.lighting)
+        self.culling = getattr(self.config, "FRUSTUM_CULLING", "flat")
+        self.culler = FrustumCuller(mode=self.culling, leaf_size=getattr(self.config, "CULLING_BVH_LEAF_SIZE", 16))
+        self.culler.scene_graph = self.scene_graph
+        self.render_stats = self.culler.stats
+        self.render_queue = RenderQueue(ShaderBackend(self.lighting) if self.lighting else None)
         self.loading_screen = LoadingScreen()
+        self.assets = AssetPipeline(
+            max_workers=getattr(self.config, "ASSET_WORKERS", None),
+            processes=getattr(self.config, "ASSET_PROCESSES", False),
+            upload_budget=getattr(self.config, "ASSET_UPLOAD_BUDGET", 0.004)
+        )
+        self._streaming_assets = False
 
         self.player = player
 
@@ -183,6 +170,22 @@ class Engine3D:
         self.impl.render(imgui.get_draw_data())
         glfw.swap_buffers(self.window)
 
+    @property
+    def frame_time(self) -> float:
+        return self.frame_pacer.frame_time
+
+    @property
+    def fixed_time_step(self) -> float:
+        return self.timestep.step
+
+    @fixed_time_step.setter
+    def fixed_time_step(self, value: float):
+        self.timestep.set_rate(1 / value)
+
+    @property
+    def accumulated_time(self) -> float:
+        return self.timestep.accumulated_time
+
     def init_window(self, width: int, height: int, title: str, monitor):
         glfw.window_hint(glfw.CONTEXT_VERSION_MAJOR, 3)
         glfw.window_hint(glfw.CONTEXT_VERSION_MINOR, 3)
@@ -197,6 +200,19 @@ class Engine3D:
             sys.exit(1)
         return window
 
+    def create_physics_engine(self):
+        if getattr(self.config, "PHYSICS_BACKEND", "objects") == "world":
+            return PhysicsWorld(broad_phase=self.create_broad_phase())
+        return PhysicsEngine(broad_phase=self.create_broad_phase())
+
+    def create_broad_phase(self):
+        broad_phase = getattr(self.config, "BROAD_PHASE", "sweep_and_prune")
+        if broad_phase == "spatial_hash":
+            return SpatialHashGrid(cell_size=getattr(self.config, "BROAD_PHASE_CELL_SIZE", None))
+        if broad_phase == "brute_force":
+            return BruteForce()
+        return SweepAndPrune()
+
     def handle_inputs(self):
         current_rmb_state = glfw.get_mouse_button(self.window, glfw.MOUSE_BUTTON_RIGHT)
         if current_rmb_state == glfw.PRESS and self.last_rmb_state == glfw.RELEASE:
@@ -234,18 +250,30 @@ class Engine3D:
         obj.__setup_vbo__()
 
         self.game_objects.append(obj)
-        self.physics_engine.objects.append(obj)
+        self.scene_graph.add(obj)
+        self.physics_engine.add_object(obj)
+
+    def add_game_object_async(self, mesh, texture=None, **actor_kwargs):
+        # The actor is built on an asset loader thread and added to the scene from the frame loop, returns a
+        # future of the actor
+        return self.assets.add_actor(mesh, texture, on_ready=self.add_game_object, **actor_kwargs)
+
+    def load_texture_async(self, file: str):
+        return self.assets.load_texture(file)
 
     def add_game_objects(self, objects: list):
         for obj in objects:
             obj.__setup_vbo__()
 
         self.game_objects.extend(objects)
-        self.physics_engine.objects.extend(objects)
+        self.scene_graph.add_many(objects)
+        self.physics_engine.add_objects(objects)
 
     def remove_game_object(self, obj: Actor):
         self.game_objects.remove(obj)
-        self.physics_engine.objects.remove(obj)
+        self.scene_graph.remove(obj)
+        self.physics_engine.remove_object(obj)
+        obj.release()
 
     def add_update_function(self, func):
         self.custom_update_functions.append(func)
@@ -254,12 +282,22 @@ class Engine3D:
         self.custom_update_functions.remove(func)
 
     def add_light(self, light: Light):
-        if len(self.lights) < self.max_lights:
-            light.setup(GL_LIGHT0 + len(self.lights))
+        # max_lights is None with clustered lighting
+        if self.max_lights is None or len(self.lights) < self.max_lights:
+            if self.lighting is None:
+                light.setup(GL_LIGHT0 + len(self.lights))
             self.lights.append(light)
             return True
         return False
 
+    def remove_light(self, light: Light):
+        self.lights.remove(light)
+        if self.lighting is None:
+            # GL_LIGHTi are numbered by position in the list
+            glDisable(GL_LIGHT0 + len(self.lights))
+            for index, remaining in enumerate(self.lights):
+                remaining.setup(GL_LIGHT0 + index)
+
     def render_3d_scene(self):
         current_time = glfw.get_time()
         dt = current_time - self.last_time
@@ -271,20 +309,69 @@ class Engine3D:
         if self.player:
             self.player.update()
 
-        self.accumulated_time += dt
-        while self.accumulated_time >= self.fixed_time_step:
-            self.physics_engine.update(dt=self.fixed_time_step)
-            self.accumulated_time -= self.fixed_time_step
+        self.timestep.advance(dt, self.step_physics)
+        alpha = self.timestep.alpha if self.interpolate_transforms else 1.0
+        self.scene_graph.update(alpha)
+
+        if self.lighting is not None:
+            if self.shadows is not None:
+                self.shadows.update(self.lights, self.game_objects)
+            self.lighting.update(self.lights, self.player.view_matrix() if self.player else np.identity(4))
+        else:
+            for light in self.lights:
+                light.update()
+
+        visible = self.cull(self.game_objects)
+        self.update_lods(visible)
+        remaining = self.instanced_renderer.render(visible, alpha=alpha, light_count=len(self.lights))
+        self.render_queue.submit_actors(remaining, alpha, self.player.position if self.player else (0.0, 0.0, 0.0))
+        self.render_queue.flush()
+
+        instanced = self.instanced_renderer
+        queue = self.render_queue
+        self.render_stats.draw_calls = instanced.draw_calls + queue.draw_calls
+        self.render_stats.texture_binds = instanced.texture_binds + queue.texture_binds
+        self.render_stats.state_changes = instanced.state_changes + queue.state_changes
+        self.render_stats.triangles = instanced.triangles + queue.triangles
+
+    def cull(self, game_objects: list) -> list:
+        if not self.culling:
+            self.render_stats.reset()
+            self.render_stats.submitted = self.render_stats.drawn = len(game_objects)
+            return game_objects
+
+        view = self.player.view_matrix() if self.player else np.identity(4)
+        return self.culler.cull(game_objects, Frustum.from_matrix(self.projection_matrix @ view))
+
+    def update_lods(self, actors: list):
+        actors = [actor for actor in actors if actor.lod_chain is not None]
+        if not actors:
+            return
+
+        eye = np.array(tuple(self.player.position) if self.player else (0.0, 0.0, 0.0))
+        positions = np.array([actor.world_position for actor in actors]).reshape(-1, 3)
+        radii = np.array([actor.bounding_radius for actor in actors])
+        sizes = projected_diameters(positions, radii, eye, self.fov, self.viewport_size[1])
 
-        for light in self.lights:
-            light.update()
+        for actor, size in zip(actors, sizes.tolist()):
+            level = actor.lod_chain.select(actor.lod_level, size)
+            if level != actor.lod_level:
+                actor.set_lod(level)
 
-        for game_object in self.game_objects:
-            game_object.render()
+    def step_physics(self, dt: float):
+        # Every node is snapshotted, only the ones the step moves are drawn in between (Transform.interpolating)
+        nodes = self.scene_graph.nodes if self.interpolate_transforms else []
+        for node in nodes:
+            node.store_previous_transform()
+
+        self.physics_engine.update(dt=dt)
+
+        for node in nodes:
+            node.store_step_version()
 
     def render(self):
         while not glfw.window_should_close(self.window) and self.running:
-            self._frame_start_time = glfw.get_time()
+            self.frame_pacer.begin_frame()
 
             glfw.poll_events()
             self.impl.process_inputs()
@@ -293,6 +380,7 @@ class Engine3D:
                 func()
 
             self.handle_inputs()
+            self.stream_assets()
             self.render_3d_scene()
 
             imgui.new_frame()
@@ -308,20 +396,28 @@ class Engine3D:
             self.impl.render(imgui.get_draw_data())
             glfw.swap_buffers(self.window)
 
-            frame_end_time = glfw.get_time()
-            elapsed_time = frame_end_time - self._frame_start_time
-            remaining_time = self.frame_time - elapsed_time
-
-            if remaining_time > 0:
-                while glfw.get_time() - self._frame_start_time < self.frame_time:
-                    pass
+            self.frame_pacer.end_frame()
 
         self.cleanup()
 
     def draw_ui(self):
         pass
 
+    def stream_assets(self):
+        # While assets stream in the visible loading screen follows the pipeline and hides when it is done
+        self.assets.process_uploads()
+        if self.assets.busy:
+            self._streaming_assets = True
+            self.loading_screen.set_progress(self.assets.progress)
+            self.loading_screen.set_status(self.assets.status)
+        elif self._streaming_assets:
+            self._streaming_assets = False
+            self.loading_screen.set_progress(1.0)
+            self.loading_screen.hide()
+
     def update_loading_progress(self, progress: float, status: str = "Loading..."):
+        self.assets.process_uploads()
+        self._streaming_assets = self._streaming_assets or self.assets.busy
         self.loading_screen.set_progress(progress)
         self.loading_screen.set_status(status)
 
@@ -342,6 +438,11 @@ class Engine3D:
         self.loading_screen.hide()
 
     def cleanup(self):
+        self.assets.shutdown()
+        if self.shadows is not None:
+            self.shadows.release_gpu()
+        if self.lighting is not None:
+            self.lighting.release_gpu()
         self.impl.shutdown()
         glfw.terminate()
 
@@ -0,0 +1,281 @@
+import math
+
+import numpy as np
+
+
+def perspective_matrix(fov_y: float, aspect: float, near: float, far: float) -> np.ndarray:
+    # Same matrix as gluPerspective, row-major for column vectors
+    f = 1.0 / math.tan(math.radians(fov_y) / 2)
+    return np.array([
+        [f / aspect, 0.0, 0.0, 0.0],
+        [0.0, f, 0.0, 0.0],
+        [0.0, 0.0, (far + near) / (near - far), 2 * far * near / (near - far)],
+        [0.0, 0.0, -1.0, 0.0]
+    ])
+
+
+def look_at_matrix(eye, target, up) -> np.ndarray:
+    # Same matrix as gluLookAt
+    eye = np.asarray(eye, dtype=np.float64)
+    forward = np.asarray(target, dtype=np.float64) - eye
+    forward /= np.linalg.norm(forward)
+    side = np.cross(forward, np.asarray(up, dtype=np.float64))
+    side /= np.linalg.norm(side)
+    up = np.cross(side, forward)
+
+    matrix = np.identity(4)
+    matrix[0, :3] = side
+    matrix[1, :3] = up
+    matrix[2, :3] = -forward
+    matrix[:3, 3] = -matrix[:3, :3] @ eye
+    return matrix
+
+
+def projected_diameters(centers: np.ndarray, radii: np.ndarray, eye: np.ndarray, fov_y: float,
+                        viewport_height: float) -> np.ndarray:
+    # Approximate on-screen diameter in pixels of bounding spheres, infinite when the eye is inside one
+    distances = np.linalg.norm(centers - eye, axis=1)
+    scale = viewport_height / math.tan(math.radians(fov_y) / 2)
+    return np.where(distances > radii, radii * scale / np.maximum(distances, 1e-9), np.inf)
+
+
+def _expand_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.intp)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+
+class Frustum:
+    def __init__(self, planes: np.ndarray):
+        # (6, 4) planes a*x + b*y + c*z + d >= 0 inside, normals of unit length
+        self.planes = planes
+        self.normals = planes[:, :3]
+        self.distances = planes[:, 3]
+        self.abs_normals = np.abs(self.normals)
+
+    @classmethod
+    def from_matrix(cls, clip: np.ndarray):
+        # Gribb & Hartmann plane extraction from projection @ view
+        planes = np.array([
+            clip[3] + clip[0],
+            clip[3] - clip[0],
+            clip[3] + clip[1],
+            clip[3] - clip[1],
+            clip[3] + clip[2],
+            clip[3] - clip[2]
+        ])
+        return cls(planes / np.linalg.norm(planes[:, :3], axis=1)[:, np.newaxis])
+
+    def test_spheres(self, centers: np.ndarray, radii: np.ndarray) -> np.ndarray:
+        distances = centers @ self.normals.T + self.distances
+        return np.all(distances >= -radii[:, np.newaxis], axis=1)
+
+    def test_aabbs(self, mins: np.ndarray, maxs: np.ndarray) -> np.ndarray:
+        return self.classify_aabbs(mins, maxs) >= 0
+
+    def classify_aabbs(self, mins: np.ndarray, maxs: np.ndarray) -> np.ndarray:
+        # -1 outside, 0 intersecting, 1 fully inside
+        centers = (mins + maxs) * 0.5
+        extents = (maxs - mins) * 0.5
+        distances = centers @ self.normals.T + self.distances
+        reach = extents @ self.abs_normals.T
+
+        result = np.zeros(len(centers), dtype=np.int8)
+        result[np.all(distances - reach >= 0, axis=1)] = 1
+        result[np.any(distances + reach < 0, axis=1)] = -1
+        return result
+
+
+class RenderStats:
+    def __init__(self):
+        self.submitted = 0
+        self.drawn = 0
+        self.culled = 0
+        self.draw_calls = 0
+        self.nodes_tested = 0
+        self.texture_binds = 0
+        self.state_changes = 0
+        self.triangles = 0
+
+    def reset(self):
+        self.submitted = 0
+        self.drawn = 0
+        self.culled = 0
+        self.draw_calls = 0
+        self.nodes_tested = 0
+        self.texture_binds = 0
+        self.state_changes = 0
+        self.triangles = 0
+
+
+class BoundingVolumeHierarchy:
+    def __init__(self, leaf_size: int = 16):
+        self.leaf_size = leaf_size
+        self.order = np.zeros(0, dtype=np.intp)
+
+        self.node_mins = np.zeros((0, 3))
+        self.node_maxs = np.zeros((0, 3))
+        self.left = np.zeros(0, dtype=np.intp)
+        self.right = np.zeros(0, dtype=np.intp)
+        self.starts = np.zeros(0, dtype=np.intp)
+        self.counts = np.zeros(0, dtype=np.intp)
+        self.levels = []
+
+        self._leaves = np.zeros(0, dtype=np.intp)
+
+    def build(self, centers: np.ndarray, radii: np.ndarray):
+        count = len(centers)
+        order = np.arange(count)
+        left, right, starts, counts, depths = [], [], [], [], []
+
+        # Median split on the widest axis; children always get higher node indices than their parent
+        stack = [(0, count, 0, -1, 0)]
+        while stack:
+            start, end, depth, parent, side = stack.pop()
+            node = len(starts)
+            left.append(-1)
+            right.append(-1)
+            starts.append(start)
+            counts.append(end - start)
+            depths.append(depth)
+            if parent >= 0:
+                (left if side == 0 else right)[parent] = node
+
+            if end - start <= self.leaf_size:
+                continue
+
+            items = order[start:end]
+            axis = int(np.argmax(np.ptp(centers[items], axis=0)))
+            middle = (end - start) // 2
+            order[start:end] = items[np.argpartition(centers[items, axis], middle)]
+            stack.append((start + middle, end, depth + 1, node, 1))
+            stack.append((start, start + middle, depth + 1, node, 0))
+
+        self.order = order
+        self.left = np.array(left, dtype=np.intp)
+        self.right = np.array(right, dtype=np.intp)
+        self.starts = np.array(starts, dtype=np.intp)
+        self.counts = np.array(counts, dtype=np.intp)
+
+        depths = np.array(depths)
+        internal = self.left >= 0
+        self.levels = [np.flatnonzero(internal & (depths == depth)) for depth in range(int(depths.max()), -1, -1)]
+        leaves = np.flatnonzero(~internal)
+        self._leaves = leaves[np.argsort(self.starts[leaves])]
+
+        self.node_mins = np.zeros((len(starts), 3))
+        self.node_maxs = np.zeros((len(starts), 3))
+        self.refit(centers, radii)
+
+    def refit(self, centers: np.ndarray, radii: np.ndarray):
+        if not len(self._leaves):
+            return
+
+        mins = (centers - radii[:, np.newaxis])[self.order]
+        maxs = (centers + radii[:, np.newaxis])[self.order]
+        leaf_starts = self.starts[self._leaves]
+        self.node_mins[self._leaves] = np.minimum.reduceat(mins, leaf_starts, axis=0)
+        self.node_maxs[self._leaves] = np.maximum.reduceat(maxs, leaf_starts, axis=0)
+
+        for nodes in self.levels:
+            self.node_mins[nodes] = np.minimum(self.node_mins[self.left[nodes]], self.node_mins[self.right[nodes]])
+            self.node_maxs[nodes] = np.maximum(self.node_maxs[self.left[nodes]], self.node_maxs[self.right[nodes]])
+
+    def query(self, frustum: Frustum, centers: np.ndarray, radii: np.ndarray):
+        visible = np.zeros(len(centers), dtype=bool)
+        nodes_tested = 0
+        if not len(self._leaves):
+            return visible, nodes_tested
+
+        frontier = np.zeros(1, dtype=np.intp)
+        while len(frontier):
+            nodes_tested += len(frontier)
+            state = frustum.classify_aabbs(self.node_mins[frontier], self.node_maxs[frontier])
+
+            inside = frontier[state == 1]
+            visible[self.order[_expand_ranges(self.starts[inside], self.counts[inside])]] = True
+
+            partial = frontier[state == 0]
+            is_leaf = self.left[partial] < 0
+            leaves = partial[is_leaf]
+            items = self.order[_expand_ranges(self.starts[leaves], self.counts[leaves])]
+            visible[items] = frustum.test_spheres(centers[items], radii[items])
+
+            internal = partial[~is_leaf]
+            frontier = np.concatenate((self.left[internal], self.right[internal]))
+
+        return visible, nodes_tested
+
+
+class FrustumCuller:
+    def __init__(self, mode: str = "flat", leaf_size: int = 16):
+        self.mode = mode
+        self.stats = RenderStats()
+        self.hierarchy = BoundingVolumeHierarchy(leaf_size=leaf_size)
+        # A transforms.SceneGraph, positions of actors outside it are taken as world positions
+        self.scene_graph = None
+
+        self._actors = []
+        self._static = np.zeros(0, dtype=np.intp)
+        self._dynamic = np.zeros(0, dtype=np.intp)
+        self._static_centers = np.zeros((0, 3))
+        self._static_radii = np.zeros(0)
+
+    def invalidate(self):
+        self._actors = []
+
+    def bounding_spheres(self, actors: list):
+        # Spheres around the mesh origin do not depend on rotation; growing them by the distance moved in the
+        # last physics step keeps them valid for every interpolated position in between
+        count = len(actors)
+        centers = np.fromiter((value for actor in actors for value in actor.position), np.float64, count * 3)
+        previous = np.fromiter((value for actor in actors for value in actor.previous_position), np.float64, count * 3)
+        centers = centers.reshape(-1, 3)
+        previous = previous.reshape(-1, 3)
+        radii = np.fromiter((actor.bounding_radius for actor in actors), np.float64, count)
+        radii += np.linalg.norm(centers - previous, axis=1)
+
+        # Actors in the scene graph are placed by their world matrix, which also applies their parents
+        if self.scene_graph is not None:
+            rows = self.scene_graph.rows(actors)
+            placed = rows >= 0
+            centers[placed] = self.scene_graph.world_matrices[rows[placed], :3, 3]
+        return centers, radii
+
+    def cull(self, actors: list, frustum: Frustum) -> list:
+        self.stats.reset()
+        self.stats.submitted = len(actors)
+        if not actors:
+            return []
+
+        if self.mode == "bvh":
+            visible = self.query_hierarchy(actors, frustum)
+        else:
+            visible = frustum.test_spheres(*self.bounding_spheres(actors))
+
+        drawn = [actors[index] for index in np.flatnonzero(visible)]
+        self.stats.drawn = len(drawn)
+        self.stats.culled = len(actors) - len(drawn)
+        return drawn
+
+    def query_hierarchy(self, actors: list, frustum: Frustum) -> np.ndarray:
+        if actors != self._actors:
+            # Static actors are gathered into the hierarchy once per change of the actor list and are never read
+            # again until then, call invalidate() after moving one
+            self._actors = list(actors)
+            is_static = np.fromiter((actor.static for actor in actors), bool, len(actors))
+            self._static = np.flatnonzero(is_static)
+            self._dynamic = np.flatnonzero(~is_static)
+            self._static_centers, self._static_radii = self.bounding_spheres([actors[i] for i in self._static])
+            self.hierarchy.build(self._static_centers, self._static_radii)
+
+        visible = np.zeros(len(actors), dtype=bool)
+        if len(self._static):
+            static_visible, self.stats.nodes_tested = self.hierarchy.query(
+                frustum, self._static_centers, self._static_radii)
+            visible[self._static] = static_visible
+        if len(self._dynamic):
+            visible[self._dynamic] = frustum.test_spheres(*self.bounding_spheres([actors[i] for i in self._dynamic]))
+        return visible
@@ -0,0 +1,104 @@
+import time
+
+from collections import deque
+
+import numpy as np
+
+
+class FramePacer:
+    def __init__(self, target_fps: float, clock=time.perf_counter, sleep=time.sleep, vsync: bool = False,
+                 adaptive: bool = False, min_fps: float = 30, spin: bool = True, spin_threshold: float = 0.002,
+                 history_size: int = 240):
+        self.clock = clock
+        self.sleep = sleep
+        # Sleep until spin_threshold (or the measured sleep overshoot) before the deadline and busy-wait the rest.
+        # Off - sleep the whole wait, for clocks that only move in sleep()
+        self.spin = spin
+        self.vsync = vsync
+        self.adaptive = adaptive
+        self.min_fps = min_fps
+        self.spin_threshold = spin_threshold
+
+        self.requested_fps = target_fps
+        self.target_fps = target_fps
+        self.frame_time = 1.0 / target_fps
+
+        self.overload_frames = 30
+        self.recovery_frames = 120
+        self.adapt_factor = 0.9
+
+        self.frame_times = deque(maxlen=history_size)
+        self.work_times = deque(maxlen=history_size)
+        self.sleep_overshoot = 0.0
+
+        self._frame_start = None
+        self._deadline = None
+        self._overloaded = 0
+        self._underloaded = 0
+
+    def set_target_fps(self, target_fps: float):
+        self.requested_fps = target_fps
+        self._apply_fps(target_fps)
+
+    def begin_frame(self):
+        now = self.clock()
+        if self._frame_start is not None:
+            self.frame_times.append(now - self._frame_start)
+        self._frame_start = now
+
+        if self._deadline is None or now > self._deadline + self.frame_time:
+            # Too far behind to catch up, schedule from now instead of bursting frames
+            self._deadline = now
+        self._deadline += self.frame_time
+
+    def end_frame(self):
+        if self._frame_start is None:
+            return
+
+        work_time = self.clock() - self._frame_start
+        self.work_times.append(work_time)
+        if self.adaptive:
+            self._adapt(work_time)
+
+        if not self.vsync:
+            self._wait_until(self._deadline)
+
+    def percentiles(self, values=(50, 95, 99)) -> dict:
+        if not self.frame_times:
+            return {value: 0.0 for value in values}
+        results = np.percentile(np.fromiter(self.frame_times, dtype=np.float64), values)
+        return {value: float(result) for value, result in zip(values, results)}
+
+    def _wait_until(self, deadline: float):
+        remaining = deadline - self.clock()
+        sleep_time = remaining - max(self.spin_threshold, self.sleep_overshoot) if self.spin else remaining
+        if sleep_time > 0:
+            before = self.clock()
+            self.sleep(sleep_time)
+            overshoot = (self.clock() - before) - sleep_time
+            self.sleep_overshoot = self.sleep_overshoot * 0.9 + max(overshoot, 0.0) * 0.1
+
+        while self.spin and self.clock() < deadline:
+            pass
+
+    def _adapt(self, work_time: float):
+        if work_time > self.frame_time * 0.95:
+            self._overloaded += 1
+            self._underloaded = 0
+        elif work_time < self.frame_time * 0.7:
+            self._underloaded += 1
+            self._overloaded = 0
+        else:
+            self._overloaded = 0
+            self._underloaded = 0
+
+        if self._overloaded >= self.overload_frames and self.target_fps > self.min_fps:
+            self._apply_fps(max(self.min_fps, self.target_fps * self.adapt_factor))
+        elif self._underloaded >= self.recovery_frames and self.target_fps < self.requested_fps:
+            self._apply_fps(min(self.requested_fps, self.target_fps / self.adapt_factor))
+
+    def _apply_fps(self, target_fps: float):
+        self.target_fps = target_fps
+        self.frame_time = 1.0 / target_fps
+        self._overloaded = 0
+        self._underloaded = 0
@@ -0,0 +1,295 @@
+import base64
+import itertools
+import json
+import os
+import struct
+import urllib.parse
+
+import numpy as np
+
+from .classes import Mesh
+
+
+OBJ_CHUNK_LINES = 1 << 16
+
+
+def _obj_values(lines: list, width: int) -> np.ndarray:
+    # "v"/"vt" records of one chunk parsed in a single call; extra components (w, vertex colors) are dropped
+    if not lines:
+        return np.zeros((0, width))
+    counts = {len(line.split()) for line in lines[:16]}
+    if len(counts) == 1:
+        values = np.array(" ".join(lines).split(), dtype=np.float64)
+        columns = counts.pop()
+        if len(values) == columns * len(lines):
+            return values.reshape(-1, columns)[:, :width]
+    return np.array([[float(value) for value in line.split()[:width]] for line in lines])
+
+
+def _obj_corners(lines: list) -> tuple:
+    # Face corners as (vertex, uv) index rows, 1-based or negative as written, and the corner count per face.
+    # Faces are parsed in groups of the same corner format ("v", "v/vt", "v//vn", "v/vt/vn"), a file may mix them
+    corner_counts = np.array([len(line.split()) for line in lines], dtype=np.int64)
+    formats = np.array([line.split(None, 1)[0].count("/") for line in lines], dtype=np.int64)
+
+    corners = None
+    starts = np.cumsum(corner_counts) - corner_counts
+    for slashes in np.unique(formats):
+        rows = np.flatnonzero(formats == slashes)
+        text = " ".join(lines) if len(rows) == len(lines) else " ".join(lines[row] for row in rows)
+        if slashes == 0:
+            group = np.array(text.split(), dtype=np.int64).reshape(-1, 1)
+            group = np.hstack((group, np.zeros_like(group)))
+        else:
+            # "v//vn" has no UV, the empty field becomes 0 which means "no UV"
+            numbers = np.array(text.replace("//", "/0/").replace("/", " ").split(), dtype=np.int64)
+            group = numbers.reshape(-1, slashes + 1)[:, :2]
+
+        if len(rows) == len(lines):
+            return group, corner_counts
+        if corners is None:
+            corners = np.zeros((int(corner_counts.sum()), 2), dtype=np.int64)
+        counts = corner_counts[rows]
+        offsets = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        corners[np.repeat(starts[rows], counts) + offsets] = group
+    return corners, corner_counts
+
+
+def _fan_triangles(corner_counts: np.ndarray) -> np.ndarray:
+    # Corner rows of the (first, i, i + 1) fans that triangulate every polygon
+    triangle_counts = corner_counts - 2
+    starts = np.cumsum(corner_counts) - corner_counts
+    first = np.repeat(starts, triangle_counts)
+    step = np.arange(int(triangle_counts.sum())) - np.repeat(np.cumsum(triangle_counts) - triangle_counts,
+                                                            triangle_counts)
+    return np.stack((first, first + step + 1, first + step + 2), axis=1)
+
+
+def load_obj(file: str, chunk_lines: int = OBJ_CHUNK_LINES, flip_v: bool = True) -> Mesh:
+    # Streams the file chunk by chunk so only one chunk of text lines is alive at a time. OBJ puts the UV
+    # origin at the bottom left while textures are uploaded top row first, hence flip_v
+    positions = []
+    texture_coords = []
+    triangles = []
+    triangle_uvs = []
+    vertex_total = 0
+    uv_total = 0
+
+    with open(file, mode="r") as stream:
+        while True:
+            chunk = list(itertools.islice(stream, chunk_lines))
+            if not chunk:
+                break
+
+            is_vertex = np.array([line[:2] in ("v ", "v\t") for line in chunk])
+            is_uv = np.array([line[:3] in ("vt ", "vt\t") for line in chunk])
+
+            vertex_lines = [line[2:] for line, vertex in zip(chunk, is_vertex) if vertex]
+            uv_lines = [line[3:] for line, uv in zip(chunk, is_uv) if uv]
+            face_rows = [(index, line[2:]) for index, line in enumerate(chunk) if line[:2] in ("f ", "f\t")]
+
+            chunk_positions = _obj_values(vertex_lines, 3)
+            chunk_uvs = _obj_values(uv_lines, 2)
+
+            if face_rows:
+                corners, corner_counts = _obj_corners([line for _, line in face_rows])
+
+                # Negative indices count back from the records read before the face line
+                face_lines = np.array([index for index, _ in face_rows])
+                vertices_before = vertex_total + (np.cumsum(is_vertex) - is_vertex)[face_lines]
+                uvs_before = uv_total + (np.cumsum(is_uv) - is_uv)[face_lines]
+                vertices_before = np.repeat(vertices_before, corner_counts)
+                uvs_before = np.repeat(uvs_before, corner_counts)
+
+                vertex = np.where(corners[:, 0] > 0, corners[:, 0] - 1, vertices_before + corners[:, 0])
+                uv = np.where(corners[:, 1] > 0, corners[:, 1] - 1,
+                              np.where(corners[:, 1] < 0, uvs_before + corners[:, 1], -1))
+
+                fans = _fan_triangles(corner_counts)
+                triangles.append(vertex[fans].astype(np.int32))
+                triangle_uvs.append(uv[fans])
+
+            positions.append(chunk_positions)
+            texture_coords.append(chunk_uvs)
+            vertex_total += len(chunk_positions)
+            uv_total += len(chunk_uvs)
+
+    vertices = np.concatenate(positions) if positions else np.zeros((0, 3))
+    faces = np.concatenate(triangles) if triangles else np.zeros((0, 3), dtype=np.int32)
+    uv_indices = np.concatenate(triangle_uvs) if triangle_uvs else np.zeros((0, 3), dtype=np.int64)
+
+    # One extra (0, 0) row stands in for corners without a UV
+    texture_coords = np.vstack(texture_coords + [np.zeros((1, 2))]).astype(np.float32)
+    if flip_v:
+        texture_coords[:-1, 1] = 1.0 - texture_coords[:-1, 1]
+    uvs = texture_coords[np.where(uv_indices >= 0, uv_indices, len(texture_coords) - 1)]
+
+    return Mesh(vertices=vertices, faces=faces, uvs=uvs)
+
+
+GLTF_COMPONENT_TYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+
+GLTF_TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT2": 4, "MAT3": 9, "MAT4": 16}
+
+GLB_MAGIC = b"glTF"
+GLB_JSON_CHUNK = 0x4E4F534A
+GLB_BIN_CHUNK = 0x004E4942
+
+GLTF_TRIANGLES = 4
+
+
+class GLTFDocument:
+    def __init__(self, file: str):
+        self.directory = os.path.dirname(os.path.abspath(file))
+        self.embedded = None
+
+        if file.lower().endswith(".glb"):
+            self.embedded = self.read_glb(file)
+        else:
+            with open(file, mode="r", encoding="utf-8") as stream:
+                self.json = json.load(stream)
+
+        self._buffers = {}
+
+    def read_glb(self, file: str):
+        # Only the JSON chunk is read into memory, the binary chunk stays memory-mapped
+        data = np.memmap(file, dtype=np.uint8, mode="r")
+        magic, version, _ = struct.unpack_from("<4sII", data, 0)
+        if magic != GLB_MAGIC or version != 2:
+            raise ValueError(f"{file} is not a glTF 2.0 binary file")
+
+        offset = 12
+        binary = None
+        while offset < len(data):
+            length, chunk_type = struct.unpack_from("<II", data, offset)
+            chunk = data[offset + 8:offset + 8 + length]
+            if chunk_type == GLB_JSON_CHUNK:
+                self.json = json.loads(chunk.tobytes().decode("utf-8"))
+            elif chunk_type == GLB_BIN_CHUNK and binary is None:
+                binary = chunk
+            offset += 8 + length
+        return binary
+
+    def buffer(self, index: int) -> np.ndarray:
+        if index not in self._buffers:
+            uri = self.json["buffers"][index].get("uri")
+            if uri is None:
+                buffer = self.embedded
+            elif uri.startswith("data:"):
+                buffer = np.frombuffer(base64.b64decode(uri.split(",", 1)[1]), dtype=np.uint8)
+            else:
+                buffer = np.memmap(os.path.join(self.directory, urllib.parse.unquote(uri)), dtype=np.uint8, mode="r")
+            self._buffers[index] = buffer
+        return self._buffers[index]
+
+    def accessor(self, index: int) -> np.ndarray:
+        accessor = self.json["accessors"][index]
+        if "sparse" in accessor:
+            raise ValueError("sparse glTF accessors are not supported")
+
+        dtype = np.dtype(GLTF_COMPONENT_TYPES[accessor["componentType"]])
+        width = GLTF_TYPE_SIZES[accessor["type"]]
+        count = accessor["count"]
+        if "bufferView" not in accessor:
+            return np.zeros((count, width), dtype=dtype)
+
+        view = self.json["bufferViews"][accessor["bufferView"]]
+        buffer = self.buffer(view["buffer"])
+        start = view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+        element_size = dtype.itemsize * width
+        stride = view.get("byteStride", element_size)
+
+        # Strided views are read element by element through as_strided, without copying the whole view
+        raw = buffer[start:start + stride * (count - 1) + element_size] if count else buffer[start:start]
+        if stride == element_size:
+            values = raw.view(dtype).reshape(count, width)
+        else:
+            values = np.lib.stride_tricks.as_strided(
+                raw, shape=(count, element_size), strides=(stride, 1)).copy().view(dtype).reshape(count, width)
+
+        if accessor.get("normalized") and dtype.kind in "iu":
+            values = np.maximum(values / np.iinfo(dtype).max, -1.0)
+        return values
+
+    def node_matrices(self):
+        # World matrices of every node that holds a mesh, from the default scene (or all root nodes)
+        nodes = self.json.get("nodes", [])
+        scenes = self.json.get("scenes")
+        if scenes:
+            roots = scenes[self.json.get("scene", 0)].get("nodes", [])
+        else:
+            children = {child for node in nodes for child in node.get("children", [])}
+            roots = [index for index in range(len(nodes)) if index not in children]
+
+        stack = [(root, np.identity(4)) for root in roots]
+        while stack:
+            index, parent = stack.pop()
+            node = nodes[index]
+            world = parent @ self.local_matrix(node)
+            if "mesh" in node:
+                yield node["mesh"], world
+            stack.extend((child, world) for child in node.get("children", []))
+
+    @staticmethod
+    def local_matrix(node: dict) -> np.ndarray:
+        if "matrix" in node:
+            return np.array(node["matrix"], dtype=np.float64).reshape(4, 4).T
+
+        x, y, z, w = node.get("rotation", (0.0, 0.0, 0.0, 1.0))
+        rotation = np.array([
+            [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+            [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+            [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)]
+        ])
+        matrix = np.identity(4)
+        matrix[:3, :3] = rotation * np.array(node.get("scale", (1.0, 1.0, 1.0)))
+        matrix[:3, 3] = node.get("translation", (0.0, 0.0, 0.0))
+        return matrix
+
+
+def load_gltf(file: str) -> Mesh:
+    # Every triangle primitive of the default scene, placed by its node transform, merged into one mesh
+    document = GLTFDocument(file)
+    positions = []
+    faces = []
+    uvs = []
+    offset = 0
+
+    instances = list(document.node_matrices())
+    if not instances and document.json.get("meshes"):
+        instances = [(index, np.identity(4)) for index in range(len(document.json["meshes"]))]
+
+    for mesh_index, matrix in instances:
+        for primitive in document.json["meshes"][mesh_index]["primitives"]:
+            if primitive.get("mode", GLTF_TRIANGLES) != GLTF_TRIANGLES:
+                continue
+
+            attributes = primitive["attributes"]
+            vertices = document.accessor(attributes["POSITION"]).astype(np.float64)
+            vertices = vertices @ matrix[:3, :3].T + matrix[:3, 3]
+
+            if "indices" in primitive:
+                indices = document.accessor(primitive["indices"]).reshape(-1, 3).astype(np.int32)
+            else:
+                indices = np.arange(len(vertices), dtype=np.int32).reshape(-1, 3)
+
+            if "TEXCOORD_0" in attributes:
+                texture_coords = document.accessor(attributes["TEXCOORD_0"]).astype(np.float32)
+            else:
+                texture_coords = np.zeros((len(vertices), 2), dtype=np.float32)
+
+            positions.append(vertices)
+            faces.append(indices + offset)
+            uvs.append(texture_coords[indices])
+            offset += len(vertices)
+
+    if not positions:
+        return Mesh(vertices=np.zeros((0, 3)), faces=np.zeros((0, 3)), uvs=np.zeros((0, 3, 2)))
+    return Mesh(vertices=np.concatenate(positions), faces=np.concatenate(faces), uvs=np.concatenate(uvs))
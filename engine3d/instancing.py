@@ -0,0 +1,246 @@
+import ctypes
+
+import numpy as np
+
+from OpenGL.GL import *
+
+from .shaders import compile_program, gl_version
+
+
+INSTANCE_ATTRIBUTE = 12  # mat4 takes four slots, kept clear of the conventional built-in attribute aliases
+
+# The #version line is left out so ShaderLighting.compile can put its defines in front
+INSTANCED_VERTEX_SHADER = """
+layout(location = 12) in mat4 instance_model;
+
+out vec3 view_position;
+out vec3 view_normal;
+out vec2 uv;
+out vec4 color;
+
+void main() {
+    vec4 position = gl_ModelViewMatrix * instance_model * gl_Vertex;
+    view_position = position.xyz;
+    view_normal = mat3(gl_ModelViewMatrix) * mat3(instance_model) * gl_Normal;
+    uv = gl_MultiTexCoord0.xy;
+    color = gl_Color;
+    gl_Position = gl_ProjectionMatrix * position;
+}
+"""
+
+VERTEX_SHADER = "#version 330 compatibility\n" + INSTANCED_VERTEX_SHADER
+
+# Same equations as the fixed-function lighting set up by Engine3D and Light.setup, evaluated per pixel
+FRAGMENT_SHADER = """
+#version 330 compatibility
+uniform sampler2D texture_sampler;
+uniform int light_count;
+
+in vec3 view_position;
+in vec3 view_normal;
+in vec2 uv;
+in vec4 color;
+
+out vec4 fragment_color;
+
+void main() {
+    vec3 normal = normalize(view_normal);
+    vec3 eye = normalize(-view_position);
+    vec3 lit = gl_LightModel.ambient.rgb * color.rgb;
+
+    for (int i = 0; i < light_count; i++) {
+        vec4 light_position = gl_LightSource[i].position;
+        vec3 to_light = light_position.xyz - view_position * light_position.w;
+        float distance = length(to_light);
+        vec3 direction = to_light / distance;
+
+        float attenuation = 1.0;
+        if (light_position.w != 0.0) {
+            attenuation = 1.0 / (gl_LightSource[i].constantAttenuation +
+                                 gl_LightSource[i].linearAttenuation * distance +
+                                 gl_LightSource[i].quadraticAttenuation * distance * distance);
+        }
+
+        float diffuse = max(dot(normal, direction), 0.0);
+        float specular = 0.0;
+        if (diffuse > 0.0) {
+            specular = pow(max(dot(normal, normalize(direction + eye)), 0.0), gl_FrontMaterial.shininess);
+        }
+
+        lit += attenuation * (gl_LightSource[i].ambient.rgb * color.rgb +
+                              diffuse * gl_LightSource[i].diffuse.rgb * color.rgb +
+                              specular * gl_LightSource[i].specular.rgb * gl_FrontMaterial.specular.rgb);
+    }
+
+    fragment_color = vec4(clamp(lit, 0.0, 1.0), color.a) * texture(texture_sampler, uv);
+}
+"""
+
+# Per-pixel lighting through lighting.ShaderLighting.compile, with the group material
+LIT_FRAGMENT_SHADER = """
+uniform sampler2D texture_sampler;
+
+in vec3 view_position;
+in vec3 view_normal;
+in vec2 uv;
+
+out vec4 fragment_color;
+
+void main() {
+    vec3 lit = shade(view_position, normalize(view_normal), material_color.rgb);
+    fragment_color = vec4(clamp(lit, 0.0, 1.0), material_color.a) * texture(texture_sampler, uv);
+}
+"""
+
+
+class InstancedRenderer:
+    def __init__(self, min_group_size: int = 2):
+        self.min_group_size = min_group_size
+        self.supported = False
+        self.program = None
+        self.instance_buffer = None
+        self.instance_capacity = 0
+        # ShaderLighting when drawing with the light uniform buffer, None - fixed-function light state
+        self.lighting = None
+        self.lit_program = None
+
+        self.draw_calls = 0
+        self.instanced_actors = 0
+        self.texture_binds = 0
+        self.state_changes = 0
+        self.triangles = 0
+
+        self._texture_location = -1
+        self._light_count_location = -1
+
+    def setup(self, lighting=None) -> bool:
+        if gl_version() < (3, 3) or not bool(glDrawElementsInstanced) or not bool(glVertexAttribDivisor):
+            return False
+
+        try:
+            if lighting is not None and lighting.supported:
+                self.lit_program = lighting.compile(INSTANCED_VERTEX_SHADER, LIT_FRAGMENT_SHADER)
+                self.lighting = lighting
+            else:
+                self.program = compile_program(VERTEX_SHADER, FRAGMENT_SHADER)
+        except (RuntimeError, GLError):
+            return False
+
+        if self.program is not None:
+            self._texture_location = glGetUniformLocation(self.program, "texture_sampler")
+            self._light_count_location = glGetUniformLocation(self.program, "light_count")
+        self.instance_buffer = glGenBuffers(1)
+        self.supported = True
+        return True
+
+    def group(self, actors: list):
+        groups = {}
+        single = []
+        for actor in actors:
+            if actor.transparent:
+                # Blended actors need the back to front order of the render queue
+                single.append(actor)
+            else:
+                groups.setdefault((id(actor.render_resource), actor.texture, id(actor.material)), []).append(actor)
+
+        batched = []
+        for members in groups.values():
+            if len(members) >= self.min_group_size:
+                batched.append(members)
+            else:
+                single.extend(members)
+        return batched, single
+
+    def render(self, actors: list, alpha: float = 1.0, light_count: int = 0) -> list:
+        self.draw_calls = 0
+        self.instanced_actors = 0
+        self.texture_binds = 0
+        self.state_changes = 0
+        self.triangles = 0
+        if not self.supported:
+            return actors
+
+        batched, single = self.group(actors)
+        if not batched:
+            return single
+
+        # Groups sharing an atlas follow each other and reuse the bound texture
+        batched.sort(key=lambda group: group[0].texture)
+        if self.lighting is not None:
+            program = self.lit_program
+            self.lighting.use(program)
+            if self.lighting.per_object_lights:
+                light_indices, light_counts = self.lighting.assign(*self.group_bounds(batched))
+        else:
+            glUseProgram(self.program)
+            glUniform1i(self._texture_location, 0)
+            glUniform1i(self._light_count_location, light_count)
+        glEnable(GL_TEXTURE_2D)
+        # The program and GL_TEXTURE_2D, set here and back at the end
+        self.state_changes = 4
+
+        bound_texture = None
+        for index, members in enumerate(batched):
+            texture = members[0].texture
+            if texture != bound_texture:
+                glBindTexture(GL_TEXTURE_2D, texture)
+                bound_texture = texture
+                self.texture_binds += 1
+                self.state_changes += 1
+            if self.lighting is not None:
+                program.set_material(members[0].material)
+                self.state_changes += 1
+                if self.lighting.per_object_lights:
+                    program.set_lights(light_indices[index], int(light_counts[index]))
+            self.draw_group(members, alpha)
+
+        glDisable(GL_TEXTURE_2D)
+        glUseProgram(0)
+        return single
+
+    @staticmethod
+    def group_bounds(batched: list):
+        # A bounding sphere around every group, lights are assigned per group like the render queue does per actor
+        centers = np.empty((len(batched), 3))
+        radii = np.empty(len(batched))
+        for index, members in enumerate(batched):
+            positions = np.array([actor.world_position for actor in members])
+            centers[index] = positions.mean(axis=0)
+            radii[index] = np.linalg.norm(positions - centers[index], axis=1).max() + members[0].bounding_radius
+        return centers, radii
+
+    def draw_group(self, members: list, alpha: float):
+        count = len(members)
+        matrices = np.array([actor.world_matrix(alpha) for actor in members], dtype=np.float32)
+
+        # Attribute matrices are read column by column
+        instance_data = np.ascontiguousarray(matrices.transpose(0, 2, 1))
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+        if count > self.instance_capacity:
+            self.instance_capacity = max(count, self.instance_capacity * 2)
+            glBufferData(GL_ARRAY_BUFFER, self.instance_capacity * 64, None, GL_STREAM_DRAW)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, instance_data.nbytes, instance_data)
+
+        # The mesh vertex array object is bound first, so the instance attributes are set on it and removed again
+        first = members[0]
+        first.bind_buffers()
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+        for column in range(4):
+            location = INSTANCE_ATTRIBUTE + column
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, 64, ctypes.c_void_p(column * 16))
+            glVertexAttribDivisor(location, 1)
+
+        glDrawElementsInstanced(GL_TRIANGLES, first.num_indices, first.index_type, None, count)
+
+        for column in range(4):
+            location = INSTANCE_ATTRIBUTE + column
+            glVertexAttribDivisor(location, 0)
+            glDisableVertexAttribArray(location)
+        first.unbind_buffers()
+
+        self.draw_calls += 1
+        self.instanced_actors += count
+        self.triangles += first.num_indices // 3 * count
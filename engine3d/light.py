@@ -4,13 +4,23 @@ from OpenGL.GL import *
 
 
 class Light:
-    def __init__(self, position: tuple, color: tuple = (1.0, 1.0, 1.0), ambient: float = 0.2, diffuse: float = 0.8, specular: float = 1.0):
+    def __init__(self, position: tuple, color: tuple = (1.0, 1.0, 1.0), ambient: float = 0.2, diffuse: float = 0.8, specular: float = 1.0,
+                 constant_attenuation: float = 1.0, linear_attenuation: float = 0.1,
+                 quadratic_attenuation: float = 0.01, cast_shadows: bool = False, shadow_resolution: int = None):
         self.position = Vector3(position)
         self.color = color
         self.ambient = ambient
         self.diffuse = diffuse
         self.specular = specular
+        self.constant_attenuation = constant_attenuation
+        self.linear_attenuation = linear_attenuation
+        self.quadratic_attenuation = quadratic_attenuation
         self.light_id = None
+        # Shadow cube map faces are shadow_resolution pixels square, None - the ShadowRenderer default
+        self.cast_shadows = cast_shadows
+        self.shadow_resolution = shadow_resolution
+        # Set by ShadowRenderer.update while the light has a shadow map
+        self.shadow_map = None
 
     def setup(self, light_id: int):
         self.light_id = light_id
@@ -27,9 +37,9 @@ class Light:
                                           self.color[1] * self.specular,
                                           self.color[2] * self.specular, 1.0])
 
-        glLightf(light_id, GL_CONSTANT_ATTENUATION, 1.0)
-        glLightf(light_id, GL_LINEAR_ATTENUATION, 0.1)
-        glLightf(light_id, GL_QUADRATIC_ATTENUATION, 0.01)
+        glLightf(light_id, GL_CONSTANT_ATTENUATION, self.constant_attenuation)
+        glLightf(light_id, GL_LINEAR_ATTENUATION, self.linear_attenuation)
+        glLightf(light_id, GL_QUADRATIC_ATTENUATION, self.quadratic_attenuation)
 
     def update(self):
         if self.light_id is not None:
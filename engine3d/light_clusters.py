@@ -0,0 +1,236 @@
+import math
+
+import numpy as np
+
+from OpenGL.GL import *
+
+from .lighting import (ShaderLighting, LightingProgram, LIGHT_EQUATIONS_GLSL, VERTEX_SHADER, FRAGMENT_SHADER,
+                       influence_radii)
+from .shaders import gl_version
+
+
+# Texture units of the cluster data, unit 0 stays with the surface texture
+LIGHT_DATA_UNIT = 1
+CLUSTER_UNIT = 2
+LIGHT_INDEX_UNIT = 3
+
+# shade() over the lights binned into the cluster of the pixel: its screen tile and exponential depth slice
+CLUSTERED_LIGHTING_GLSL = LIGHT_EQUATIONS_GLSL + """
+uniform vec4 scene_ambient;
+uniform samplerBuffer light_data;
+uniform usamplerBuffer cluster_lights;
+uniform usamplerBuffer light_indices;
+uniform ivec3 cluster_count;
+uniform vec2 cluster_tile_size;
+uniform vec2 cluster_depth;
+
+LightSource fetch_light(int index) {
+    int texel = index * LIGHT_VEC4S;
+    return LightSource(texelFetch(light_data, texel), texelFetch(light_data, texel + 1),
+                       texelFetch(light_data, texel + 2), texelFetch(light_data, texel + 3),
+                       texelFetch(light_data, texel + 4));
+}
+
+vec3 shade(vec3 view_position, vec3 normal, vec3 albedo) {
+    vec3 eye = normalize(-view_position);
+    vec3 lit = scene_ambient.rgb * albedo;
+
+    int slice = int(floor(log(-view_position.z) * cluster_depth.x + cluster_depth.y));
+    ivec3 cell = clamp(ivec3(ivec2(gl_FragCoord.xy / cluster_tile_size), slice), ivec3(0), cluster_count - 1);
+    uvec2 range = texelFetch(cluster_lights, (cell.z * cluster_count.y + cell.y) * cluster_count.x + cell.x).xy;
+    for (uint n = 0u; n < range.y; n++) {
+        int index = int(texelFetch(light_indices, int(range.x + n)).x);
+        lit += shade_light(fetch_light(index), view_position, normal, eye, albedo);
+    }
+    return lit;
+}
+"""
+
+
+class ClusterGrid:
+    # Screen tiles times depth slices of the view frustum. Slices are spaced exponentially, so clusters stay
+    # roughly cube shaped from the near to the far plane
+    def __init__(self, tiles_x: int = 16, tiles_y: int = 9, slices: int = 24, fov: float = 45.0,
+                 aspect: float = 16 / 9, near: float = 0.1, far: float = 1000.0):
+        self.tiles_x = tiles_x
+        self.tiles_y = tiles_y
+        self.slices = slices
+        self.set_projection(fov, aspect, near, far)
+
+    def __len__(self):
+        return self.tiles_x * self.tiles_y * self.slices
+
+    def set_projection(self, fov: float, aspect: float, near: float, far: float):
+        self.near = near
+        self.far = far
+        self.scale_y = 1 / math.tan(math.radians(fov) / 2)
+        self.scale_x = self.scale_y / aspect
+        self.log_ratio = math.log(far / near)
+        self.slice_depths = near * (far / near) ** (np.arange(self.slices + 1) / self.slices)
+
+    def slice_of(self, depths: np.ndarray) -> np.ndarray:
+        slices = np.floor(np.log(depths / self.near) / self.log_ratio * self.slices)
+        return np.clip(slices, 0, self.slices - 1).astype(np.intp)
+
+    def tile_of(self, ndc: np.ndarray, tiles: int) -> np.ndarray:
+        return np.clip(np.floor((ndc + 1) / 2 * tiles), 0, tiles - 1).astype(np.intp)
+
+    def cluster_bounds(self, cell_x: np.ndarray, cell_y: np.ndarray, cell_z: np.ndarray):
+        # View-space bounding boxes (low, high) of clusters
+        near_plane, far_plane = self.slice_depths[cell_z], self.slice_depths[cell_z + 1]
+        tile_width, tile_height = 2 / self.tiles_x, 2 / self.tiles_y
+        low_x = cell_x * tile_width - 1
+        low_y = cell_y * tile_height - 1
+        high_x, high_y = low_x + tile_width, low_y + tile_height
+        low = np.stack((np.minimum(low_x * near_plane, low_x * far_plane) / self.scale_x,
+                        np.minimum(low_y * near_plane, low_y * far_plane) / self.scale_y, -far_plane), axis=-1)
+        high = np.stack((np.maximum(high_x * near_plane, high_x * far_plane) / self.scale_x,
+                         np.maximum(high_y * near_plane, high_y * far_plane) / self.scale_y, -near_plane), axis=-1)
+        return low, high
+
+    def bin(self, centers: np.ndarray, radii: np.ndarray):
+        # centers are view space (camera looking down -z). Returns (offsets, counts, indices): the lights of
+        # cluster c are indices[offsets[c]:offsets[c] + counts[c]], ordered by light index
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+        radii = np.asarray(radii, dtype=np.float64)
+        x, y, depth = centers[:, 0], centers[:, 1], -centers[:, 2]
+
+        # Conservative cluster ranges from the screen rectangle of each sphere's bounding box over its depth range
+        near_depth = np.maximum(depth - radii, self.near)
+        far_depth = np.minimum(depth + radii, self.far)
+        left = np.minimum((x - radii) / near_depth, (x - radii) / far_depth) * self.scale_x
+        right = np.maximum((x + radii) / near_depth, (x + radii) / far_depth) * self.scale_x
+        bottom = np.minimum((y - radii) / near_depth, (y - radii) / far_depth) * self.scale_y
+        top = np.maximum((y + radii) / near_depth, (y + radii) / far_depth) * self.scale_y
+        visible = (near_depth < far_depth) & (right >= -1) & (left <= 1) & (top >= -1) & (bottom <= 1)
+
+        first_x, last_x = self.tile_of(left, self.tiles_x), self.tile_of(right, self.tiles_x)
+        first_y, last_y = self.tile_of(bottom, self.tiles_y), self.tile_of(top, self.tiles_y)
+        first_z, last_z = self.slice_of(near_depth), self.slice_of(np.maximum(far_depth, self.near))
+        span_x = last_x - first_x + 1
+        span_y = last_y - first_y + 1
+        counts = np.where(visible, span_x * span_y * (last_z - first_z + 1), 0)
+
+        # One (light, cluster) candidate per covered cluster
+        lights = np.repeat(np.arange(len(centers)), counts)
+        local = np.arange(len(lights)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_x = first_x[lights] + local % span_x[lights]
+        local //= span_x[lights]
+        cell_y = first_y[lights] + local % span_y[lights]
+        cell_z = first_z[lights] + local // span_y[lights]
+
+        # Exact sphere test against the view-space bounding box of each candidate cluster
+        box_low, box_high = self.cluster_bounds(cell_x, cell_y, cell_z)
+        light_centers = centers[lights]
+        nearest = np.clip(light_centers, box_low, box_high)
+        keep = np.sum((light_centers - nearest) ** 2, axis=1) <= radii[lights] ** 2
+
+        clusters = ((cell_z * self.tiles_y + cell_y) * self.tiles_x + cell_x)[keep]
+        order = np.argsort(clusters, kind="stable")
+        cluster_counts = np.bincount(clusters, minlength=len(self))
+        return np.cumsum(cluster_counts) - cluster_counts, cluster_counts, lights[keep][order]
+
+
+class ClusteredLighting(ShaderLighting):
+    # Any number of lights: each is binned into the clusters its influence radius reaches, and every pixel
+    # shades only the lights of its cluster. Light data, cluster ranges and light lists go to texture buffers
+    lighting_glsl = CLUSTERED_LIGHTING_GLSL
+    per_object_lights = False
+
+    def __init__(self, grid: ClusterGrid = None, viewport: tuple = (1920, 1080), ambient: tuple = (0.0, 0.0, 0.0),
+                 shadows=None):
+        super().__init__(max_lights=None, ambient=ambient, shadows=shadows)
+        self.grid = grid if grid is not None else ClusterGrid()
+        self.viewport = viewport
+        self.buffers = {}
+
+        self.visible_lights = 0
+        self.light_references = 0
+
+    def setup(self) -> bool:
+        if gl_version() < (3, 3) or not bool(glTexBuffer):
+            return False
+        try:
+            self.program = self.compile(VERTEX_SHADER, FRAGMENT_SHADER)
+        except (RuntimeError, GLError):
+            return False
+
+        for name, internal_format in (("light_data", GL_RGBA32F), ("cluster_lights", GL_RG32UI),
+                                      ("light_indices", GL_R32UI)):
+            buffer = glGenBuffers(1)
+            glBindBuffer(GL_TEXTURE_BUFFER, buffer)
+            glBufferData(GL_TEXTURE_BUFFER, 16, None, GL_STREAM_DRAW)
+            texture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_BUFFER, texture)
+            glTexBuffer(GL_TEXTURE_BUFFER, internal_format, buffer)
+            self.buffers[name] = (buffer, texture)
+        glBindTexture(GL_TEXTURE_BUFFER, 0)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+        self.supported = True
+        return True
+
+    def defines(self) -> dict:
+        defines = super().defines()
+        del defines["MAX_LIGHTS"], defines["MAX_OBJECT_LIGHTS"]
+        return defines
+
+    def resize(self, width: int, height: int):
+        self.viewport = (width, height)
+
+    def use(self, program: LightingProgram):
+        super().use(program)
+        grid = self.grid
+        glUniform4f(program.location("scene_ambient"), *self.ambient, 1.0)
+        glUniform3i(program.location("cluster_count"), grid.tiles_x, grid.tiles_y, grid.slices)
+        glUniform2f(program.location("cluster_tile_size"), self.viewport[0] / grid.tiles_x,
+                    self.viewport[1] / grid.tiles_y)
+        depth_scale = grid.slices / grid.log_ratio
+        glUniform2f(program.location("cluster_depth"), depth_scale, -math.log(grid.near) * depth_scale)
+
+        for name, unit in (("light_data", LIGHT_DATA_UNIT), ("cluster_lights", CLUSTER_UNIT),
+                           ("light_indices", LIGHT_INDEX_UNIT)):
+            glUniform1i(program.location(name), unit)
+            glActiveTexture(GL_TEXTURE0 + unit)
+            glBindTexture(GL_TEXTURE_BUFFER, self.buffers[name][1])
+        glActiveTexture(GL_TEXTURE0)
+
+    def bin(self, lights: list, view_matrix: np.ndarray):
+        # CPU half of update(): (light data, cluster ranges, light lists) ready for upload
+        self.read_lights(lights)
+        view_matrix = np.asarray(view_matrix, dtype=np.float64)
+        centers = self.positions @ view_matrix[:3, :3].T + view_matrix[:3, 3]
+        radii = influence_radii(self.strengths, self.attenuation)
+        offsets, counts, indices = self.grid.bin(centers, radii)
+
+        # Only lights reaching some cluster are uploaded, renumbered in their original order
+        visible = np.flatnonzero(np.bincount(indices, minlength=self.light_count))
+        renumber = np.zeros(self.light_count, dtype=np.uint32)
+        renumber[visible] = np.arange(len(visible), dtype=np.uint32)
+        self.visible_lights = len(visible)
+        self.light_references = len(indices)
+        return (self.light_data(view_matrix, visible), np.stack((offsets, counts), axis=1).astype(np.uint32),
+                renumber[indices])
+
+    def update(self, lights: list, view_matrix: np.ndarray):
+        self.view_matrix = view_matrix
+        for name, data in zip(("light_data", "cluster_lights", "light_indices"), self.bin(lights, view_matrix)):
+            if not data.size:
+                data = np.zeros(4, dtype=data.dtype)
+            glBindBuffer(GL_TEXTURE_BUFFER, self.buffers[name][0])
+            glBufferData(GL_TEXTURE_BUFFER, data.nbytes, np.ascontiguousarray(data), GL_STREAM_DRAW)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+
+    def assign(self, centers: np.ndarray, radii: np.ndarray):
+        # Lights are picked per pixel, nothing to assign per object
+        count = len(centers)
+        return np.zeros((count, self.max_object_lights), dtype=np.int32), np.zeros(count, dtype=np.int32)
+
+    def release_gpu(self):
+        for buffer, texture in self.buffers.values():
+            glDeleteBuffers(1, [buffer])
+            glDeleteTextures(1, [texture])
+        self.buffers = {}
+        if self.program is not None:
+            glDeleteProgram(self.program.program)
+            self.program = None
+        self.supported = False
@@ -0,0 +1,344 @@
+import numpy as np
+
+from OpenGL.GL import *
+
+from .materials import DEFAULT_MATERIAL
+from .render_queue import GLBackend
+from .shaders import compile_program, gl_version
+
+
+LIGHT_BLOCK_BINDING = 0
+LIGHT_VEC4S = 5  # position, ambient, diffuse, specular, attenuation
+LIGHT_CUTOFF = 1 / 256  # below one 8-bit color step a light is out of reach (assign, influence_radii)
+
+# Same equations as the fixed-function lighting set up by Engine3D and Light.setup, evaluated per pixel. Light
+# positions are in view space, uploaded once per frame
+LIGHT_EQUATIONS_GLSL = """
+struct LightSource {
+    vec4 position;
+    vec4 ambient;
+    vec4 diffuse;
+    vec4 specular;
+    vec4 attenuation;  // constant, linear, quadratic, shadow map slot + 1 (0 - no shadow)
+};
+
+uniform vec4 material_color;
+uniform vec4 material_specular;
+
+#if MAX_SHADOW_MAPS > 0
+uniform samplerCubeShadow shadow_maps[MAX_SHADOW_MAPS];
+uniform vec2 shadow_planes[MAX_SHADOW_MAPS];
+uniform mat3 view_to_world;
+uniform float shadow_bias;
+
+float sample_shadow(int slot, vec4 coordinate) {
+    // GLSL 3.30 indexes sampler arrays with constant expressions only
+    if (slot == 0) return texture(shadow_maps[0], coordinate);
+#if MAX_SHADOW_MAPS > 1
+    if (slot == 1) return texture(shadow_maps[1], coordinate);
+#endif
+#if MAX_SHADOW_MAPS > 2
+    if (slot == 2) return texture(shadow_maps[2], coordinate);
+#endif
+#if MAX_SHADOW_MAPS > 3
+    if (slot == 3) return texture(shadow_maps[3], coordinate);
+#endif
+    return 1.0;
+}
+#endif
+
+float light_visibility(LightSource light, vec3 to_light) {
+#if MAX_SHADOW_MAPS > 0
+    int slot = int(light.attenuation.w) - 1;
+    if (slot >= 0) {
+        // Cube faces are rendered along the world axes, the depth stored is that of the major axis distance
+        vec3 direction = view_to_world * -to_light;
+        vec3 extent = abs(direction);
+        float distance = max(extent.x, max(extent.y, extent.z)) * (1.0 - shadow_bias);
+        vec2 planes = shadow_planes[slot];
+        float depth = ((planes.y + planes.x) - 2.0 * planes.x * planes.y / distance) / (planes.y - planes.x);
+        return sample_shadow(slot, vec4(direction, depth * 0.5 + 0.5));
+    }
+#endif
+    return 1.0;
+}
+
+vec3 shade_light(LightSource light, vec3 view_position, vec3 normal, vec3 eye, vec3 albedo) {
+    vec3 to_light = light.position.xyz - view_position;
+    float distance = length(to_light);
+    vec3 direction = to_light / distance;
+    float attenuation = 1.0 / (light.attenuation.x + light.attenuation.y * distance +
+                               light.attenuation.z * distance * distance);
+
+    float diffuse = max(dot(normal, direction), 0.0);
+    float specular = 0.0;
+    if (diffuse > 0.0) {
+        specular = pow(max(dot(normal, normalize(direction + eye)), 0.0), material_specular.w);
+    }
+
+    float visibility = diffuse > 0.0 ? light_visibility(light, to_light) : 1.0;
+    return attenuation * (light.ambient.rgb * albedo + visibility * (diffuse * light.diffuse.rgb * albedo +
+                                                                     specular * light.specular.rgb *
+                                                                     material_specular.rgb));
+}
+"""
+
+# shade() over the lights assigned to the object being drawn
+LIGHTING_GLSL = LIGHT_EQUATIONS_GLSL + """
+layout(std140) uniform Lights {
+    vec4 scene_ambient;
+    LightSource lights[MAX_LIGHTS];
+};
+
+uniform int object_lights[MAX_OBJECT_LIGHTS];
+uniform int object_light_count;
+
+vec3 shade(vec3 view_position, vec3 normal, vec3 albedo) {
+    vec3 eye = normalize(-view_position);
+    vec3 lit = scene_ambient.rgb * albedo;
+    for (int n = 0; n < object_light_count; n++) {
+        lit += shade_light(lights[object_lights[n]], view_position, normal, eye, albedo);
+    }
+    return lit;
+}
+"""
+
+VERTEX_SHADER = """
+out vec3 view_position;
+out vec3 view_normal;
+out vec2 uv;
+
+void main() {
+    vec4 position = gl_ModelViewMatrix * gl_Vertex;
+    view_position = position.xyz;
+    view_normal = gl_NormalMatrix * gl_Normal;
+    uv = gl_MultiTexCoord0.xy;
+    gl_Position = gl_ProjectionMatrix * position;
+}
+"""
+
+# Programs are compiled through ShaderLighting.compile, which puts the shade() of the lighting in use in front
+FRAGMENT_SHADER = """
+uniform sampler2D texture_sampler;
+
+in vec3 view_position;
+in vec3 view_normal;
+in vec2 uv;
+
+out vec4 fragment_color;
+
+void main() {
+    vec3 lit = shade(view_position, normalize(view_normal), material_color.rgb);
+    fragment_color = vec4(clamp(lit, 0.0, 1.0), material_color.a) * texture(texture_sampler, uv);
+}
+"""
+
+
+def influence_radii(strengths: np.ndarray, attenuation: np.ndarray, cutoff: float = LIGHT_CUTOFF) -> np.ndarray:
+    # Distance where strength / (constant + linear * d + quadratic * d^2) drops to cutoff, inf without falloff
+    strengths = np.asarray(strengths, dtype=np.float64)
+    constant, linear, quadratic = np.asarray(attenuation, dtype=np.float64).reshape(-1, 3).T
+    excess = np.maximum(strengths / cutoff - constant, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        quadratic_root = (np.sqrt(linear * linear + 4 * quadratic * excess) - linear) / (2 * quadratic)
+        linear_root = excess / linear
+    radii = np.where(quadratic > 0, quadratic_root, np.where(linear > 0, linear_root, np.inf))
+    return np.where(excess > 0, radii, 0.0)
+
+
+class LightingProgram:
+    def __init__(self, program):
+        self.program = program
+        self._locations = {}
+        block = glGetUniformBlockIndex(program, "Lights")
+        if block != GL_INVALID_INDEX:
+            glUniformBlockBinding(program, block, LIGHT_BLOCK_BINDING)
+        self._texture_location = glGetUniformLocation(program, "texture_sampler")
+        self._lights_location = glGetUniformLocation(program, "object_lights")
+        self._light_count_location = glGetUniformLocation(program, "object_light_count")
+        self._color_location = glGetUniformLocation(program, "material_color")
+        self._specular_location = glGetUniformLocation(program, "material_specular")
+
+    def use(self):
+        glUseProgram(self.program)
+        glUniform1i(self._texture_location, 0)
+
+    def location(self, name: str) -> int:
+        location = self._locations.get(name)
+        if location is None:
+            location = self._locations[name] = glGetUniformLocation(self.program, name)
+        return location
+
+    def set_material(self, material):
+        material = material if material is not None else DEFAULT_MATERIAL
+        glUniform4f(self._color_location, *material.color)
+        glUniform4f(self._specular_location, *material.specular, material.shininess)
+
+    def set_lights(self, indices: np.ndarray, count: int):
+        if count:
+            glUniform1iv(self._lights_location, count, indices)
+        glUniform1i(self._light_count_location, count)
+
+
+class ShaderLighting:
+    lighting_glsl = LIGHTING_GLSL
+    # Lights are picked per drawn object (assign), ShaderBackend and the instanced renderer upload the choice
+    per_object_lights = True
+
+    def __init__(self, max_lights: int = 256, max_object_lights: int = 8, ambient: tuple = (0.0, 0.0, 0.0),
+                 shadows=None):
+        self.max_lights = max_lights
+        self.max_object_lights = max_object_lights
+        self.ambient = ambient
+        # A shadows.ShadowRenderer, its maps are sampled by every lighting program
+        self.shadows = shadows
+        self.view_matrix = np.identity(4)
+        self.supported = False
+        self.program = None
+        self.buffer = None
+
+        # World-space copies of the uploaded lights, used to assign lights to objects. strengths is an upper
+        # bound of what each light adds to a white surface before attenuation
+        self.read_lights([])
+
+    def setup(self) -> bool:
+        if gl_version() < (3, 3):
+            return False
+
+        # The light array lives in a single uniform block, its size bounds how many lights can be uploaded
+        block_limit = int(glGetIntegerv(GL_MAX_UNIFORM_BLOCK_SIZE))
+        self.max_lights = max(1, min(self.max_lights, block_limit // (16 * LIGHT_VEC4S) - 1))
+        try:
+            self.program = self.compile(VERTEX_SHADER, FRAGMENT_SHADER)
+        except (RuntimeError, GLError):
+            return False
+
+        self.buffer = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferData(GL_UNIFORM_BUFFER, 16 * (1 + LIGHT_VEC4S * self.max_lights), None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, LIGHT_BLOCK_BINDING, self.buffer)
+        self.supported = True
+        return True
+
+    def defines(self) -> dict:
+        return {"LIGHT_VEC4S": LIGHT_VEC4S, "MAX_LIGHTS": self.max_lights, "MAX_OBJECT_LIGHTS": self.max_object_lights,
+                "MAX_SHADOW_MAPS": self.shadows.max_maps if self.shadows is not None else 0}
+
+    def compile(self, vertex_source: str, fragment_source: str) -> LightingProgram:
+        header = "#version 330 compatibility\n" + "".join(f"#define {name} {value}\n"
+                                                          for name, value in self.defines().items())
+        return LightingProgram(compile_program(header + vertex_source,
+                                               header + self.lighting_glsl + fragment_source))
+
+    def use(self, program: LightingProgram):
+        program.use()
+        if self.shadows is not None:
+            self.shadows.bind(program, self.view_matrix)
+
+    def read_lights(self, lights: list):
+        # World-space arrays of the lights uploaded this frame
+        count = len(lights)
+        rows = np.array([(*light.position, *light.color[:3], light.ambient, light.diffuse, light.specular,
+                          light.constant_attenuation, light.linear_attenuation, light.quadratic_attenuation,
+                          light.shadow_map.slot + 1 if light.shadow_map is not None else 0)
+                         for light in lights], dtype=np.float64).reshape(count, 13)
+        self.positions, self.colors, self.factors, self.attenuation = np.split(rows[:, :12], 4, axis=1)
+        self.shadow_slots = rows[:, 12]
+        self.strengths = self.colors.max(axis=1, initial=0.0) * self.factors.sum(axis=1)
+        self.light_count = count
+
+    def light_data(self, view_matrix: np.ndarray, selection=slice(None)) -> np.ndarray:
+        # (count, LIGHT_VEC4S, 4) LightSource structs of the selected lights from the last read_lights()
+        positions = self.positions[selection]
+        data = np.zeros((len(positions), LIGHT_VEC4S, 4), dtype=np.float32)
+        view_matrix = np.asarray(view_matrix, dtype=np.float64)
+        data[:, 0, :3] = positions @ view_matrix[:3, :3].T + view_matrix[:3, 3]
+        data[:, 1:4, :3] = self.factors[selection][:, :, None] * self.colors[selection][:, None, :]
+        data[:, :4, 3] = 1.0
+        data[:, 4, :3] = self.attenuation[selection]
+        data[:, 4, 3] = self.shadow_slots[selection]
+        return data
+
+    def pack(self, lights: list, view_matrix: np.ndarray) -> np.ndarray:
+        self.read_lights(lights[:self.max_lights])
+        block = np.zeros((1 + self.light_count * LIGHT_VEC4S, 4), dtype=np.float32)
+        block[0, :3] = self.ambient
+        block[0, 3] = 1.0
+        block[1:] = self.light_data(view_matrix).reshape(-1, 4)
+        return block
+
+    def update(self, lights: list, view_matrix: np.ndarray):
+        # The whole light list in one upload, only the part in use is written
+        self.view_matrix = view_matrix
+        block = self.pack(lights, view_matrix)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, block.nbytes, block)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, LIGHT_BLOCK_BINDING, self.buffer)
+
+    def assign(self, centers: np.ndarray, radii: np.ndarray):
+        # The strongest max_object_lights lights at the point of each bounding sphere nearest to them, in
+        # descending order. Returns (indices, counts), only the first counts[i] indices of row i are valid
+        count = len(centers)
+        limit = min(self.max_object_lights, self.light_count)
+        indices = np.zeros((count, self.max_object_lights), dtype=np.int32)
+        if not count or not limit:
+            return indices, np.zeros(count, dtype=np.int32)
+
+        centers = np.asarray(centers, dtype=np.float64).reshape(count, 3)
+        distances = np.linalg.norm(centers[:, None, :] - self.positions[None, :, :], axis=2)
+        distances = np.maximum(distances - np.asarray(radii, dtype=np.float64).reshape(count, 1), 0.0)
+        constant, linear, quadratic = self.attenuation.T
+        scores = self.strengths / (constant + linear * distances + quadratic * distances * distances)
+
+        if limit < self.light_count:
+            strongest = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        else:
+            strongest = np.broadcast_to(np.arange(limit), (count, limit))
+        strongest_scores = np.take_along_axis(scores, strongest, axis=1)
+        order = np.argsort(-strongest_scores, axis=1)
+        indices[:, :limit] = np.take_along_axis(strongest, order, axis=1)
+        counts = np.count_nonzero(strongest_scores >= LIGHT_CUTOFF, axis=1).astype(np.int32)
+        return indices, counts
+
+    def release_gpu(self):
+        if self.buffer is not None:
+            glDeleteBuffers(1, [self.buffer])
+            self.buffer = None
+        if self.program is not None:
+            glDeleteProgram(self.program.program)
+            self.program = None
+        self.supported = False
+
+
+class ShaderBackend(GLBackend):
+    # Draws the render queue with the per-pixel lighting program, materials become uniforms
+    def __init__(self, lighting: ShaderLighting):
+        self.lighting = lighting
+        self._lights = None
+
+    def begin_pass(self, packets: list):
+        self._lights = None
+        self.lighting.use(self.lighting.program)
+        if not self.lighting.per_object_lights:
+            return
+
+        centers = np.array([tuple(packet.position) for packet in packets], dtype=np.float64).reshape(-1, 3)
+        radii = np.array([packet.radius for packet in packets], dtype=np.float64)
+        indices, counts = self.lighting.assign(centers, radii)
+        for packet, row, count in zip(packets, indices, counts):
+            packet.lights = (row, int(count))
+
+    def end_pass(self):
+        glUseProgram(0)
+
+    def apply_material(self, material):
+        self.lighting.program.set_material(material)
+
+    def set_object_lights(self, lights: tuple):
+        indices, count = lights
+        key = (count, indices[:count].tobytes())
+        if key != self._lights:
+            self.lighting.program.set_lights(indices, count)
+            self._lights = key
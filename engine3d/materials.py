@@ -0,0 +1,20 @@
+from OpenGL.GL import *
+
+
+class Material:
+    def __init__(self, color: tuple = (1.0, 1.0, 1.0, 1.0), specular: tuple = (1.0, 1.0, 1.0),
+                 shininess: float = 32.0):
+        # color multiplies the texture and takes the place of the ambient and diffuse material (glColorMaterial)
+        self.color = tuple(color) + (1.0,) * (4 - len(color))
+        self.specular = tuple(specular)
+        self.shininess = shininess
+
+    def apply(self):
+        # Fixed-function path, the shader path sets the same values as uniforms (lighting.LightingProgram)
+        glColor4f(*self.color)
+        glMaterialfv(GL_FRONT_AND_BACK, GL_SPECULAR, [*self.specular, 1.0])
+        glMaterialf(GL_FRONT_AND_BACK, GL_SHININESS, self.shininess)
+
+
+# The state Engine3D sets up at start, used by actors without a material of their own
+DEFAULT_MATERIAL = Material()
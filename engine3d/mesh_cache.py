@@ -0,0 +1,339 @@
+import ctypes
+import hashlib
+import threading
+import weakref
+
+import numpy as np
+
+from OpenGL.GL import *
+
+from .mesh_processing import (weld_vertices, interleave_vertices, smallest_index_dtype, optimize_vertex_cache,
+                              reorder_vertices, average_cache_miss_ratio, remap_uvs, MeshMemoryReport,
+                              VERTEX_FORMAT)
+from .shaders import gl_version
+from .classes import IndexedMesh
+from .collision_shapes import CollisionShape
+
+
+GL_TYPES = {
+    np.dtype(np.float32): GL_FLOAT,
+    np.dtype(np.float16): GL_HALF_FLOAT,
+    np.dtype(np.int16): GL_SHORT,
+    np.dtype(np.int8): GL_BYTE,
+}
+
+
+def calculate_normals(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    normals = np.zeros_like(vertices)
+    v0 = vertices[faces[:, 0]]
+    v1 = vertices[faces[:, 1]]
+    v2 = vertices[faces[:, 2]]
+    face_normals = np.cross(v1 - v0, v2 - v0)
+    face_normals /= np.linalg.norm(face_normals, axis=1)[:, np.newaxis] + 1e-6
+
+    np.add.at(normals, faces[:, 0], face_normals)
+    np.add.at(normals, faces[:, 1], face_normals)
+    np.add.at(normals, faces[:, 2], face_normals)
+
+    return normals / (np.linalg.norm(normals, axis=1)[:, np.newaxis] + 1e-6)
+
+
+def calculate_bounding_box(vertices: np.ndarray):
+    min_cords = np.min(vertices, axis=0)
+    max_cords = np.max(vertices, axis=0)
+    return min_cords, max_cords
+
+
+def calculate_inertia_tensor(vertices: np.ndarray, mass: float = 1.0) -> np.ndarray:
+    x_, y, z = vertices[:, 0], vertices[:, 1], vertices[:, 2]
+
+    inertia = np.zeros((3, 3))
+    inertia[0, 0] = np.sum(x_ ** 2 + z ** 2)
+    inertia[1, 1] = np.sum(x_ ** 2 + z ** 2)
+    inertia[2, 2] = np.sum(x_ ** 2 + y ** 2)
+    inertia[0, 1] = -np.sum(x_ * y)
+    inertia[0, 2] = -np.sum(x_ * z)
+    inertia[1, 2] = -np.sum(y * z)
+    inertia[1, 0] = inertia[0, 1]
+    inertia[2, 0] = inertia[0, 2]
+    inertia[2, 1] = inertia[1, 2]
+    return inertia * mass
+
+
+class MeshResource:
+    def __init__(self, key: str, vertices: np.ndarray, faces: np.ndarray, uvs: np.ndarray,
+                 optimize_vertex_cache: bool = False, compress_vertices: bool = False, indexed: IndexedMesh = None,
+                 uv_rect: tuple = None):
+        self.key = key
+        self.uv_rect = uv_rect
+        self.optimize_vertex_cache = optimize_vertex_cache
+        self.compress_vertices = compress_vertices
+        self.indexed = indexed
+        self.vertices = vertices
+        self.faces = faces
+        self._uvs = uvs
+
+        if indexed is not None:
+            self.normals = indexed.normals
+            self.bounding_box = indexed.bounding_box if indexed.bounding_box is not None else \
+                calculate_bounding_box(vertices)
+        else:
+            self.normals = calculate_normals(vertices, faces)
+            self.bounding_box = calculate_bounding_box(vertices)
+        self.bounding_radius = float(np.max(np.linalg.norm(vertices, axis=1))) if len(vertices) else 0.0
+        self.unit_inertia_tensor = calculate_inertia_tensor(vertices)
+        # Fitted on first use, per kind (None - the best fitting one)
+        self.collision_shapes = {}
+
+        self.users = 0
+        self.gpu_users = 0
+
+        self.vao = None
+        self.vbo = None
+        self.ibo = None
+        self.num_indices = 0
+        self.index_type = GL_UNSIGNED_INT
+
+        self.vertex_data = None
+        self.vertex_layout = None
+        self.index_data = None
+        self.memory_report = None
+        self._build_lock = threading.Lock()
+
+    @property
+    def uvs(self):
+        if self._uvs is None and self.indexed is not None:
+            uvs = self.indexed.uvs
+            self._uvs = remap_uvs(uvs, self.uv_rect) if self.uv_rect is not None else uvs
+        return self._uvs
+
+    def collision_shape(self, kind: str = None) -> CollisionShape:
+        shape = self.collision_shapes.get(kind)
+        if shape is None:
+            shape = self.collision_shapes[kind] = CollisionShape.fit(self.vertices, kind)
+        return shape
+
+    def build_vertex_buffers(self):
+        # May run on asset loader threads ahead of upload(), which then only copies the finished arrays
+        with self._build_lock:
+            if self.index_data is not None:
+                return
+            if self.indexed is not None:
+                self.build_indexed_buffers()
+            else:
+                self.build_welded_buffers()
+
+    def build_welded_buffers(self):
+
+        positions, normals, uvs, indices = weld_vertices(self.vertices, self.normals, self.faces, self.uvs)
+        index_dtype = smallest_index_dtype(len(positions))
+        report = MeshMemoryReport(
+            triangle_count=len(self.faces),
+            expanded_vertex_count=len(self.faces) * 3,
+            vertex_count=len(positions),
+            vertex_stride=interleave_vertices(positions[:0], normals[:0], uvs[:0], self.compress_vertices).itemsize,
+            index_size=np.dtype(index_dtype).itemsize
+        )
+
+        if self.optimize_vertex_cache:
+            report.acmr_before = average_cache_miss_ratio(indices)
+            indices = optimize_vertex_cache(indices, len(positions))
+            indices, positions, normals, uvs = reorder_vertices(indices, positions, normals, uvs)
+            report.acmr_after = average_cache_miss_ratio(indices)
+
+        self.vertex_data = interleave_vertices(positions, normals, uvs, self.compress_vertices)
+        self.vertex_layout = self.interleaved_layout(self.vertex_data.dtype)
+        self.index_data = indices.astype(index_dtype)
+        self.memory_report = report
+
+    def build_indexed_buffers(self):
+        # Welded data (binary mesh files) is not welded or reordered again
+        indexed = self.indexed
+        self.index_data = indexed.indices
+
+        if indexed.vertex_block is not None and self.uv_rect is None:
+            # Separate position/normal/uv runs inside a single buffer, uploaded straight from the mapped file
+            position_offset, normal_offset, uv_offset = indexed.vertex_offsets
+            self.vertex_data = indexed.vertex_block
+            self.vertex_layout = {
+                "position": (3, GL_FLOAT, 0, position_offset),
+                "normal": (3, GL_FLOAT, 0, normal_offset),
+                "uv": (2, GL_FLOAT, 0, uv_offset),
+            }
+            # The runs hold the uncompressed vertex format
+            vertex_stride = VERTEX_FORMAT.itemsize
+        else:
+            uvs = indexed.vertex_uvs if self.uv_rect is None else remap_uvs(indexed.vertex_uvs, self.uv_rect)
+            self.vertex_data = interleave_vertices(indexed.positions, indexed.normals, uvs, self.compress_vertices)
+            self.vertex_layout = self.interleaved_layout(self.vertex_data.dtype)
+            vertex_stride = self.vertex_data.itemsize
+
+        self.memory_report = MeshMemoryReport(
+            triangle_count=len(self.faces),
+            expanded_vertex_count=len(self.faces) * 3,
+            vertex_count=len(indexed.positions),
+            vertex_stride=vertex_stride,
+            index_size=indexed.indices.itemsize
+        )
+
+    @staticmethod
+    def interleaved_layout(vertex_format: np.dtype) -> dict:
+        layout = {}
+        for name, components in (("position", 3), ("normal", 3), ("uv", 2)):
+            field_type, offset = vertex_format.fields[name]
+            layout[name] = (components, GL_TYPES[field_type.base], vertex_format.itemsize, offset)
+        return layout
+
+    def upload(self):
+        self.gpu_users += 1
+        if self.vbo is not None:
+            return
+
+        self.build_vertex_buffers()
+        vertex_data = self.vertex_data
+        index_data = self.index_data
+
+        self.vbo = glGenBuffers(1)
+        self.ibo = glGenBuffers(1)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, vertex_data.nbytes, vertex_data, GL_STATIC_DRAW)
+
+        self.num_indices = len(index_data)
+        self.index_type = GL_UNSIGNED_SHORT if index_data.dtype == np.uint16 else GL_UNSIGNED_INT
+
+        if gl_version() >= (3, 0):
+            # The vertex array object records the pointers, enabled arrays and the index buffer once
+            self.vao = glGenVertexArrays(1)
+            glBindVertexArray(self.vao)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, index_data.nbytes, index_data, GL_STATIC_DRAW)
+            self.set_vertex_pointers()
+            glBindVertexArray(0)
+        else:
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, index_data.nbytes, index_data, GL_STATIC_DRAW)
+
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def set_vertex_pointers(self):
+        position_size, position_type, position_stride, position_offset = self.vertex_layout["position"]
+        _, normal_type, normal_stride, normal_offset = self.vertex_layout["normal"]
+        uv_size, uv_type, uv_stride, uv_offset = self.vertex_layout["uv"]
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glVertexPointer(position_size, position_type, position_stride, ctypes.c_void_p(position_offset))
+        glNormalPointer(normal_type, normal_stride, ctypes.c_void_p(normal_offset))
+        glTexCoordPointer(uv_size, uv_type, uv_stride, ctypes.c_void_p(uv_offset))
+
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+
+    def bind(self):
+        if self.vao is not None:
+            glBindVertexArray(self.vao)
+        else:
+            self.set_vertex_pointers()
+
+    def unbind(self):
+        if self.vao is not None:
+            glBindVertexArray(0)
+        else:
+            glDisableClientState(GL_VERTEX_ARRAY)
+            glDisableClientState(GL_NORMAL_ARRAY)
+            glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+
+    def release_gpu(self):
+        self.gpu_users -= 1
+        if self.gpu_users > 0 or self.vbo is None:
+            return
+
+        if self.vao is not None:
+            glDeleteVertexArrays(1, [self.vao])
+        glDeleteBuffers(2, [self.vbo, self.ibo])
+        self.vao = self.vbo = self.ibo = None
+        self.num_indices = 0
+
+
+class MeshCache:
+    def __init__(self, optimize_vertex_cache: bool = False, compress_vertices: bool = False):
+        self.optimize_vertex_cache = optimize_vertex_cache
+        self.compress_vertices = compress_vertices
+        self._by_mesh = weakref.WeakKeyDictionary()
+        self._by_content = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._by_content)
+
+    def acquire(self, mesh, uv_rect: tuple = None) -> MeshResource:
+        # Hashing and the derived data are computed outside the lock so asset loader threads build different
+        # meshes in parallel; two threads racing on the same content keep whichever resource was stored first.
+        # A texture atlas region (uv_rect) gives the mesh its own resource with remapped UVs
+        uv_rect = tuple(float(value) for value in uv_rect) if uv_rect is not None else None
+        with self._lock:
+            resource = self._by_mesh.get(mesh, {}).get(uv_rect)
+            if resource is not None:
+                resource.users += 1
+                return resource
+
+        if isinstance(mesh, IndexedMesh):
+            vertices, faces, uvs = mesh.positions, mesh.faces, None
+            key = self.content_key(vertices, faces, mesh.vertex_uvs, uv_rect)
+        else:
+            vertices = np.ascontiguousarray(mesh.vertices, dtype=np.float32).reshape(-1, 3)
+            faces = np.ascontiguousarray(mesh.faces, dtype=np.int32).reshape(-1, 3)
+            uvs = np.ascontiguousarray(mesh.uvs, dtype=np.float32).reshape(-1, 3, 2)
+            key = self.content_key(vertices, faces, uvs, uv_rect)
+            if uv_rect is not None:
+                uvs = remap_uvs(uvs, uv_rect)
+
+        with self._lock:
+            resource = self._by_content.get(key)
+        if resource is None:
+            created = MeshResource(key, vertices, faces, uvs, self.optimize_vertex_cache, self.compress_vertices,
+                                   indexed=mesh if isinstance(mesh, IndexedMesh) else None, uv_rect=uv_rect)
+            with self._lock:
+                resource = self._by_content.setdefault(key, created)
+
+        with self._lock:
+            self._by_mesh.setdefault(mesh, {})[uv_rect] = resource
+            resource.users += 1
+        return resource
+
+    def release(self, resource: MeshResource):
+        with self._lock:
+            resource.users -= 1
+            if resource.users > 0 or resource.gpu_users > 0:
+                return
+
+            self._by_content.pop(resource.key, None)
+            for mesh, resources in list(self._by_mesh.items()):
+                if resources.get(resource.uv_rect) is resource:
+                    del resources[resource.uv_rect]
+                    if not resources:
+                        del self._by_mesh[mesh]
+
+    def memory_report(self) -> list:
+        reports = []
+        for resource in self._by_content.values():
+            resource.build_vertex_buffers()
+            reports.append((resource.key, resource.memory_report))
+        return reports
+
+    @staticmethod
+    def content_key(vertices: np.ndarray, faces: np.ndarray, uvs: np.ndarray, uv_rect: tuple = None) -> str:
+        digest = hashlib.sha1()
+        for array in (vertices, faces, uvs):
+            digest.update(str(array.shape).encode())
+            digest.update(np.ascontiguousarray(array).data)
+        if uv_rect is not None:
+            digest.update(str(uv_rect).encode())
+        return digest.hexdigest()
+
+
+mesh_cache = MeshCache()
@@ -0,0 +1,36 @@
+# Converts JSON, Wavefront OBJ or glTF meshes to the binary mesh format:
+#   python -m engine3d.mesh_converter model.obj -o model.mkmesh
+#   python -m engine3d.mesh_converter first.obj second.glb   (writes first.mkmesh and second.mkmesh)
+import argparse
+import os
+import sys
+
+from .methods import load_mesh_on_file
+from .mesh_format import save_mesh, load_mesh_binary, FILE_EXTENSION
+
+
+def convert(source: str, target: str = None) -> str:
+    target = target or os.path.splitext(source)[0] + FILE_EXTENSION
+    save_mesh(target, load_mesh_on_file(source))
+    return target
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Convert JSON, OBJ or glTF meshes to the binary mesh format")
+    parser.add_argument("source", nargs="+", help="JSON, .obj, .gltf or .glb mesh files")
+    parser.add_argument("-o", "--output", help="output file, only with a single source")
+    arguments = parser.parse_args(arguments)
+
+    if arguments.output and len(arguments.source) > 1:
+        parser.error("--output needs exactly one source file")
+
+    for source in arguments.source:
+        target = convert(source, arguments.output)
+        mesh = load_mesh_binary(target)
+        print(f"{source} -> {target}: {len(mesh.positions)} vertices, {len(mesh.indices) // 3} triangles, "
+              f"{os.path.getsize(target) / 1024:.1f} KiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
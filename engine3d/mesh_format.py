@@ -0,0 +1,92 @@
+import struct
+
+import numpy as np
+
+from .classes import Mesh, IndexedMesh
+from .mesh_cache import calculate_normals, calculate_bounding_box
+from .mesh_processing import weld_vertices, smallest_index_dtype
+
+
+# Layout: header, section table, then the sections, each starting on an ALIGNMENT boundary.
+# Positions, normals and UVs follow each other so they can be uploaded as one vertex buffer.
+MAGIC = b"MKE3DMSH"
+VERSION = 1
+ALIGNMENT = 64
+
+HEADER = struct.Struct("<8sIIII")  # magic, version, vertex count, index count, index size
+SECTION = struct.Struct("<QQ")  # offset, size in bytes
+SECTIONS = ("positions", "normals", "uvs", "indices", "bounding_box")
+
+FILE_EXTENSION = ".mkmesh"
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def save_mesh_binary(file: str, positions: np.ndarray, normals: np.ndarray, uvs: np.ndarray, indices: np.ndarray):
+    positions = np.ascontiguousarray(positions, dtype=np.float32).reshape(-1, 3)
+    normals = np.ascontiguousarray(normals, dtype=np.float32).reshape(-1, 3)
+    uvs = np.ascontiguousarray(uvs, dtype=np.float32).reshape(-1, 2)
+    indices = np.ascontiguousarray(indices, dtype=smallest_index_dtype(len(positions))).reshape(-1)
+    bounding_box = np.array(calculate_bounding_box(positions), dtype=np.float32)
+
+    arrays = (positions, normals, uvs, indices, bounding_box)
+    offset = _align(HEADER.size + SECTION.size * len(SECTIONS))
+    table = []
+    for array in arrays:
+        table.append((offset, array.nbytes))
+        offset = _align(offset + array.nbytes)
+
+    with open(file, "wb") as stream:
+        stream.write(HEADER.pack(MAGIC, VERSION, len(positions), len(indices), indices.itemsize))
+        for section in table:
+            stream.write(SECTION.pack(*section))
+        for (section_offset, _), array in zip(table, arrays):
+            stream.write(b"\0" * (section_offset - stream.tell()))
+            stream.write(array.data)
+
+
+def save_mesh(file: str, mesh: Mesh):
+    # Welded with the same normals the mesh cache would compute, so the file draws exactly like the mesh
+    vertices = np.asarray(mesh.vertices, dtype=np.float32).reshape(-1, 3)
+    faces = np.asarray(mesh.faces, dtype=np.int32).reshape(-1, 3)
+    uvs = np.asarray(mesh.uvs, dtype=np.float32).reshape(-1, 3, 2)
+    positions, normals, vertex_uvs, indices = weld_vertices(vertices, calculate_normals(vertices, faces), faces, uvs)
+    save_mesh_binary(file, positions, normals, vertex_uvs, indices)
+
+
+def load_mesh_binary(file: str) -> IndexedMesh:
+    # Every array is a view into one read-only memory map, nothing is copied until the GPU upload reads it
+    data = np.memmap(file, dtype=np.uint8, mode="r")
+    magic, version, vertex_count, index_count, index_size = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{file} is not a binary mesh file")
+    if version != VERSION:
+        raise ValueError(f"{file} has unsupported binary mesh version {version}")
+
+    sections = {}
+    for number, name in enumerate(SECTIONS):
+        sections[name] = SECTION.unpack_from(data, HEADER.size + SECTION.size * number)
+
+    def section(name: str, dtype, shape: tuple) -> np.ndarray:
+        offset, size = sections[name]
+        return data[offset:offset + size].view(dtype).reshape(shape)
+
+    positions = section("positions", np.float32, (vertex_count, 3))
+    normals = section("normals", np.float32, (vertex_count, 3))
+    uvs = section("uvs", np.float32, (vertex_count, 2))
+    indices = section("indices", np.uint16 if index_size == 2 else np.uint32, (index_count,))
+    bounding_box = section("bounding_box", np.float32, (2, 3))
+
+    block_start = sections["positions"][0]
+    block_end = sections["uvs"][0] + sections["uvs"][1]
+    return IndexedMesh(
+        positions=positions,
+        normals=normals,
+        uvs=uvs,
+        indices=indices,
+        bounding_box=(bounding_box[0], bounding_box[1]),
+        vertex_block=data[block_start:block_end],
+        vertex_offsets=(0, sections["normals"][0] - block_start, sections["uvs"][0] - block_start)
+    )
@@ -0,0 +1,211 @@
+import numpy as np
+
+
+VERTEX_FORMAT = np.dtype([("position", np.float32, 3), ("normal", np.float32, 3), ("uv", np.float32, 2)])
+# Normals as normalized shorts (padded to keep 4 byte alignment) and half-float UVs, 24 bytes instead of 32
+COMPRESSED_VERTEX_FORMAT = np.dtype([("position", np.float32, 3), ("normal", np.int16, 4), ("uv", np.float16, 2)])
+
+
+def weld_vertices(vertices: np.ndarray, normals: np.ndarray, faces: np.ndarray, uvs: np.ndarray):
+    # Builds one vertex per unique (position, normal, uv) corner, in order of first use
+    faces_flat = faces.reshape(-1)
+    corners = np.hstack((
+        vertices[faces_flat].astype(np.float32),
+        normals[faces_flat].astype(np.float32),
+        uvs.reshape(-1, 2).astype(np.float32)
+    ))
+    corners = np.ascontiguousarray(corners)
+
+    rows = corners.view(np.dtype((np.void, corners.dtype.itemsize * corners.shape[1]))).reshape(-1)
+    _, first_use, inverse = np.unique(rows, return_index=True, return_inverse=True)
+
+    order = np.argsort(first_use)
+    remap = np.empty_like(order)
+    remap[order] = np.arange(len(order))
+
+    unique = corners[first_use[order]]
+    indices = remap[inverse.reshape(-1)]
+    return unique[:, 0:3], unique[:, 3:6], unique[:, 6:8], indices
+
+
+def interleave_vertices(positions: np.ndarray, normals: np.ndarray, uvs: np.ndarray,
+                        compressed: bool = False) -> np.ndarray:
+    vertex_format = COMPRESSED_VERTEX_FORMAT if compressed else VERTEX_FORMAT
+    vertices = np.zeros(len(positions), dtype=vertex_format)
+    vertices["position"] = positions
+    vertices["uv"] = uvs
+    if compressed:
+        vertices["normal"][:, :3] = np.round(np.clip(normals, -1.0, 1.0) * np.iinfo(np.int16).max)
+    else:
+        vertices["normal"] = normals
+    return vertices
+
+
+def smallest_index_dtype(vertex_count: int):
+    return np.uint16 if vertex_count <= np.iinfo(np.uint16).max + 1 else np.uint32
+
+
+def average_cache_miss_ratio(indices: np.ndarray, cache_size: int = 32) -> float:
+    cache = []
+    misses = 0
+    for index in indices.tolist():
+        if index in cache:
+            continue
+        misses += 1
+        cache.append(index)
+        if len(cache) > cache_size:
+            cache.pop(0)
+    return misses / max(len(indices) // 3, 1)
+
+
+def optimize_vertex_cache(indices: np.ndarray, vertex_count: int, cache_size: int = 32) -> np.ndarray:
+    # Tom Forsyth's "Linear-Speed Vertex Cache Optimisation"
+    triangles = indices.reshape(-1, 3)
+    triangle_count = len(triangles)
+
+    valence = np.bincount(triangles.reshape(-1), minlength=vertex_count)
+    offsets = np.concatenate(([0], np.cumsum(valence)))
+    vertex_triangles = np.argsort(triangles.reshape(-1), kind="stable") // 3
+    remaining = valence.astype(np.int64)
+
+    cache_decay = 1.5
+    last_triangle_score = 0.75
+    valence_boost_scale = 2.0
+    valence_boost_power = 0.5
+
+    def vertex_score(vertex: int, position: int) -> float:
+        if remaining[vertex] == 0:
+            return -1.0
+        score = 0.0
+        if position >= 0:
+            if position < 3:
+                score = last_triangle_score
+            else:
+                score = (1.0 - (position - 3) / (cache_size - 3)) ** cache_decay
+        return score + valence_boost_scale * remaining[vertex] ** -valence_boost_power
+
+    cache_position = np.full(vertex_count, -1, dtype=np.int64)
+    vertex_scores = np.array([vertex_score(vertex, -1) for vertex in range(vertex_count)])
+    triangle_scores = vertex_scores[triangles].sum(axis=1)
+    emitted = np.zeros(triangle_count, dtype=bool)
+
+    output = np.empty_like(triangles)
+    cache = []
+    best = int(np.argmax(triangle_scores))
+    for written in range(triangle_count):
+        if best < 0:
+            # Nothing useful in the cache, restart from the best remaining triangle
+            candidates = np.flatnonzero(~emitted)
+            best = int(candidates[np.argmax(triangle_scores[candidates])])
+
+        triangle = triangles[best].tolist()
+        output[written] = triangle
+        emitted[best] = True
+        triangle_scores[best] = -1.0
+
+        for vertex in triangle:
+            remaining[vertex] -= 1
+            if vertex in cache:
+                cache.remove(vertex)
+        cache = triangle + cache
+
+        touched = set(cache)
+        evicted = cache[cache_size:]
+        cache = cache[:cache_size]
+        for vertex in evicted:
+            cache_position[vertex] = -1
+        for position, vertex in enumerate(cache):
+            cache_position[vertex] = position
+
+        updated_triangles = set()
+        for vertex in touched:
+            vertex_scores[vertex] = vertex_score(vertex, int(cache_position[vertex]))
+            for slot in range(offsets[vertex], offsets[vertex + 1]):
+                triangle_index = int(vertex_triangles[slot])
+                if not emitted[triangle_index]:
+                    updated_triangles.add(triangle_index)
+
+        best = -1
+        best_score = -1.0
+        for triangle_index in updated_triangles:
+            score = float(vertex_scores[triangles[triangle_index]].sum())
+            triangle_scores[triangle_index] = score
+            if score > best_score:
+                best, best_score = triangle_index, score
+
+    return output.reshape(-1)
+
+
+def reorder_vertices(indices: np.ndarray, *attributes):
+    # Renumbers vertices in the order the index buffer first touches them, for better pre-transform locality
+    _, first_use = np.unique(indices, return_index=True)
+    order = np.unique(indices)[np.argsort(first_use)]
+    remap = np.empty(len(attributes[0]), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    return (remap[indices],) + tuple(attribute[order] for attribute in attributes)
+
+
+def remap_uvs(uvs: np.ndarray, uv_rect: tuple) -> np.ndarray:
+    # Moves UVs into the (u0, v0, u1, v1) sub-rectangle of a texture atlas; repeating UVs cannot survive that
+    # and are clamped to the region instead of bleeding into neighbours
+    u0, v0, u1, v1 = uv_rect
+    uvs = np.clip(uvs, 0.0, 1.0)
+    return (uvs * np.array((u1 - u0, v1 - v0)) + np.array((u0, v0))).astype(np.float32)
+
+
+def surface_area(vertices: np.ndarray, faces: np.ndarray) -> float:
+    edges_1 = vertices[faces[:, 1]] - vertices[faces[:, 0]]
+    edges_2 = vertices[faces[:, 2]] - vertices[faces[:, 0]]
+    return float(np.linalg.norm(np.cross(edges_1, edges_2), axis=1).sum() * 0.5)
+
+
+def cluster_vertices(vertices: np.ndarray, faces: np.ndarray, uvs: np.ndarray, cell_size: float):
+    # Vertex clustering simplification: every grid cell collapses to the mean of its vertices, triangles that
+    # degenerate or become duplicates are dropped and the survivors keep their original corner UVs
+    cells = np.floor((vertices - vertices.min(axis=0)) / cell_size).astype(np.int64)
+    _, cluster, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    cluster = cluster.reshape(-1)
+
+    positions = np.zeros((len(counts), 3))
+    np.add.at(positions, cluster, vertices)
+    positions /= counts[:, np.newaxis]
+
+    clustered = cluster[faces]
+    keep = ((clustered[:, 0] != clustered[:, 1]) & (clustered[:, 1] != clustered[:, 2]) &
+            (clustered[:, 0] != clustered[:, 2]))
+    clustered, uvs = clustered[keep], uvs[keep]
+
+    _, first = np.unique(np.sort(clustered, axis=1), axis=0, return_index=True)
+    first.sort()
+    clustered, uvs = clustered[first], uvs[first]
+
+    used, compact = np.unique(clustered, return_inverse=True)
+    return positions[used].astype(np.float32), compact.reshape(-1, 3).astype(np.int32), uvs
+
+
+class MeshMemoryReport:
+    def __init__(self, triangle_count: int, expanded_vertex_count: int, vertex_count: int, vertex_stride: int,
+                 index_size: int, expanded_vertex_stride: int = 32, expanded_index_size: int = 4):
+        self.triangle_count = triangle_count
+        self.expanded_vertex_count = expanded_vertex_count
+        self.vertex_count = vertex_count
+        self.expanded_bytes = expanded_vertex_count * (expanded_vertex_stride + expanded_index_size)
+        self.indexed_bytes = vertex_count * vertex_stride + triangle_count * 3 * index_size
+        self.acmr_before = None
+        self.acmr_after = None
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.expanded_bytes - self.indexed_bytes
+
+    @property
+    def ratio(self) -> float:
+        return self.expanded_bytes / max(self.indexed_bytes, 1)
+
+    def __str__(self):
+        text = (f"{self.triangle_count} triangles, {self.expanded_vertex_count} -> {self.vertex_count} vertices, "
+                f"{self.expanded_bytes / 1024:.1f} KiB -> {self.indexed_bytes / 1024:.1f} KiB "
+                f"({self.ratio:.2f}x smaller)")
+        if self.acmr_before is not None:
+            text += f", ACMR {self.acmr_before:.3f} -> {self.acmr_after:.3f}"
+        return text
@@ -1,76 +1,208 @@
 import math
 
-from .classes import Mesh
+import numpy as np
 
+from .classes import Mesh, LODChain
+from .mesh_processing import cluster_vertices, surface_area
 
-def gen_cube(width: float, height: float, depth: float) -> Mesh:
-    w = float(width) * 2
-    h = float(height) * 2
-    d = float(depth) * 2
 
-    vertices = [
-        [-w/2, -h/2, -d/2], [w/2, -h/2, -d/2], [w/2, h/2, -d/2], [-w/2, h/2, -d/2],
-        [-w/2, -h/2, d/2], [w/2, -h/2, d/2], [w/2, h/2, d/2], [-w/2, h/2, d/2]
-    ]
+def _grid_faces(rows: int, columns: int):
+    # Two triangles per cell of a (rows + 1) x (columns + 1) vertex grid stored row by row, with per-corner UVs
+    i, j = np.meshgrid(np.arange(rows), np.arange(columns), indexing="ij")
+    v0 = (i * (columns + 1) + j).reshape(-1)
+    v1 = v0 + 1
+    v2 = v0 + columns + 2
+    v3 = v2 - 1
+
+    faces = np.empty((rows * columns * 2, 3), dtype=np.int32)
+    faces[0::2] = np.stack((v0, v1, v2), axis=1)
+    faces[1::2] = np.stack((v0, v2, v3), axis=1)
+
+    u0 = (j / columns).reshape(-1)
+    u1 = ((j + 1) / columns).reshape(-1)
+    t0 = (i / rows).reshape(-1)
+    t1 = ((i + 1) / rows).reshape(-1)
+
+    uvs = np.empty((rows * columns * 2, 3, 2), dtype=np.float32)
+    uvs[0::2] = np.stack((np.stack((u0, t0), axis=1), np.stack((u1, t0), axis=1), np.stack((u1, t1), axis=1)), axis=1)
+    uvs[1::2] = np.stack((np.stack((u0, t0), axis=1), np.stack((u1, t1), axis=1), np.stack((u0, t1), axis=1)), axis=1)
+    return faces, uvs
+
+
+def _disk(center_y: float, radius: float, segments: int, facing_up: bool):
+    phi = np.linspace(0, 2 * math.pi, segments + 1)
+    ring = np.stack((radius * np.cos(phi), np.full_like(phi, center_y), radius * np.sin(phi)), axis=1)
+    vertices = np.vstack(([0.0, center_y, 0.0], ring))
+
+    j = np.arange(segments)
+    center = np.zeros(segments, dtype=np.int32)
+    if facing_up:
+        faces = np.stack((center, j + 2, j + 1), axis=1)
+    else:
+        faces = np.stack((center, j + 1, j + 2), axis=1)
+
+    planar = np.stack((0.5 + 0.5 * np.cos(phi), 0.5 + 0.5 * np.sin(phi)), axis=1)
+    planar = np.vstack(([0.5, 0.5], planar))
+    return vertices, faces.astype(np.int32), planar[faces].astype(np.float32)
+
+
+def _merge(*parts) -> Mesh:
+    vertices, faces, uvs = [], [], []
+    offset = 0
+    for part_vertices, part_faces, part_uvs in parts:
+        vertices.append(part_vertices)
+        faces.append(part_faces + offset)
+        uvs.append(part_uvs)
+        offset += len(part_vertices)
+    return Mesh(vertices=np.vstack(vertices), faces=np.vstack(faces), uvs=np.vstack(uvs))
+
+
+def gen_cube(width: float, height: float, depth: float) -> Mesh:
+    half = np.array([float(width), float(height), float(depth)])
+    corners = np.array([
+        [-1, -1, -1], [1, -1, -1], [1, 1, -1], [-1, 1, -1],
+        [-1, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1]
+    ])
 
-    faces = [
+    faces = np.array([
         [0, 1, 2], [0, 2, 3],
         [5, 4, 7], [5, 7, 6],
         [4, 5, 1], [4, 1, 0],
         [3, 2, 6], [3, 6, 7],
         [7, 4, 0], [7, 0, 3],
         [1, 5, 6], [1, 6, 2]
-    ]
+    ])
 
-    uvs = [
-        [[0, 0], [1, 0], [1, 1]], [[0, 0], [1, 1], [0, 1]],
-        [[0, 0], [1, 0], [1, 1]], [[0, 0], [1, 1], [0, 1]],
-        [[0, 0], [1, 0], [1, 1]], [[0, 0], [1, 1], [0, 1]],
-        [[0, 0], [1, 0], [1, 1]], [[0, 0], [1, 1], [0, 1]],
-        [[0, 0], [1, 0], [1, 1]], [[0, 0], [1, 1], [0, 1]],
-        [[0, 0], [1, 0], [1, 1]], [[0, 0], [1, 1], [0, 1]]
-    ]
+    uvs = np.tile(np.array([[[0, 0], [1, 0], [1, 1]], [[0, 0], [1, 1], [0, 1]]]), (6, 1, 1))
 
-    return Mesh(vertices=vertices, faces=faces, uvs=uvs)
+    return Mesh(vertices=corners * half, faces=faces, uvs=uvs)
 
 
 def gen_sphere(radius: float, segments: int = 16) -> Mesh:
-    vertices = []
-    faces = []
-    uvs = []
+    theta = np.arange(segments + 1) * math.pi / segments
+    phi = np.arange(segments + 1) * 2 * math.pi / segments
+    theta, phi = np.meshgrid(theta, phi, indexing="ij")
+
+    vertices = np.stack((
+        radius * np.sin(theta) * np.cos(phi),
+        radius * np.cos(theta),
+        radius * np.sin(theta) * np.sin(phi)
+    ), axis=-1).reshape(-1, 3)
 
-    for i in range(segments + 1):
-        theta = i * math.pi / segments
-        sin_theta = math.sin(theta)
-        cos_theta = math.cos(theta)
+    faces, uvs = _grid_faces(segments, segments)
+    return Mesh(vertices=vertices, faces=faces, uvs=uvs)
 
-        for j in range(segments + 1):
-            phi = j * 2 * math.pi / segments
-            sin_phi = math.sin(phi)
-            cos_phi = math.cos(phi)
 
-            x = radius * sin_theta * cos_phi
-            y = radius * cos_theta
-            z = radius * sin_theta * sin_phi
+def gen_plane(width: float, depth: float, segments_x: int = 1, segments_z: int = None) -> Mesh:
+    # Grid in the XZ plane facing +Y, centered on the origin
+    segments_z = segments_x if segments_z is None else segments_z
+    z, x = np.meshgrid(np.linspace(depth / 2, -depth / 2, segments_z + 1),
+                       np.linspace(-width / 2, width / 2, segments_x + 1), indexing="ij")
+    vertices = np.stack((x, np.zeros_like(x), z), axis=-1).reshape(-1, 3)
 
-            vertices.append([x, y, z])
+    faces, uvs = _grid_faces(segments_z, segments_x)
+    return Mesh(vertices=vertices, faces=faces, uvs=uvs)
 
-    for i in range(segments):
-        for j in range(segments):
-            v0 = i * (segments + 1) + j
-            v1 = v0 + 1
-            v2 = (i + 1) * (segments + 1) + j + 1
-            v3 = v2 - 1
 
-            faces.append([v0, v1, v2])
-            faces.append([v0, v2, v3])
+def gen_cylinder(radius: float, height: float, segments: int = 32, caps: bool = True) -> Mesh:
+    phi = np.linspace(0, 2 * math.pi, segments + 1)
+    y = np.array([height / 2, -height / 2])
+    y, phi = np.meshgrid(y, phi, indexing="ij")
+    side = np.stack((radius * np.cos(phi), y, radius * np.sin(phi)), axis=-1).reshape(-1, 3)
 
-            u0 = j / segments
-            u1 = (j + 1) / segments
-            v0 = i / segments
-            v1 = (i + 1) / segments
+    # Caps get their own vertices so the rim keeps a hard edge in the smoothed normals
+    parts = [(side, *_grid_faces(1, segments))]
+    if caps:
+        parts.append(_disk(height / 2, radius, segments, facing_up=True))
+        parts.append(_disk(-height / 2, radius, segments, facing_up=False))
+    return _merge(*parts)
 
-            uvs.append([[u0, v0], [u1, v0], [u1, v1]])
-            uvs.append([[u0, v0], [u1, v1], [u0, v1]])
 
+def gen_capsule(radius: float, height: float, segments: int = 32, rings: int = 8) -> Mesh:
+    # `height` is the length of the cylindrical part, the hemispheres add `radius` on each end
+    theta = np.concatenate((np.linspace(0, math.pi / 2, rings + 1), np.linspace(math.pi / 2, math.pi, rings + 1)))
+    offset = np.concatenate((np.full(rings + 1, height / 2), np.full(rings + 1, -height / 2)))
+    phi = np.linspace(0, 2 * math.pi, segments + 1)
+
+    theta, phi = np.meshgrid(theta, phi, indexing="ij")
+    vertices = np.stack((
+        radius * np.sin(theta) * np.cos(phi),
+        radius * np.cos(theta) + offset[:, np.newaxis],
+        radius * np.sin(theta) * np.sin(phi)
+    ), axis=-1).reshape(-1, 3)
+
+    faces, uvs = _grid_faces(2 * rings + 1, segments)
     return Mesh(vertices=vertices, faces=faces, uvs=uvs)
+
+
+def gen_icosphere(radius: float, subdivisions: int = 2) -> Mesh:
+    t = (1 + math.sqrt(5)) / 2
+    vertices = np.array([
+        [-1, t, 0], [1, t, 0], [-1, -t, 0], [1, -t, 0],
+        [0, -1, t], [0, 1, t], [0, -1, -t], [0, 1, -t],
+        [t, 0, -1], [t, 0, 1], [-t, 0, -1], [-t, 0, 1]
+    ], dtype=np.float64)
+    faces = np.array([
+        [0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11],
+        [1, 5, 9], [5, 11, 4], [11, 10, 2], [10, 7, 6], [7, 1, 8],
+        [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9],
+        [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1]
+    ])
+    vertices /= np.linalg.norm(vertices, axis=1)[:, np.newaxis]
+
+    for _ in range(subdivisions):
+        # One midpoint per unique edge, each triangle splits into four
+        edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+        unique_edges, edge_index = np.unique(edges, axis=0, return_inverse=True)
+        midpoints = vertices[unique_edges].mean(axis=1)
+        midpoints /= np.linalg.norm(midpoints, axis=1)[:, np.newaxis]
+
+        a, b, c = faces.T
+        ab, bc, ca = (edge_index.reshape(-1, 3) + len(vertices)).T
+        faces = np.concatenate((
+            np.stack((a, ab, ca), axis=1),
+            np.stack((b, bc, ab), axis=1),
+            np.stack((c, ca, bc), axis=1),
+            np.stack((ab, bc, ca), axis=1)
+        ))
+        vertices = np.vstack((vertices, midpoints))
+
+    # Spherical mapping per corner; triangles crossing the seam are unwrapped and pole corners take the
+    # longitude of the rest of their triangle
+    corners = vertices[faces]
+    u = 0.5 + np.arctan2(corners[..., 2], corners[..., 0]) / (2 * math.pi)
+    v = np.arccos(np.clip(corners[..., 1], -1, 1)) / math.pi
+    u = np.where((u.max(axis=1, keepdims=True) - u) > 0.5, u + 1, u)
+    pole = np.abs(corners[..., 1]) > 1 - 1e-9
+    other = np.where(pole, 0.0, u).sum(axis=1, keepdims=True) / np.maximum((~pole).sum(axis=1, keepdims=True), 1)
+    u = np.where(pole, other, u)
+
+    return Mesh(vertices=vertices * radius, faces=faces, uvs=np.stack((u, v), axis=-1))
+
+
+def simplify_mesh(mesh: Mesh, ratio: float = 0.25) -> Mesh:
+    vertices = np.asarray(mesh.vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(mesh.faces, dtype=np.int64).reshape(-1, 3)
+    uvs = np.asarray(mesh.uvs, dtype=np.float32).reshape(-1, 3, 2)
+
+    # About one cluster per cell crossed by the surface, so the cell size follows from the area per target vertex
+    target = max(len(np.unique(vertices, axis=0)) * ratio, 4)
+    cell_size = math.sqrt(surface_area(vertices, faces) / target)
+    vertices, faces, uvs = cluster_vertices(vertices, faces, uvs, cell_size)
+    if not len(faces):
+        return mesh
+    return Mesh(vertices=vertices, faces=faces, uvs=uvs)
+
+
+def gen_lod_chain(mesh: Mesh, levels: int = 3, ratio: float = 0.25, screen_sizes: list = None) -> LODChain:
+    meshes = [mesh]
+    for _ in range(levels - 1):
+        simplified = simplify_mesh(meshes[-1], ratio)
+        if simplified is meshes[-1]:
+            break
+        meshes.append(simplified)
+    return LODChain(meshes, screen_sizes)
+
+
+def gen_sphere_lods(radius: float, segments: tuple = (256, 64, 16), screen_sizes: list = None) -> LODChain:
+    return LODChain([gen_sphere(radius, level_segments) for level_segments in segments], screen_sizes)
@@ -1,12 +1,27 @@
 import json
+import os
 
-from PIL import Image
 from OpenGL.GL import *
 
 from .classes import Mesh
+from .mesh_format import load_mesh_binary, FILE_EXTENSION
+from .importers import load_obj, load_gltf
+from .textures import texture_manager
+from .atlas import texture_atlases
 
 
 def load_mesh_on_file(file: str):
+    extension = os.path.splitext(str(file))[1].lower()
+    if extension == FILE_EXTENSION:
+        return load_mesh_binary(str(file))
+    if extension == ".obj":
+        return load_obj(str(file))
+    if extension in (".gltf", ".glb"):
+        return load_gltf(str(file))
+    return load_mesh_json(file)
+
+
+def load_mesh_json(file: str):
     with open(file=f"{str(file)}", mode="r") as file:
         mesh_data = json.load(fp=file)
         mesh = Mesh(
@@ -16,22 +31,17 @@ def load_mesh_on_file(file: str):
     return mesh
 
 
-def load_texture_on_file(file: str):
-    image = Image.open(file)
-    image_data = image.convert("RGBA").tobytes()
-    width, height = image.size
-
-    texture_id = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, texture_id)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, image_data)
-
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-
-    return texture_id
+def load_texture_on_file(file: str, atlas: bool = False):
+    # Shared per file (and modification time) through the texture manager, see textures.py. With atlas=True
+    # small textures are packed into a shared atlas and an AtlasRegion is returned, actors remap their UVs to it
+    if atlas:
+        region = texture_atlases.load(file)
+        if region is not None:
+            return region
+    return texture_manager.load(file)
 
 
-def gen_base_texture():
+def gen_base_texture(color=(0, 255, 180)):
     texture_id = glGenTextures(1)
     glBindTexture(GL_TEXTURE_2D, texture_id)
     glTexImage2D(
@@ -43,7 +53,7 @@ def gen_base_texture():
         GL_RGB,
         GL_UNSIGNED_BYTE,
         bytes(
-            [0, 255, 180]
+            color
         )
     )
 
@@ -0,0 +1,394 @@
+import numpy as np
+
+from .collision_shapes import SHAPE_KINDS, SPHERE, AABB, OBB, CAPSULE
+from .transforms import quaternion_matrices
+
+
+EPSILON = 1e-12
+_SPHERE, _AABB, _OBB, _CAPSULE = (SHAPE_KINDS.index(kind) for kind in (SPHERE, AABB, OBB, CAPSULE))
+
+# Every contact test takes rows of world space shapes and returns (normals, depths): unit normals pointing from
+# the first shape to the second and penetration depths along them, negative when the shapes are apart
+
+
+def _rows_dot(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", a, b)
+
+
+def _rotate(rotations: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    return (rotations @ vectors[:, :, np.newaxis])[:, :, 0]
+
+
+def _unrotate(rotations: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    # By the transposed rotations, world to local
+    return (vectors[:, np.newaxis, :] @ rotations)[:, 0]
+
+
+def _unit_rows(vectors: np.ndarray):
+    # (unit vectors, lengths), zero vectors point up
+    lengths = np.linalg.norm(vectors, axis=1)
+    valid = lengths > EPSILON
+    units = np.where(valid[:, np.newaxis], vectors / np.where(valid, lengths, 1.0)[:, np.newaxis], (0.0, 1.0, 0.0))
+    return units, lengths
+
+
+def closest_points_on_segments(points: np.ndarray, centers: np.ndarray, half_segments: np.ndarray) -> np.ndarray:
+    # Segments from center - half to center + half
+    lengths_sq = _rows_dot(half_segments, half_segments)
+    t = _rows_dot(points - centers, half_segments) / np.where(lengths_sq > EPSILON, lengths_sq, 1.0)
+    return centers + half_segments * np.clip(t, -1.0, 1.0)[:, np.newaxis]
+
+
+def closest_points_between_segments(centers_1: np.ndarray, half_segments_1: np.ndarray, centers_2: np.ndarray,
+                                    half_segments_2: np.ndarray):
+    # Ericson, Real-Time Collision Detection 5.1.9, with the branches turned into selects
+    starts_1 = centers_1 - half_segments_1
+    starts_2 = centers_2 - half_segments_2
+    direction_1 = 2 * half_segments_1
+    direction_2 = 2 * half_segments_2
+    offset = starts_1 - starts_2
+    a = _rows_dot(direction_1, direction_1)
+    b = _rows_dot(direction_1, direction_2)
+    c = _rows_dot(direction_1, offset)
+    e = _rows_dot(direction_2, direction_2)
+    f = _rows_dot(direction_2, offset)
+    safe_a = np.where(a > EPSILON, a, 1.0)
+    safe_e = np.where(e > EPSILON, e, 1.0)
+
+    # Closest points of the infinite lines, parallel ones start from s = 0
+    denominator = a * e - b * b
+    s = np.where(denominator > EPSILON, np.clip((b * f - c * e) / np.where(denominator > EPSILON, denominator, 1.0),
+                                                0.0, 1.0), 0.0)
+    t = (b * s + f) / safe_e
+    # t past an end of the second segment: clamp it and find s again
+    clamped = np.clip(t, 0.0, 1.0)
+    s = np.where(t != clamped, np.clip((b * clamped - c) / safe_a, 0.0, 1.0), s)
+    t = clamped
+
+    # Segments of zero length are points
+    point_2 = e <= EPSILON
+    s = np.where(point_2, np.clip(-c / safe_a, 0.0, 1.0), s)
+    t = np.where(point_2, 0.0, t)
+    s = np.where(a > EPSILON, s, 0.0)
+    t = np.where(a > EPSILON, t, np.where(point_2, 0.0, np.clip(f / safe_e, 0.0, 1.0)))
+    return starts_1 + direction_1 * s[:, np.newaxis], starts_2 + direction_2 * t[:, np.newaxis]
+
+
+def sphere_sphere_contacts(centers_1: np.ndarray, radii_1: np.ndarray, centers_2: np.ndarray,
+                           radii_2: np.ndarray):
+    normals, distances = _unit_rows(centers_2 - centers_1)
+    return normals, radii_1 + radii_2 - distances
+
+
+def sphere_box_contacts(centers: np.ndarray, radii: np.ndarray, box_centers: np.ndarray, box_rotations: np.ndarray,
+                        half_extents: np.ndarray):
+    # Closest point of the box to the sphere center, found in box space
+    local = _unrotate(box_rotations, centers - box_centers)
+    outside = local - np.clip(local, -half_extents, half_extents)
+    local_normals, distances = _unit_rows(outside)
+
+    # A center inside the box is pushed out through the nearest face
+    inside = distances <= EPSILON
+    if np.any(inside):
+        rows = np.flatnonzero(inside)
+        face_gaps = half_extents[rows] - np.abs(local[rows])
+        faces = np.argmin(face_gaps, axis=1)
+        local_normals[rows] = 0.0
+        local_normals[rows, faces] = np.where(local[rows, faces] < 0, -1.0, 1.0)
+        distances[rows] = -face_gaps[np.arange(len(rows)), faces]
+
+    # From the box towards the sphere center in the box, so the sphere to box normal is the opposite
+    normals = -_rotate(box_rotations, local_normals)
+    return normals, radii - distances
+
+
+def aabb_contacts(centers_1: np.ndarray, half_extents_1: np.ndarray, centers_2: np.ndarray,
+                  half_extents_2: np.ndarray):
+    offset = centers_2 - centers_1
+    overlaps = half_extents_1 + half_extents_2 - np.abs(offset)
+    rows = np.arange(len(offset))
+    axes = np.argmin(overlaps, axis=1)
+    normals = np.zeros_like(offset)
+    normals[rows, axes] = np.where(offset[rows, axes] < 0, -1.0, 1.0)
+    return normals, overlaps[rows, axes]
+
+
+# Axes of box_box_contacts as (axis of the first box, axis of the second box): the faces of the first box, the
+# faces of the second and the 9 edge cross products
+_SAT_FIRST = np.array([0, 1, 2, 0, 0, 0, 0, 0, 0, 1, 1, 1, 2, 2, 2])
+_SAT_SECOND = np.array([0, 0, 0, 0, 1, 2, 0, 1, 2, 0, 1, 2, 0, 1, 2])
+
+
+def box_box_contacts(centers_1: np.ndarray, rotations_1: np.ndarray, half_extents_1: np.ndarray,
+                     centers_2: np.ndarray, rotations_2: np.ndarray, half_extents_2: np.ndarray):
+    # Separating axis test over the 3 + 3 face normals and the 9 edge cross products, worked out in the space of
+    # the first box (Gottschalk's OBBTree formulation). The depth is the smallest overlap, the normal its axis
+    count = len(centers_1)
+    rotation = rotations_1.transpose(0, 2, 1) @ rotations_2
+    absolute = np.abs(rotation)
+    offset = _unrotate(rotations_1, centers_2 - centers_1)
+
+    separations = np.empty((count, 15))
+    overlaps = np.empty((count, 15))
+    separations[:, :3] = offset
+    overlaps[:, :3] = half_extents_1 + _rotate(absolute, half_extents_2) - np.abs(offset)
+    separations[:, 3:6] = _unrotate(rotation, offset)
+    overlaps[:, 3:6] = _unrotate(absolute, half_extents_1) + half_extents_2 - np.abs(separations[:, 3:6])
+
+    i, j = _SAT_FIRST[6:], _SAT_SECOND[6:]
+    i1, i2, j1, j2 = (i + 1) % 3, (i + 2) % 3, (j + 1) % 3, (j + 2) % 3
+    edge_separations = offset[:, i2] * rotation[:, i1, j] - offset[:, i1] * rotation[:, i2, j]
+    radii = (half_extents_1[:, i1] * absolute[:, i2, j] + half_extents_1[:, i2] * absolute[:, i1, j] +
+             half_extents_2[:, j1] * absolute[:, i, j2] + half_extents_2[:, j2] * absolute[:, i, j1])
+    # The cross products are not unit length, those of parallel edges give no axis
+    lengths = np.sqrt(np.maximum(1 - rotation[:, i, j] ** 2, 0.0))
+    valid = lengths > 1e-6
+    lengths = np.where(valid, lengths, 1.0)
+    separations[:, 6:] = edge_separations / lengths
+    overlaps[:, 6:] = np.where(valid, (radii - np.abs(edge_separations)) / lengths, np.inf)
+
+    rows = np.arange(count)
+    best = np.argmin(overlaps, axis=1)
+    face = np.identity(3)[_SAT_FIRST[best]]
+    column = rotation[rows, :, _SAT_SECOND[best]]
+    axes = np.where((best < 3)[:, np.newaxis], face, np.where((best < 6)[:, np.newaxis], column,
+                                                              np.cross(face, column)))
+    axes /= np.linalg.norm(axes, axis=1)[:, np.newaxis]
+    axes *= np.where(separations[rows, best] < 0, -1.0, 1.0)[:, np.newaxis]
+    return _rotate(rotations_1, axes), overlaps[rows, best]
+
+
+def capsule_box_contacts(centers: np.ndarray, half_segments: np.ndarray, radii: np.ndarray, box_centers: np.ndarray,
+                         box_rotations: np.ndarray, half_extents: np.ndarray):
+    # Worked out in box space, the segment runs over center + s * half for s in [-1, 1]
+    count = len(centers)
+    rows = np.arange(count)
+    local_centers = _unrotate(box_rotations, centers - box_centers)
+    local_halves = _unrotate(box_rotations, half_segments)
+
+    # The squared distance of the segment point to the box is convex and piecewise quadratic in s, with pieces
+    # changing where a coordinate crosses a box face. Its derivative is piecewise linear and increasing, so the
+    # nearest point lies where the derivative turns positive: found between the crossings, then interpolated
+    safe_halves = np.where(np.abs(local_halves) > EPSILON, local_halves, EPSILON)
+    crossings = np.concatenate(((-half_extents - local_centers) / safe_halves,
+                                (half_extents - local_centers) / safe_halves, np.full((count, 2), (-1.0, 1.0))), axis=1)
+    s = np.sort(np.clip(crossings, -1.0, 1.0), axis=1)
+    points = local_centers[:, np.newaxis] + s[:, :, np.newaxis] * local_halves[:, np.newaxis]
+    gaps = points - np.clip(points, -half_extents[:, np.newaxis], half_extents[:, np.newaxis])
+    slopes = (gaps @ local_halves[:, :, np.newaxis])[:, :, 0]
+
+    after = np.clip(np.argmax(slopes >= 0, axis=1), 1, 7)
+    before = after - 1
+    rise = slopes[rows, after] - slopes[rows, before]
+    step = np.where(rise > EPSILON, -slopes[rows, before] / np.where(rise > EPSILON, rise, 1.0), 0.0)
+    nearest = np.clip(s[rows, before] + np.clip(step, 0.0, 1.0) * (s[rows, after] - s[rows, before]), -1.0, 1.0)
+    nearest = np.where(slopes[rows, 0] >= 0, -1.0, nearest)
+    nearest = np.where(slopes[rows, 7] <= 0, 1.0, nearest)
+    nearest = local_centers + nearest[:, np.newaxis] * local_halves
+    normals, depths = sphere_box_contacts(box_centers + _rotate(box_rotations, nearest), radii, box_centers,
+                                          box_rotations, half_extents)
+
+    cutting = np.all(np.abs(nearest) <= half_extents + 1e-9, axis=1)
+    if not np.any(cutting):
+        return normals, depths
+
+    # Those get the separating axes of the box and the segment, the box faces and the box edges crossed with the
+    # segment, with the overlaps grown by the radius
+    rows = np.flatnonzero(cutting)
+    halves = local_halves[rows]
+    axes = np.concatenate((np.broadcast_to(np.identity(3), (len(rows), 3, 3)),
+                           np.cross(np.identity(3), halves[:, np.newaxis, :])), axis=1)
+    lengths = np.linalg.norm(axes, axis=2)
+    valid = lengths > 1e-6
+    axes = axes / np.where(valid, lengths, 1.0)[..., np.newaxis]
+
+    separations = -(axes @ local_centers[rows, :, np.newaxis])[:, :, 0]
+    overlaps = (np.abs(axes) @ half_extents[rows, :, np.newaxis])[..., 0] + \
+        np.abs(axes @ halves[:, :, np.newaxis])[:, :, 0] + radii[rows, np.newaxis] - np.abs(separations)
+    overlaps = np.where(valid, overlaps, np.inf)
+
+    pick = np.arange(len(rows))
+    best = np.argmin(overlaps, axis=1)
+    local_normals = axes[pick, best] * np.where(separations[pick, best] < 0, -1.0, 1.0)[:, np.newaxis]
+    normals[rows] = _rotate(box_rotations[rows], local_normals)
+    depths[rows] = overlaps[pick, best]
+    return normals, depths
+
+
+def shape_contacts(table, matrices: np.ndarray, first: np.ndarray, second: np.ndarray):
+    # Contacts of the body pairs with shapes from a collision_shapes.ShapeTable placed by the body world matrices
+    centers, rotations, half_extents, half_segments = table.world(matrices)
+    radii = table.radii
+    kinds = table.kinds
+
+    # Pairs are tested with the lower kind first, normals of the swapped ones are turned around at the end
+    swap = kinds[first] > kinds[second]
+    a = np.where(swap, second, first)
+    b = np.where(swap, first, second)
+    kind_a, kind_b = kinds[a], kinds[b]
+    box_a = (kind_a == _AABB) | (kind_a == _OBB)
+    box_b = (kind_b == _AABB) | (kind_b == _OBB)
+    both_aabb = (kind_a == _AABB) & (kind_b == _AABB)
+
+    def sphere_capsule(i, j):
+        points = closest_points_on_segments(centers[i], centers[j], half_segments[j])
+        return sphere_sphere_contacts(centers[i], radii[i], points, radii[j])
+
+    def box_capsule(i, j):
+        normals, depths = capsule_box_contacts(centers[j], half_segments[j], radii[j], centers[i], rotations[i],
+                                               half_extents[i])
+        return -normals, depths
+
+    def capsule_capsule(i, j):
+        points_1, points_2 = closest_points_between_segments(centers[i], half_segments[i], centers[j],
+                                                             half_segments[j])
+        return sphere_sphere_contacts(points_1, radii[i], points_2, radii[j])
+
+    cases = (
+        ((kind_a == _SPHERE) & (kind_b == _SPHERE),
+         lambda i, j: sphere_sphere_contacts(centers[i], radii[i], centers[j], radii[j])),
+        ((kind_a == _SPHERE) & box_b,
+         lambda i, j: sphere_box_contacts(centers[i], radii[i], centers[j], rotations[j], half_extents[j])),
+        ((kind_a == _SPHERE) & (kind_b == _CAPSULE), sphere_capsule),
+        (both_aabb, lambda i, j: aabb_contacts(centers[i], half_extents[i], centers[j], half_extents[j])),
+        (box_a & box_b & ~both_aabb,
+         lambda i, j: box_box_contacts(centers[i], rotations[i], half_extents[i], centers[j], rotations[j],
+                                       half_extents[j])),
+        (box_a & (kind_b == _CAPSULE), box_capsule),
+        ((kind_a == _CAPSULE) & (kind_b == _CAPSULE), capsule_capsule),
+    )
+
+    normals = np.empty((len(a), 3))
+    depths = np.empty(len(a))
+    for mask, test in cases:
+        rows = np.flatnonzero(mask)
+        if len(rows):
+            normals[rows], depths[rows] = test(a[rows], b[rows])
+    normals[swap] *= -1
+    return normals, depths
+
+
+def _angular_response(world, bodies: np.ndarray, arms: np.ndarray, impulses: np.ndarray) -> np.ndarray:
+    torque = np.cross(arms, impulses)
+    # Body space inverse inertia turned into world space
+    rotations = quaternion_matrices(world.orientations[bodies])
+    inv_inertia = rotations @ world.inv_inertia_tensors[bodies] @ rotations.transpose(0, 2, 1)
+    return np.einsum("nij,nj->ni", inv_inertia, torque)
+
+
+def contact_points(table, matrices: np.ndarray, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    # Where the impulses of the pairs act: the point of the larger shape closest to the center of the smaller one.
+    # A body resting anywhere on a floor or on a body under it gets pushed right below its center
+    centers, rotations, half_extents, half_segments = table.world(matrices)
+    sizes = np.linalg.norm(half_extents, axis=1) + np.linalg.norm(half_segments, axis=1) + table.radii
+    swap = sizes[first] > sizes[second]
+    large = np.where(swap, first, second)
+    points = centers[np.where(swap, second, first)]
+
+    box = (table.kinds[large] == _AABB) | (table.kinds[large] == _OBB)
+    rows = np.flatnonzero(box)
+    if len(rows):
+        i = large[rows]
+        local = np.clip(_unrotate(rotations[i], points[rows] - centers[i]), -half_extents[i], half_extents[i])
+        points[rows] = centers[i] + _rotate(rotations[i], local)
+    rows = np.flatnonzero(~box)
+    if len(rows):
+        i = large[rows]
+        cores = closest_points_on_segments(points[rows], centers[i], half_segments[i])
+        units, lengths = _unit_rows(points[rows] - cores)
+        points[rows] = cores + units * np.minimum(lengths, table.radii[i])[:, np.newaxis]
+    return points
+
+
+def contact_rounds(first: np.ndarray, second: np.ndarray, dynamic: np.ndarray):
+    # Splits pairs into rounds where no dynamic body is in two pairs, every pair comes after the earlier pairs of
+    # its bodies. Resolving the rounds in order gives the same results as resolving the pairs one by one
+    remaining = np.arange(len(first))
+    while len(remaining):
+        bodies_1, bodies_2 = first[remaining], second[remaining]
+        dynamic_1, dynamic_2 = dynamic[bodies_1], dynamic[bodies_2]
+        earliest = np.full(len(dynamic), len(first))
+        np.minimum.at(earliest, bodies_1[dynamic_1], remaining[dynamic_1])
+        np.minimum.at(earliest, bodies_2[dynamic_2], remaining[dynamic_2])
+        ready = (~dynamic_1 | (earliest[bodies_1] == remaining)) & (~dynamic_2 | (earliest[bodies_2] == remaining))
+        yield remaining[ready]
+        remaining = remaining[~ready]
+
+
+def resolve_collisions(world, first: np.ndarray, second: np.ndarray, normals: np.ndarray, depths: np.ndarray,
+                       points: np.ndarray):
+    # Batched PhysicsEngine.resolve_collision of touching pairs, their shape_contacts and contact_points, in the
+    # same order
+    for rows in contact_rounds(first, second, world.physic):
+        _resolve_round(world, first[rows], second[rows], normals[rows], depths[rows], points[rows])
+
+
+def _resolve_round(world, first: np.ndarray, second: np.ndarray, normals: np.ndarray, depths: np.ndarray,
+                   points: np.ndarray):
+    # Pairs without a shared dynamic body, static ones only pass their state so several pairs may read it
+    physic_1 = world.physic[first]
+    physic_2 = world.physic[second]
+    inv_mass_1 = world.inv_masses[first]
+    inv_mass_2 = world.inv_masses[second]
+    inv_mass_sum = inv_mass_1 + inv_mass_2
+
+    position_1 = world.positions[first]
+    position_2 = world.positions[second]
+
+    active = (physic_1 | physic_2) & (inv_mass_sum != 0)
+    collision_normal = normals
+    collision_point = points
+
+    rel_velocity = world.velocities[second] - world.velocities[first]
+    both_physic = (physic_1 & physic_2)[:, np.newaxis]
+    angular_term = (np.cross(world.angular_velocities[second], collision_point - position_2) -
+                    np.cross(world.angular_velocities[first], collision_point - position_1))
+    rel_velocity = rel_velocity + np.where(both_physic, angular_term, 0.0)
+
+    rel_normal_velocity = _rows_dot(rel_velocity, collision_normal)
+    active &= rel_normal_velocity <= 0
+
+    first, second = first[active], second[active]
+    physic_1, physic_2 = physic_1[active], physic_2[active]
+    inv_mass_1, inv_mass_2, inv_mass_sum = inv_mass_1[active], inv_mass_2[active], inv_mass_sum[active]
+    position_1, position_2 = position_1[active], position_2[active]
+    collision_normal, collision_point = collision_normal[active], collision_point[active]
+    penetration_depth = depths[active]
+    rel_velocity, rel_normal_velocity = rel_velocity[active], rel_normal_velocity[active]
+
+    e = np.minimum(world.restitutions[first], world.restitutions[second])
+    j = -(1 + e) * rel_normal_velocity / inv_mass_sum
+    impulse = collision_normal * j[:, np.newaxis]
+
+    tangent = rel_velocity - rel_normal_velocity[:, np.newaxis] * collision_normal
+    tangent_length = np.linalg.norm(tangent, axis=1)
+    has_tangent = tangent_length > 0
+    tangent = tangent / np.where(has_tangent, tangent_length, 1.0)[:, np.newaxis]
+    friction = np.minimum(world.frictions[first], world.frictions[second])
+    friction_impulse = -tangent * (j * friction * has_tangent)[:, np.newaxis]
+
+    # Both impulses are applied at the same point, so they can be summed
+    impulse_2 = impulse + friction_impulse
+    impulse_1 = -impulse_2
+
+    arm_1 = collision_point - position_1
+    arm_2 = collision_point - position_2
+
+    delta_velocity_1 = impulse_1 * inv_mass_1[:, np.newaxis]
+    delta_velocity_2 = impulse_2 * inv_mass_2[:, np.newaxis]
+    delta_angular_1 = _angular_response(world, first, arm_1, impulse_1)
+    delta_angular_2 = _angular_response(world, second, arm_2, impulse_2)
+
+    percent = 0.8
+    slop = 0.01
+    correction = (np.maximum(penetration_depth - slop, 0) / inv_mass_sum * percent)[:, np.newaxis] * collision_normal
+
+    mask_1 = physic_1[:, np.newaxis]
+    mask_2 = physic_2[:, np.newaxis]
+    np.add.at(world.velocities, first, np.where(mask_1, delta_velocity_1, 0.0))
+    np.add.at(world.velocities, second, np.where(mask_2, delta_velocity_2, 0.0))
+    np.add.at(world.angular_velocities, first, np.where(mask_1, delta_angular_1, 0.0))
+    np.add.at(world.angular_velocities, second, np.where(mask_2, delta_angular_2, 0.0))
+    np.add.at(world.positions, first, np.where(mask_1, -correction * inv_mass_1[:, np.newaxis], 0.0))
+    np.add.at(world.positions, second, np.where(mask_2, correction * inv_mass_2[:, np.newaxis], 0.0))
+    world.transform_versions[np.concatenate((first[physic_1], second[physic_2]))] += 1
@@ -0,0 +1,482 @@
+import numpy as np
+
+from pygame.math import Vector3
+
+from .actor import Actor
+from .broadphase import BroadPhase, SweepAndPrune
+from .collision_shapes import ShapeTable
+from .narrowphase import contact_points, shape_contacts, resolve_collisions
+from .transforms import integrate_orientations, model_matrices
+
+
+def contact_islands(count: int, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    # Connected components of the contact graph, every body is labeled with the lowest index of its island
+    labels = np.arange(count)
+    if len(first) == 0:
+        return labels
+
+    while True:
+        previous = labels.copy()
+        lowest = np.minimum(labels[first], labels[second])
+        np.minimum.at(labels, first, lowest)
+        np.minimum.at(labels, second, lowest)
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+class PhysicsEngine:
+    def __init__(self, basic_gravity: Vector3 = Vector3(0, 0, 0),  # Vector3(0, -9.8, 0) - earth gravity
+                 broad_phase: BroadPhase = None):
+        self.basic_gravity = basic_gravity
+        self.objects = []
+        self.broad_phase = broad_phase if broad_phase is not None else SweepAndPrune()
+
+        self.sleep_enabled = True
+        self.sleep_linear_threshold = 0.05
+        self.sleep_angular_threshold = 0.05
+        self.sleep_steps = 60
+
+        self.simulated_bodies = 0
+        self.sleeping_bodies = 0
+        self.contacts = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+        self._next_island_id = 0
+
+        # A transforms.SceneGraph holding every body gives the broad phase rotated world space bounds
+        self.scene_graph = None
+        self._graph_rows = None
+        self._graph_revision = None
+        self._shape_table = None
+        self._shape_version = None
+
+    def add_object(self, obj: Actor):
+        self.objects.append(obj)
+        self.broad_phase.add(obj)
+        self._graph_rows = None
+        self._shape_table = None
+
+    def add_objects(self, objects: list):
+        self.objects.extend(objects)
+        self.broad_phase.add_many(objects)
+        self._graph_rows = None
+        self._shape_table = None
+
+    def remove_object(self, obj: Actor):
+        self.objects.remove(obj)
+        self.broad_phase.remove(obj)
+        self._graph_rows = None
+        self._shape_table = None
+
+    def set_broad_phase(self, broad_phase: BroadPhase):
+        broad_phase.add_many(self.objects)
+        self.broad_phase = broad_phase
+
+    def update(self, dt: float):
+        self.wake_bodies()
+        start_positions = self._body_positions()
+
+        forced = np.zeros(len(self.objects), dtype=bool)
+        simulated = 0
+        for index, obj in enumerate(self.objects):
+            if obj.sleeping:
+                continue
+
+            forced[index] = bool(obj.applied_force)
+            if obj.physic:
+                # Gravity is added directly, apply_force would count it as an external push and keep the body awake
+                obj.applied_force += self.basic_gravity * obj.mass
+            elif not (forced[index] or obj.velocity or obj.angular_velocity):
+                # Static bodies never fall asleep, the ones at rest are simply not integrated
+                continue
+            obj.update(dt=float(dt))
+            simulated += 1
+
+        self.simulated_bodies = simulated
+        self.handle_collisions()
+        self.update_sleep_states(forced, start_positions, float(dt))
+
+    def _body_positions(self) -> np.ndarray:
+        count = len(self.objects)
+        flat = np.fromiter((c for obj in self.objects for c in obj.position), dtype=np.float64, count=count * 3)
+        return flat.reshape(count, 3)
+
+    @staticmethod
+    def moved_speeds_sq(start_positions: np.ndarray, positions: np.ndarray, dt: float) -> np.ndarray:
+        # How fast the bodies actually moved over the step. A body resting on a contact picks up the velocity of
+        # one step of gravity that the contact only takes out again next step, while its position stays put
+        moved = (positions - start_positions) / dt if dt > 0 else np.zeros_like(positions)
+        return np.einsum("ij,ij->i", moved, moved)
+
+    def update_broad_phase(self, matrices: np.ndarray = None):
+        awake = np.fromiter((not obj.sleeping for obj in self.objects), dtype=bool, count=len(self.objects))
+        self.broad_phase.update(awake=awake, matrices=matrices if matrices is not None else self.world_matrices())
+
+    def world_matrices(self):
+        # Cached world matrices of the bodies, the graph only recomputes the ones that moved. None without a graph
+        # or while a body is not part of it yet
+        graph = self.scene_graph
+        if graph is None:
+            return None
+
+        graph.update()
+        if self._graph_rows is None or self._graph_revision != graph.revision:
+            self._graph_rows = graph.rows(self.objects)
+            self._graph_revision = graph.revision
+        if len(self._graph_rows) and self._graph_rows.min() < 0:
+            return None
+        return graph.world_matrices[self._graph_rows]
+
+    def body_poses(self):
+        count = len(self.objects)
+        positions = np.fromiter((c for obj in self.objects for c in obj.position), np.float64, count * 3)
+        orientations = np.fromiter((c for obj in self.objects for c in obj.orientation), np.float64, count * 4)
+        return positions.reshape(count, 3), orientations.reshape(count, 4)
+
+    def body_matrices(self) -> np.ndarray:
+        # World matrices of the bodies, built from their poses without a scene graph
+        matrices = self.world_matrices()
+        if matrices is None:
+            matrices = model_matrices(*self.body_poses())
+        return matrices
+
+    def shape_table(self) -> ShapeTable:
+        if self._shape_table is None or self._shape_version != Actor.shape_version:
+            self._shape_table = ShapeTable([obj.collision_shape for obj in self.objects])
+            self._shape_version = Actor.shape_version
+            self.broad_phase.invalidate_bounds()
+        return self._shape_table
+
+    @staticmethod
+    def narrow_phase(table: ShapeTable, matrices: np.ndarray, first: np.ndarray, second: np.ndarray):
+        # Collision shape tests of the broad phase pairs, (first, second, normals, depths) of the touching ones
+        normals, depths = shape_contacts(table, matrices, first, second)
+        touching = depths >= 0
+        return first[touching], second[touching], normals[touching], depths[touching]
+
+    def handle_collisions(self):
+        objects = self.objects
+        table = self.shape_table()
+        matrices = self.body_matrices()
+        self.update_broad_phase(matrices)
+
+        # All pairs are tested at once from the poses at the start of the step, only touching ones are resolved
+        first, second, normals, depths = self.narrow_phase(table, matrices, *self.broad_phase.find_pairs())
+        points = contact_points(table, matrices, first, second)
+        contacts = []
+        woken = False
+        for i, j, normal, depth, point in zip(first.tolist(), second.tolist(), normals.tolist(), depths.tolist(),
+                                              points.tolist()):
+            obj1, obj2 = objects[i], objects[j]
+            if obj1.sleeping or obj2.sleeping:
+                obj1.wake()
+                obj2.wake()
+                woken = True
+            self.resolve_collision(obj1, obj2, Vector3(normal), depth, Vector3(point))
+            if obj1.physic and obj2.physic:
+                contacts.append((i, j))
+
+        if woken:
+            self.wake_bodies()
+        contact_array = np.array(contacts, dtype=np.intp).reshape(-1, 2)
+        self.contacts = (contact_array[:, 0], contact_array[:, 1])
+
+    def wake_bodies(self):
+        for obj in self.objects:
+            if obj.sleeping and (obj.position != obj.rest_position or obj.velocity or obj.angular_velocity):
+                obj.wake()
+
+        woken_islands = {obj.island_id for obj in self.objects if not obj.sleeping and obj.island_id >= 0}
+        for obj in self.objects:
+            if obj.island_id in woken_islands:
+                obj.wake()
+            if not obj.sleeping:
+                obj.island_id = -1
+
+        self.sleeping_bodies = sum(1 for obj in self.objects if obj.sleeping)
+
+    def update_sleep_states(self, forced: np.ndarray, start_positions: np.ndarray, dt: float):
+        if not self.sleep_enabled:
+            return
+
+        objects = self.objects
+        count = len(objects)
+        sleeping = np.fromiter((obj.sleeping for obj in objects), dtype=bool, count=count)
+        dynamic = np.fromiter((obj.physic for obj in objects), dtype=bool, count=count)
+        counters = np.fromiter((obj.sleep_counter for obj in objects), dtype=np.int64, count=count)
+        linear = self.moved_speeds_sq(start_positions, self._body_positions(), dt)
+        angular = np.fromiter((obj.angular_velocity.length_squared() for obj in objects), dtype=np.float64, count=count)
+
+        falling_asleep, island_ids = self.find_sleeping_islands(sleeping, dynamic, counters, linear, angular, forced)
+
+        for index, obj in enumerate(objects):
+            if falling_asleep[index]:
+                obj.sleep(island_id=int(island_ids[index]))
+            elif not sleeping[index]:
+                obj.sleep_counter = int(counters[index])
+        self.sleeping_bodies = int(np.count_nonzero(sleeping | falling_asleep))
+
+    def find_sleeping_islands(self, sleeping: np.ndarray, dynamic: np.ndarray, counters: np.ndarray,
+                              linear_speed_sq: np.ndarray, angular_speed_sq: np.ndarray, forced: np.ndarray):
+        # Static bodies never sleep, they do not move and only dynamic ones wake or put others to sleep
+        count = len(sleeping)
+        awake = ~sleeping
+        moving = ((linear_speed_sq > self.sleep_linear_threshold ** 2) |
+                  (angular_speed_sq > self.sleep_angular_threshold ** 2) | forced)
+        counters[awake] = np.where(moving[awake], 0, counters[awake] + 1)
+
+        # An island only falls asleep when every body in it has been resting long enough
+        labels = contact_islands(count, *self.contacts)
+        ready = np.where(awake, counters >= self.sleep_steps, True)
+        island_ready = np.ones(count, dtype=bool)
+        np.logical_and.at(island_ready, labels, ready)
+        falling_asleep = awake & dynamic & island_ready[labels]
+
+        island_sizes = np.bincount(labels, minlength=count)
+        island_ids = np.where(island_sizes[labels] > 1, labels + self._next_island_id, -1)
+        self._next_island_id += count
+        return falling_asleep, island_ids
+
+    def resolve_collision(self, obj1, obj2, collision_normal: Vector3 = None, penetration_depth: float = None,
+                          collision_point: Vector3 = None):
+        # Normal, depth and point of the contact, found from the collision shapes when not passed
+        if not (obj1.physic or obj2.physic):
+            return
+
+        if collision_normal is None or penetration_depth is None:
+            collision_normal, penetration_depth = self.find_contact(obj1, obj2)
+        if collision_point is None:
+            collision_point = self.find_collision_point(obj1, obj2)
+
+        rel_velocity = obj2.velocity - obj1.velocity
+        if obj1.physic and obj2.physic:
+            rel_velocity += Vector3.cross(obj2.angular_velocity, collision_point - obj2.position)
+            rel_velocity -= Vector3.cross(obj1.angular_velocity, collision_point - obj1.position)
+
+        rel_normal_velocity = rel_velocity.dot(collision_normal)
+        if rel_normal_velocity > 0:
+            return
+
+        e = min(obj1.restitution, obj2.restitution)
+        j = -(1 + e) * rel_normal_velocity
+        j /= obj1.inv_mass + obj2.inv_mass
+
+        impulse = collision_normal * j
+
+        if obj1.physic:
+            obj1.apply_impulse(-impulse, collision_point)
+        if obj2.physic:
+            obj2.apply_impulse(impulse, collision_point)
+
+        tangent = rel_velocity - (rel_velocity.dot(collision_normal) * collision_normal)
+        if tangent.magnitude() > 0:
+            tangent = tangent.normalize()
+            friction_impulse = -tangent * j * min(obj1.friction, obj2.friction)
+
+            if obj1.physic:
+                obj1.apply_impulse(-friction_impulse, collision_point)
+            if obj2.physic:
+                obj2.apply_impulse(friction_impulse, collision_point)
+
+        percent = 0.8
+        slop = 0.01
+        correction = max(penetration_depth - slop, 0) / (obj1.inv_mass + obj2.inv_mass) * percent * collision_normal
+
+        if obj1.physic:
+            obj1.position -= correction * obj1.inv_mass
+        if obj2.physic:
+            obj2.position += correction * obj2.inv_mass
+
+    @staticmethod
+    def find_collision_point(obj1, obj2):
+        # Point of the larger collision shape closest to the center of the smaller one (contact_points)
+        table = ShapeTable([obj1.collision_shape, obj2.collision_shape])
+        matrices = np.stack((obj1.world_matrix(), obj2.world_matrix()))
+        return Vector3(*contact_points(table, matrices, np.array([0]), np.array([1]))[0])
+
+    @staticmethod
+    def find_contact(obj1, obj2):
+        # (normal from obj1 to obj2, penetration depth) of the collision shapes, a negative depth - apart
+        table = ShapeTable([obj1.collision_shape, obj2.collision_shape])
+        matrices = np.stack((obj1.world_matrix(), obj2.world_matrix()))
+        normals, depths = shape_contacts(table, matrices, np.array([0]), np.array([1]))
+        return Vector3(*normals[0]), float(depths[0])
+
+    @staticmethod
+    def check_collision(obj1, obj2):
+        return PhysicsEngine.find_contact(obj1, obj2)[1] >= 0
+
+    @staticmethod
+    def calculate_penetration_depth(obj1, obj2):
+        return PhysicsEngine.find_contact(obj1, obj2)[1]
+
+
+class PhysicsWorld(PhysicsEngine):
+    body_arrays = {
+        "positions": ((3,), np.float64),
+        "velocities": ((3,), np.float64),
+        "angular_velocities": ((3,), np.float64),
+        "forces": ((3,), np.float64),
+        "masses": ((), np.float64),
+        "inv_masses": ((), np.float64),
+        "restitutions": ((), np.float64),
+        "frictions": ((), np.float64),
+        "inv_inertia_tensors": ((3, 3), np.float64),
+        "physic": ((), bool),
+        "collision": ((), bool),
+        "sleeping": ((), bool),
+        "sleep_counters": ((), np.int64),
+        "island_ids": ((), np.int64),
+        "rest_positions": ((3,), np.float64),
+        "orientations": ((4,), np.float64),
+        "transform_versions": ((), np.int64),
+    }
+
+    def __init__(self, basic_gravity: Vector3 = Vector3(0, 0, 0), broad_phase: BroadPhase = None,
+                 capacity: int = 64, batched_narrow_phase: bool = True):
+        super().__init__(basic_gravity=basic_gravity, broad_phase=broad_phase)
+        self.batched_narrow_phase = batched_narrow_phase
+        self.count = 0
+
+        for name, (shape, dtype) in self.body_arrays.items():
+            setattr(self, name, np.zeros((capacity, *shape), dtype=dtype))
+
+    def add_object(self, obj: Actor):
+        self._reserve(self.count + 1)
+        obj._attach(self, self.count)
+        self.count += 1
+        super().add_object(obj)
+
+    def add_objects(self, objects: list):
+        self._reserve(self.count + len(objects))
+        for obj in objects:
+            obj._attach(self, self.count)
+            self.count += 1
+        super().add_objects(objects)
+
+    def remove_object(self, obj: Actor):
+        index = obj._index
+        obj._detach()
+        super().remove_object(obj)
+
+        # Rows stay in the same order as self.objects, so the broad phase can index them directly
+        for name in self.body_arrays:
+            array = getattr(self, name)
+            array[index:self.count - 1] = array[index + 1:self.count]
+        self.count -= 1
+        for moved in self.objects[index:]:
+            moved._index -= 1
+
+    def update(self, dt: float):
+        dt = float(dt)
+        self.wake_bodies()
+
+        count = self.count
+        awake = ~self.sleeping[:count]
+        positions = self.positions[:count]
+        start_positions = positions.copy()
+        velocities = self.velocities[:count]
+        forces = self.forces[:count]
+        forced = np.any(forces != 0, axis=1)
+        physic = self.physic[:count]
+        pulled = physic & awake
+
+        forces += np.asarray(self.basic_gravity) * (self.masses[:count] * pulled)[:, np.newaxis]
+
+        # Scaled by the awake mask instead of indexed with it, masked copies of every body array cost more than the
+        # math. Sleeping bodies are left at rest
+        velocities += forces * (self.inv_masses[:count] * (dt * awake))[:, np.newaxis]
+        positions += velocities * (dt * awake)[:, np.newaxis]
+        forces[:] = 0
+
+        angular_velocities = self.angular_velocities[:count]
+        turning = np.any(angular_velocities != 0, axis=1)
+        moving = np.any(velocities != 0, axis=1)
+        spinning = awake & turning
+        orientations = self.orientations[:count]
+        orientations[spinning] = integrate_orientations(orientations[spinning], angular_velocities[spinning], dt)
+        self.transform_versions[:count][spinning | (awake & moving)] += 1
+
+        # Static bodies never fall asleep, the ones at rest are not counted as simulated
+        self.simulated_bodies = int(np.count_nonzero(awake & (physic | forced | moving | turning)))
+        self.handle_collisions()
+        self.update_sleep_states(forced, start_positions, dt)
+
+    def update_broad_phase(self, matrices: np.ndarray = None):
+        count = self.count
+        self.broad_phase.update(
+            positions=self.positions[:count], collidable=self.collision[:count], dynamic=self.physic[:count],
+            awake=~self.sleeping[:count], matrices=matrices if matrices is not None else self.world_matrices()
+        )
+
+    def body_poses(self):
+        return self.positions[:self.count], self.orientations[:self.count]
+
+    def handle_collisions(self):
+        if not self.batched_narrow_phase:
+            super().handle_collisions()
+            return
+
+        table = self.shape_table()
+        matrices = self.body_matrices()
+        self.update_broad_phase(matrices)
+        first, second, normals, depths = self.narrow_phase(table, matrices, *self.broad_phase.find_pairs())
+
+        touched = np.concatenate((first, second))
+        woken = touched[self.sleeping[touched]]
+        if len(woken):
+            self.sleeping[woken] = False
+            self.sleep_counters[woken] = 0
+            self.wake_bodies()
+
+        resolve_collisions(self, first, second, normals, depths, contact_points(table, matrices, first, second))
+
+        both_physic = self.physic[first] & self.physic[second]
+        self.contacts = (first[both_physic], second[both_physic])
+
+    def wake_bodies(self):
+        count = self.count
+        sleeping = self.sleeping[:count]
+        island_ids = self.island_ids[:count]
+
+        disturbed = sleeping & (np.any(self.positions[:count] != self.rest_positions[:count], axis=1) |
+                                np.any(self.velocities[:count] != 0, axis=1) |
+                                np.any(self.angular_velocities[:count] != 0, axis=1))
+        woken_islands = island_ids[(~sleeping | disturbed) & (island_ids >= 0)]
+        disturbed |= sleeping & np.isin(island_ids, woken_islands)
+
+        sleeping[disturbed] = False
+        self.sleep_counters[:count][disturbed] = 0
+        island_ids[~sleeping] = -1
+        self.sleeping_bodies = int(np.count_nonzero(sleeping))
+
+    def update_sleep_states(self, forced: np.ndarray, start_positions: np.ndarray, dt: float):
+        if not self.sleep_enabled:
+            return
+
+        count = self.count
+        sleeping = self.sleeping[:count]
+        linear = self.moved_speeds_sq(start_positions, self.positions[:count], dt)
+        angular = np.einsum("ij,ij->i", self.angular_velocities[:count], self.angular_velocities[:count])
+
+        falling_asleep, island_ids = self.find_sleeping_islands(
+            sleeping, self.physic[:count], self.sleep_counters[:count], linear, angular, forced
+        )
+
+        sleeping |= falling_asleep
+        self.island_ids[:count][falling_asleep] = island_ids[falling_asleep]
+        self.velocities[:count][falling_asleep] = 0
+        self.angular_velocities[:count][falling_asleep] = 0
+        self.rest_positions[:count][falling_asleep] = self.positions[:count][falling_asleep]
+        self.sleeping_bodies = int(np.count_nonzero(sleeping))
+
+    def _reserve(self, capacity: int):
+        current = len(self.positions)
+        if capacity <= current:
+            return
+
+        capacity = max(capacity, current * 2)
+        for name in self.body_arrays:
+            array = getattr(self, name)
+            grown = np.zeros((capacity, *array.shape[1:]), dtype=array.dtype)
+            grown[:current] = array
+            setattr(self, name, grown)
@@ -0,0 +1,287 @@
+from OpenGL.GL import *
+
+from .materials import DEFAULT_MATERIAL
+
+# Cached state that matches nothing, None is a valid material (DEFAULT_MATERIAL)
+UNKNOWN = object()
+
+
+class GLBackend:
+    # Every GL call the render queue makes goes through here, so it can run against RecordingBackend instead
+    def begin_pass(self, packets: list):
+        pass
+
+    def end_pass(self):
+        pass
+
+    def set_object_lights(self, lights):
+        # Fixed-function lighting uses every enabled GL_LIGHTi, only the shader path picks lights per object
+        pass
+
+    def bind_texture(self, texture: int):
+        glBindTexture(GL_TEXTURE_2D, texture)
+
+    def enable(self, capability: int):
+        glEnable(capability)
+
+    def disable(self, capability: int):
+        glDisable(capability)
+
+    def depth_mask(self, enabled: bool):
+        glDepthMask(GL_TRUE if enabled else GL_FALSE)
+
+    def blend_func(self, source: int, destination: int):
+        glBlendFunc(source, destination)
+
+    def apply_material(self, material):
+        (material if material is not None else DEFAULT_MATERIAL).apply()
+
+    def bind_mesh(self, resource):
+        resource.bind()
+
+    def unbind_mesh(self, resource):
+        resource.unbind()
+
+    def push_transform(self, matrix):
+        glPushMatrix()
+        # GL reads matrices column by column
+        glMultMatrixd(matrix.T)
+
+    def pop_transform(self):
+        glPopMatrix()
+
+    def draw_elements(self, count: int, index_type: int):
+        glDrawElements(GL_TRIANGLES, count, index_type, None)
+
+
+class RecordingBackend(GLBackend):
+    # Records (call, arguments) instead of calling GL, meshes are recorded by their cache key
+    def __init__(self):
+        self.calls = []
+
+    def begin_pass(self, packets: list):
+        self.calls.append(("begin_pass", len(packets)))
+
+    def end_pass(self):
+        self.calls.append(("end_pass",))
+
+    def set_object_lights(self, lights):
+        self.calls.append(("set_object_lights", lights))
+
+    def bind_texture(self, texture: int):
+        self.calls.append(("bind_texture", texture))
+
+    def enable(self, capability: int):
+        self.calls.append(("enable", capability))
+
+    def disable(self, capability: int):
+        self.calls.append(("disable", capability))
+
+    def depth_mask(self, enabled: bool):
+        self.calls.append(("depth_mask", enabled))
+
+    def blend_func(self, source: int, destination: int):
+        self.calls.append(("blend_func", source, destination))
+
+    def apply_material(self, material):
+        self.calls.append(("apply_material", material))
+
+    def bind_mesh(self, resource):
+        self.calls.append(("bind_mesh", resource.key))
+
+    def unbind_mesh(self, resource):
+        self.calls.append(("unbind_mesh", resource.key))
+
+    def push_transform(self, matrix):
+        self.calls.append(("push_transform", tuple(matrix.ravel())))
+
+    def pop_transform(self):
+        self.calls.append(("pop_transform",))
+
+    def draw_elements(self, count: int, index_type: int):
+        self.calls.append(("draw_elements", count, index_type))
+
+    def count(self, name: str) -> int:
+        return sum(1 for call in self.calls if call[0] == name)
+
+
+class GLStateCache:
+    # Last state set through the cache. Code outside the queue (imgui, the instanced renderer) changes GL state
+    # too, so the cache is invalidated at the start and end of every flush
+    def __init__(self, backend: GLBackend):
+        self.backend = backend
+        self.state_changes = 0
+        self.redundant_changes = 0
+        self.texture_binds = 0
+        self.invalidate()
+
+    def invalidate(self):
+        self.texture = None
+        self.mesh = None
+        self.material = UNKNOWN
+        self.capabilities = {}
+        self.depth_write = None
+        self.blending = None
+
+    def reset_counters(self):
+        self.state_changes = 0
+        self.redundant_changes = 0
+        self.texture_binds = 0
+
+    def _changed(self, changed: bool) -> bool:
+        if changed:
+            self.state_changes += 1
+        else:
+            self.redundant_changes += 1
+        return changed
+
+    def bind_texture(self, texture: int):
+        if self._changed(texture != self.texture):
+            self.backend.bind_texture(texture)
+            self.texture = texture
+            self.texture_binds += 1
+
+    def set_capability(self, capability: int, enabled: bool):
+        if self._changed(self.capabilities.get(capability) != enabled):
+            if enabled:
+                self.backend.enable(capability)
+            else:
+                self.backend.disable(capability)
+            self.capabilities[capability] = enabled
+
+    def set_depth_write(self, enabled: bool):
+        if self._changed(enabled != self.depth_write):
+            self.backend.depth_mask(enabled)
+            self.depth_write = enabled
+
+    def set_blending(self, enabled: bool):
+        if self._changed(enabled != self.blending):
+            if enabled:
+                self.backend.enable(GL_BLEND)
+                self.backend.blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+            else:
+                self.backend.disable(GL_BLEND)
+            self.blending = enabled
+
+    def use_material(self, material):
+        if self._changed(material is not self.material):
+            self.backend.apply_material(material)
+            self.material = material
+
+    def bind_mesh(self, resource):
+        if self._changed(resource is not self.mesh):
+            if self.mesh is not None:
+                self.backend.unbind_mesh(self.mesh)
+            self.backend.bind_mesh(resource)
+            self.mesh = resource
+
+    def unbind_mesh(self):
+        if self.mesh is not None:
+            self.backend.unbind_mesh(self.mesh)
+            self.mesh = None
+
+
+class DrawPacket:
+    __slots__ = ("resource", "texture", "material", "position", "matrix", "transparent", "depth", "count",
+                 "index_type", "radius", "lights")
+
+    def __init__(self, resource, texture: int, material, position, matrix, transparent: bool, depth: float,
+                 count: int, index_type: int, radius: float = 0.0):
+        self.resource = resource
+        self.texture = texture
+        self.material = material
+        # World position and 4x4 model matrix
+        self.position = position
+        self.matrix = matrix
+        self.transparent = transparent
+        self.depth = depth
+        self.count = count
+        self.index_type = index_type
+        self.radius = radius
+        # Set by the backend in begin_pass when it assigns lights per object
+        self.lights = None
+
+    @classmethod
+    def from_actor(cls, actor, alpha: float, eye):
+        matrix = actor.world_matrix(alpha)
+        position = matrix[:3, 3]
+        depth = (position[0] - eye[0]) ** 2 + (position[1] - eye[1]) ** 2 + (position[2] - eye[2]) ** 2
+        return cls(actor.render_resource, actor.texture, getattr(actor, "material", None), position, matrix,
+                   actor.transparent, depth, actor.num_indices, actor.index_type, actor.bounding_radius)
+
+    def sort_key(self) -> tuple:
+        # Opaque packets first, grouped by material, texture and mesh and front to back inside a group (early
+        # depth rejection); transparent ones last and back to front so blending composes correctly
+        if self.transparent:
+            return 1, -self.depth, 0, 0, 0
+        return 0, id(self.material) if self.material is not None else 0, self.texture, id(self.resource), self.depth
+
+
+class RenderQueue:
+    def __init__(self, backend: GLBackend = None):
+        self.backend = backend if backend is not None else GLBackend()
+        self.state = GLStateCache(self.backend)
+        self.packets = []
+
+        self.draw_calls = 0
+        self.state_changes = 0
+        self.redundant_changes = 0
+        self.texture_binds = 0
+        self.triangles = 0
+
+    def __len__(self):
+        return len(self.packets)
+
+    def clear(self):
+        self.packets = []
+
+    def submit(self, packet: DrawPacket):
+        self.packets.append(packet)
+
+    def submit_actors(self, actors: list, alpha: float = 1.0, eye=(0.0, 0.0, 0.0)):
+        eye = tuple(eye)
+        self.packets.extend(DrawPacket.from_actor(actor, alpha, eye) for actor in actors)
+
+    def flush(self):
+        self.state.invalidate()
+        self.state.reset_counters()
+        self.draw_calls = 0
+        self.triangles = 0
+        if not self.packets:
+            self.state_changes = self.redundant_changes = self.texture_binds = 0
+            return
+
+        state = self.state
+        backend = self.backend
+        packets = sorted(self.packets, key=DrawPacket.sort_key)
+        backend.begin_pass(packets)
+        state.set_capability(GL_TEXTURE_2D, True)
+        for packet in packets:
+            state.set_blending(packet.transparent)
+            state.set_depth_write(not packet.transparent)
+            state.use_material(packet.material)
+            state.bind_texture(packet.texture)
+            state.bind_mesh(packet.resource)
+            if packet.lights is not None:
+                backend.set_object_lights(packet.lights)
+
+            backend.push_transform(packet.matrix)
+            backend.draw_elements(packet.count, packet.index_type)
+            backend.pop_transform()
+
+            self.draw_calls += 1
+            self.triangles += packet.count // 3
+
+        # Leave GL the way the rest of the frame expects it
+        state.unbind_mesh()
+        state.use_material(None)
+        state.set_blending(False)
+        state.set_depth_write(True)
+        state.set_capability(GL_TEXTURE_2D, False)
+        backend.end_pass()
+
+        self.state_changes = state.state_changes
+        self.redundant_changes = state.redundant_changes
+        self.texture_binds = state.texture_binds
+        state.invalidate()
+        self.clear()
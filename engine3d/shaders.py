@@ -0,0 +1,18 @@
+from OpenGL.GL import *
+from OpenGL.GL import shaders
+
+
+def gl_version() -> tuple:
+    version = glGetString(GL_VERSION)
+    if not version:
+        return 0, 0
+    major, minor = version.decode().split(" ")[0].split(".")[:2]
+    return int(major), int(minor)
+
+
+def compile_program(vertex_source: str, fragment_source: str):
+    return shaders.compileProgram(
+        shaders.compileShader(vertex_source, GL_VERTEX_SHADER),
+        shaders.compileShader(fragment_source, GL_FRAGMENT_SHADER),
+        validate=False
+    )
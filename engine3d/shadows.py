@@ -0,0 +1,214 @@
+import numpy as np
+
+from OpenGL.GL import *
+
+from .culling import Frustum, perspective_matrix, look_at_matrix
+from .lighting import influence_radii
+
+
+SHADOW_UNIT = 4  # texture unit of shadow map slot 0, after the surface texture and the light cluster buffers
+SHADOW_NEAR = 0.1
+
+# View direction and up vector of GL_TEXTURE_CUBE_MAP_POSITIVE_X + face
+CUBE_FACES = (((1, 0, 0), (0, -1, 0)), ((-1, 0, 0), (0, -1, 0)), ((0, 1, 0), (0, 0, 1)),
+              ((0, -1, 0), (0, 0, -1)), ((0, 0, 1), (0, -1, 0)), ((0, 0, -1), (0, -1, 0)))
+
+
+def cube_face_matrices(position, near: float, far: float) -> list:
+    # (projection, view) of the six 90 degree views making up a point light's shadow cube map
+    position = np.asarray(position, dtype=np.float64)
+    projection = perspective_matrix(90.0, 1.0, near, far)
+    return [(projection, look_at_matrix(position, position + direction, up)) for direction, up in CUBE_FACES]
+
+
+class ShadowMap:
+    def __init__(self, size: int):
+        self.size = size
+        self.slot = 0
+        self.near = SHADOW_NEAR
+        self.far = None
+        self.light_position = None
+        # (caster ids, caster transform versions) each face was last rendered with, None - render again
+        self.faces = [None] * 6
+
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_CUBE_MAP, self.texture)
+        for face in range(6):
+            glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X + face, 0, GL_DEPTH_COMPONENT24, size, size, 0,
+                         GL_DEPTH_COMPONENT, GL_FLOAT, None)
+        # Linear filtering with depth comparison gives 2x2 percentage closer filtering in hardware
+        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_WRAP_R, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_COMPARE_MODE, GL_COMPARE_REF_TO_TEXTURE)
+        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_COMPARE_FUNC, GL_LEQUAL)
+        glBindTexture(GL_TEXTURE_CUBE_MAP, 0)
+
+        self.framebuffer = glGenFramebuffers(1)
+
+    def invalidate(self):
+        self.faces = [None] * 6
+
+    def release_gpu(self):
+        glDeleteTextures(1, [self.texture])
+        glDeleteFramebuffers(1, [self.framebuffer])
+
+
+class ShadowRenderer:
+    # Depth cube maps for the first max_maps lights with cast_shadows. A face is only rendered again when the
+    # light moved or the casters inside it changed: another set of casters or a caster whose world matrix
+    # changed (Transform.world_version)
+    def __init__(self, resolution: int = 1024, max_maps: int = 4, far: float = 1000.0, bias: float = 0.01):
+        self.resolution = resolution
+        self.max_maps = min(max_maps, 4)
+        self.far = far
+        self.bias = bias
+        self.maps = {}
+
+        self.faces_rendered = 0
+        self.faces_cached = 0
+        self.casters_drawn = 0
+        self._saved_framebuffer = None
+
+    def invalidate(self):
+        for shadow_map in self.maps.values():
+            shadow_map.invalidate()
+
+    def update(self, lights: list, actors: list):
+        self.faces_rendered = 0
+        self.faces_cached = 0
+        self.casters_drawn = 0
+
+        shadowed = [light for light in lights if light.cast_shadows][:self.max_maps]
+        for light in list(self.maps):
+            if light not in shadowed:
+                self.maps.pop(light).release_gpu()
+                light.shadow_map = None
+
+        casters = [actor for actor in actors if actor.cast_shadows]
+        count = len(casters)
+        centers = np.fromiter((value for actor in casters for value in actor.world_position), np.float64, count * 3)
+        centers = centers.reshape(count, 3)
+        radii = np.fromiter((actor.bounding_radius for actor in casters), np.float64, count)
+        ids = np.fromiter((id(actor) for actor in casters), np.int64, count)
+        versions = np.fromiter((actor.world_version for actor in casters), np.int64, count)
+
+        for slot, light in enumerate(shadowed):
+            size = light.shadow_resolution or self.resolution
+            shadow_map = self.maps.get(light)
+            if shadow_map is None or shadow_map.size != size:
+                if shadow_map is not None:
+                    shadow_map.release_gpu()
+                shadow_map = self.maps[light] = ShadowMap(size)
+            shadow_map.slot = slot
+            light.shadow_map = shadow_map
+            self.update_map(shadow_map, light, casters, centers, radii, ids, versions)
+
+        if self._saved_framebuffer is not None:
+            self.end_pass()
+
+    def update_map(self, shadow_map: ShadowMap, light, casters: list, centers: np.ndarray, radii: np.ndarray,
+                   ids: np.ndarray, versions: np.ndarray):
+        position = tuple(light.position)
+        strength = max(light.color[:3]) * (light.ambient + light.diffuse + light.specular)
+        attenuation = (light.constant_attenuation, light.linear_attenuation, light.quadratic_attenuation)
+        far = float(min(influence_radii([strength], [attenuation])[0], self.far))
+        if position != shadow_map.light_position or far != shadow_map.far:
+            shadow_map.light_position = position
+            shadow_map.far = far
+            shadow_map.invalidate()
+
+        # Casters past the light's reach never shadow anything it lights
+        in_range = np.linalg.norm(centers - position, axis=1) - radii < far
+        for face, (projection, view) in enumerate(cube_face_matrices(position, shadow_map.near, far)):
+            inside = np.flatnonzero(in_range & Frustum.from_matrix(projection @ view).test_spheres(centers, radii))
+            signature = (ids[inside], versions[inside])
+            cached = shadow_map.faces[face]
+            if (cached is not None and np.array_equal(cached[0], signature[0])
+                    and np.array_equal(cached[1], signature[1])):
+                self.faces_cached += 1
+                continue
+
+            if self._saved_framebuffer is None:
+                self.begin_pass()
+            self.render_face(shadow_map, face, projection, view, [casters[index] for index in inside])
+            shadow_map.faces[face] = signature
+
+    def begin_pass(self):
+        self._saved_framebuffer = glGetIntegerv(GL_FRAMEBUFFER_BINDING)
+        glPushAttrib(GL_VIEWPORT_BIT | GL_ENABLE_BIT | GL_COLOR_BUFFER_BIT | GL_POLYGON_BIT | GL_DEPTH_BUFFER_BIT)
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+
+        glUseProgram(0)
+        glDisable(GL_LIGHTING)
+        glDisable(GL_TEXTURE_2D)
+        glDisable(GL_BLEND)
+        glEnable(GL_DEPTH_TEST)
+        glDepthMask(GL_TRUE)
+        glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+        # Slope scaled offset against shadow acne, together with the shadow_bias of the lighting shader
+        glEnable(GL_POLYGON_OFFSET_FILL)
+        glPolygonOffset(2.0, 4.0)
+
+    def end_pass(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self._saved_framebuffer)
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        glPopMatrix()
+        glPopAttrib()
+        self._saved_framebuffer = None
+
+    def render_face(self, shadow_map: ShadowMap, face: int, projection: np.ndarray, view: np.ndarray,
+                    casters: list):
+        glBindFramebuffer(GL_FRAMEBUFFER, shadow_map.framebuffer)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_TEXTURE_CUBE_MAP_POSITIVE_X + face,
+                               shadow_map.texture, 0)
+        glDrawBuffer(GL_NONE)
+        glReadBuffer(GL_NONE)
+        glViewport(0, 0, shadow_map.size, shadow_map.size)
+        glClear(GL_DEPTH_BUFFER_BIT)
+
+        glMatrixMode(GL_PROJECTION)
+        glLoadMatrixd(projection.T)
+        glMatrixMode(GL_MODELVIEW)
+        glLoadMatrixd(view.T)
+        for actor in casters:
+            glPushMatrix()
+            glMultMatrixd(actor.world_matrix().T)
+            actor.bind_buffers()
+            glDrawElements(GL_TRIANGLES, actor.num_indices, actor.index_type, None)
+            actor.unbind_buffers()
+            glPopMatrix()
+
+        self.faces_rendered += 1
+        self.casters_drawn += len(casters)
+
+    def bind(self, program, view_matrix: np.ndarray):
+        # Shadow uniforms of a lighting program, called by ShaderLighting.use
+        planes = np.zeros((self.max_maps, 2), dtype=np.float32)
+        for shadow_map in self.maps.values():
+            planes[shadow_map.slot] = shadow_map.near, shadow_map.far or 1.0
+            glActiveTexture(GL_TEXTURE0 + SHADOW_UNIT + shadow_map.slot)
+            glBindTexture(GL_TEXTURE_CUBE_MAP, shadow_map.texture)
+        glActiveTexture(GL_TEXTURE0)
+
+        # Every slot keeps a unit of its own even when unused, samplers of different types may not share one
+        glUniform1iv(program.location("shadow_maps"), self.max_maps,
+                     np.arange(SHADOW_UNIT, SHADOW_UNIT + self.max_maps, dtype=np.int32))
+        glUniform2fv(program.location("shadow_planes"), self.max_maps, planes)
+        # The row-major view rotation read as column-major is its transpose, the inverse rotation
+        view_to_world = np.ascontiguousarray(np.asarray(view_matrix, dtype=np.float32)[:3, :3])
+        glUniformMatrix3fv(program.location("view_to_world"), 1, GL_FALSE, view_to_world)
+        glUniform1f(program.location("shadow_bias"), self.bias)
+
+    def release_gpu(self):
+        for light, shadow_map in self.maps.items():
+            shadow_map.release_gpu()
+            light.shadow_map = None
+        self.maps = {}
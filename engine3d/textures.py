@@ -0,0 +1,231 @@
+import hashlib
+import os
+import struct
+import threading
+
+import numpy as np
+
+from PIL import Image
+from OpenGL.GL import *
+from OpenGL.GL.EXT.texture_compression_s3tc import GL_COMPRESSED_RGB_S3TC_DXT1_EXT, GL_COMPRESSED_RGBA_S3TC_DXT5_EXT
+from OpenGL.raw.GL.VERSION.GL_1_3 import glGetCompressedTexImage as gl_get_compressed_tex_image
+
+
+# Preprocessed texture cache: header, one table entry per mip level, then the levels on ALIGNMENT boundaries.
+# The source mtime and size are stored so a changed source file is decoded again
+MAGIC = b"MKE3DTEX"
+VERSION = 1
+ALIGNMENT = 64
+
+HEADER = struct.Struct("<8sIqqIIIII")  # magic, version, source mtime (ns), source size, width, height, channels,
+# internal format (0 - raw bytes), level count
+LEVEL = struct.Struct("<QQII")  # offset, size in bytes, width, height
+
+FILE_EXTENSION = ".mktex"
+
+PIXEL_FORMATS = {3: GL_RGB, 4: GL_RGBA}
+COMPRESSED_FORMATS = {3: GL_COMPRESSED_RGB_S3TC_DXT1_EXT, 4: GL_COMPRESSED_RGBA_S3TC_DXT5_EXT}
+
+
+class TextureImage:
+    def __init__(self, width: int, height: int, channels: int, levels: list, internal_format: int = 0):
+        # levels holds (width, height, data) from the full size image down; a single level leaves the mip chain
+        # to the GPU. internal_format is the compressed GL format of the level data, 0 for raw pixels
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.levels = levels
+        self.internal_format = internal_format
+
+
+def decode_texture(file: str, mipmaps: bool = False) -> TextureImage:
+    # PIL decode without GL calls. Images without an alpha channel, or with a fully opaque one, are kept RGB
+    image = Image.open(file)
+    has_alpha = "A" in image.getbands() or "transparency" in image.info
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    if has_alpha and image.getextrema()[3][0] == 255:
+        image = image.convert("RGB")
+
+    levels = [image]
+    while mipmaps and (levels[-1].width > 1 or levels[-1].height > 1):
+        previous = levels[-1]
+        levels.append(previous.resize((max(previous.width // 2, 1), max(previous.height // 2, 1)), Image.BOX))
+
+    return TextureImage(image.width, image.height, len(image.getbands()),
+                        [(level.width, level.height, level.tobytes()) for level in levels])
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def save_texture_cache(file: str, source_stat: os.stat_result, image: TextureImage):
+    table = []
+    offset = _align(HEADER.size + LEVEL.size * len(image.levels))
+    for width, height, data in image.levels:
+        table.append((offset, len(data), width, height))
+        offset = _align(offset + len(data))
+
+    # Written next to the final name and renamed, a reader never sees a half written file
+    temporary = f"{file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, "wb") as stream:
+        stream.write(HEADER.pack(MAGIC, VERSION, source_stat.st_mtime_ns, source_stat.st_size, image.width,
+                                 image.height, image.channels, image.internal_format, len(image.levels)))
+        for entry in table:
+            stream.write(LEVEL.pack(*entry))
+        for (level_offset, _, _, _), (_, _, data) in zip(table, image.levels):
+            stream.write(b"\0" * (level_offset - stream.tell()))
+            stream.write(data)
+    os.replace(temporary, file)
+
+
+def load_texture_cache(file: str, source_stat: os.stat_result):
+    # None when missing or stale, otherwise the levels are views into a read-only memory map
+    if not os.path.exists(file):
+        return None
+
+    data = np.memmap(file, dtype=np.uint8, mode="r")
+    if len(data) < HEADER.size:
+        return None
+    magic, version, mtime, size, width, height, channels, internal_format, level_count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or mtime != source_stat.st_mtime_ns or size != source_stat.st_size:
+        return None
+
+    levels = []
+    for number in range(level_count):
+        offset, length, level_width, level_height = LEVEL.unpack_from(data, HEADER.size + LEVEL.size * number)
+        levels.append((level_width, level_height, data[offset:offset + length]))
+    return TextureImage(width, height, channels, levels, internal_format)
+
+
+class TextureManager:
+    def __init__(self, mipmaps: bool = True, cache_directory: str = None, compression: bool = False):
+        self.mipmaps = mipmaps
+        self.cache_directory = cache_directory
+        self.compression = compression
+
+        self._by_key = {}
+        self._entries = {}  # texture id -> [key, users]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._by_key)
+
+    @staticmethod
+    def key(file: str) -> tuple:
+        path = os.path.abspath(str(file))
+        return path, os.stat(path).st_mtime_ns
+
+    def load(self, file: str) -> int:
+        key = self.key(file)
+        texture_id = self.acquire(key)
+        if texture_id is None:
+            texture_id = self.upload(key, self.read(file))
+        return texture_id
+
+    def acquire(self, key: tuple):
+        with self._lock:
+            texture_id = self._by_key.get(key)
+            if texture_id is not None:
+                self._entries[texture_id][1] += 1
+            return texture_id
+
+    def release(self, texture_id: int):
+        with self._lock:
+            entry = self._entries.get(texture_id)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._entries[texture_id]
+            del self._by_key[entry[0]]
+        glDeleteTextures(1, [texture_id])
+
+    def cache_file(self, path: str) -> str:
+        name = hashlib.sha1(path.encode()).hexdigest() + ("-dxt" if self.compression else "")
+        return os.path.join(self.cache_directory, name + FILE_EXTENSION)
+
+    def read(self, file: str) -> TextureImage:
+        # Everything up to the GL upload, safe to run on asset loader threads
+        path = os.path.abspath(str(file))
+        if not self.cache_directory:
+            return decode_texture(path)
+
+        source_stat = os.stat(path)
+        cache_file = self.cache_file(path)
+        image = load_texture_cache(cache_file, source_stat)
+        if image is None:
+            # The cache stores the whole mip chain so later runs skip both decoding and mipmap generation.
+            # Compressed levels can only be written once the driver compressed them, see upload()
+            image = decode_texture(path, mipmaps=self.mipmaps)
+            if not self.compression:
+                os.makedirs(self.cache_directory, exist_ok=True)
+                save_texture_cache(cache_file, source_stat, image)
+        return image
+
+    def upload(self, key: tuple, image: TextureImage) -> int:
+        # Two loads of the same file that raced past acquire() share the first upload
+        texture_id = self.acquire(key)
+        if texture_id is not None:
+            return texture_id
+
+        texture_id = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, texture_id)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+
+        pixel_format = PIXEL_FORMATS[image.channels]
+        compress = self.compression and not image.internal_format
+        internal_format = COMPRESSED_FORMATS[image.channels] if compress else pixel_format
+        for level, (width, height, data) in enumerate(image.levels):
+            if image.internal_format:
+                glCompressedTexImage2D(GL_TEXTURE_2D, level, image.internal_format, width, height, 0, data)
+            else:
+                glTexImage2D(GL_TEXTURE_2D, level, internal_format, width, height, 0, pixel_format, GL_UNSIGNED_BYTE,
+                             data)
+
+        mipmapped = len(image.levels) > 1
+        if self.mipmaps and not mipmapped:
+            if bool(glGenerateMipmap):
+                glGenerateMipmap(GL_TEXTURE_2D)
+            else:
+                glTexParameteri(GL_TEXTURE_2D, GL_GENERATE_MIPMAP, GL_TRUE)
+                glTexImage2D(GL_TEXTURE_2D, 0, internal_format, image.width, image.height, 0, pixel_format,
+                             GL_UNSIGNED_BYTE, image.levels[0][2])
+            mipmapped = True
+        if not mipmapped:
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, 0)
+
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR if mipmapped else GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+
+        if compress and self.cache_directory:
+            self.save_compressed(key[0], image, internal_format)
+
+        with self._lock:
+            self._by_key[key] = texture_id
+            self._entries[texture_id] = [key, 1]
+        return texture_id
+
+    def save_compressed(self, path: str, image: TextureImage, internal_format: int):
+        # Reads back the DXT blocks the driver produced for the bound texture. The raw entry point is used, the
+        # PyOpenGL wrapper always reads level 0
+        levels = []
+        for level, (width, height, _) in enumerate(image.levels):
+            size = glGetTexLevelParameteriv(GL_TEXTURE_2D, level, GL_TEXTURE_COMPRESSED_IMAGE_SIZE)
+            blocks = np.empty(size, dtype=np.uint8)
+            gl_get_compressed_tex_image(GL_TEXTURE_2D, level, blocks)
+            levels.append((width, height, blocks.tobytes()))
+        compressed = TextureImage(image.width, image.height, image.channels, levels, internal_format)
+
+        os.makedirs(self.cache_directory, exist_ok=True)
+        save_texture_cache(self.cache_file(path), os.stat(path), compressed)
+
+
+def read_texture(file: str, mipmaps: bool = True, cache_directory: str = None, compression: bool = False):
+    # TextureManager.read() for worker processes, which cannot share the manager
+    return TextureManager(mipmaps, cache_directory, compression).read(file)
+
+
+texture_manager = TextureManager()
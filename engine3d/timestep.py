@@ -0,0 +1,56 @@
+class FixedTimestep:
+    def __init__(self, step: float = 1 / 60, max_substeps: int = 8, max_frame_time: float = 0.25,
+                 time_scale: float = 1.0):
+        self.step = step
+        self.max_substeps = max_substeps
+        self.max_frame_time = max_frame_time
+        self.time_scale = time_scale
+
+        self.accumulated_time = 0.0
+        self.alpha = 0.0
+        self.substeps = 0
+        self.effective_time_scale = time_scale
+
+        self.dropped_time = 0.0
+        self.dropped_steps = 0
+        self.overloaded_frames = 0
+        self.total_steps = 0
+
+    def advance(self, dt: float, step_function) -> int:
+        dt = max(float(dt), 0.0)
+        if dt > self.max_frame_time:
+            # A hitch (window drag, synchronous asset load) is not worth simulating in full
+            self.dropped_time += (dt - self.max_frame_time) * self.time_scale
+            dt = self.max_frame_time
+
+        self.accumulated_time += dt * self.time_scale
+
+        substeps = 0
+        while self.accumulated_time >= self.step and substeps < self.max_substeps:
+            step_function(self.step)
+            self.accumulated_time -= self.step
+            substeps += 1
+
+        if self.accumulated_time >= self.step:
+            # Out of substep budget: keep the fractional part for interpolation and give up on the rest,
+            # so the simulation slows down instead of spiraling into longer and longer frames
+            backlog = self.accumulated_time - self.accumulated_time % self.step
+            self.dropped_time += backlog
+            self.dropped_steps += round(backlog / self.step)
+            self.accumulated_time -= backlog
+            self.overloaded_frames += 1
+
+        self.substeps = substeps
+        self.total_steps += substeps
+        self.alpha = self.accumulated_time / self.step
+        self.effective_time_scale = substeps * self.step / dt if dt > 0 else self.time_scale
+        return substeps
+
+    def set_rate(self, steps_per_second: float):
+        # Keep the interpolation factor when the physics rate changes under load
+        self.accumulated_time = self.alpha * (1 / steps_per_second)
+        self.step = 1 / steps_per_second
+
+    def reset(self):
+        self.accumulated_time = 0.0
+        self.alpha = 0.0
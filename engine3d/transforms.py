@@ -0,0 +1,447 @@
+import numpy as np
+
+from pygame.math import Vector3
+
+
+def euler_model_matrices(positions: np.ndarray, rotations: np.ndarray, dtype=np.float32) -> np.ndarray:
+    # Batched glTranslatef + glRotatef(x) + glRotatef(y) + glRotatef(z), rotations in degrees
+    count = len(positions)
+    sin_x, sin_y, sin_z = np.sin(np.radians(rotations)).T
+    cos_x, cos_y, cos_z = np.cos(np.radians(rotations)).T
+
+    matrices = np.zeros((count, 4, 4), dtype=dtype)
+    matrices[:, 0, 0] = cos_y * cos_z
+    matrices[:, 0, 1] = -cos_y * sin_z
+    matrices[:, 0, 2] = sin_y
+    matrices[:, 1, 0] = cos_x * sin_z + sin_x * sin_y * cos_z
+    matrices[:, 1, 1] = cos_x * cos_z - sin_x * sin_y * sin_z
+    matrices[:, 1, 2] = -sin_x * cos_y
+    matrices[:, 2, 0] = sin_x * sin_z - cos_x * sin_y * cos_z
+    matrices[:, 2, 1] = sin_x * cos_z + cos_x * sin_y * sin_z
+    matrices[:, 2, 2] = cos_x * cos_y
+    matrices[:, :3, 3] = positions
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
+# Quaternions are (w, x, y, z) rows, every function takes and returns arrays of them
+
+def normalize_quaternions(quaternions: np.ndarray) -> np.ndarray:
+    quaternions = np.asarray(quaternions, dtype=np.float64)
+    return quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+
+
+def quaternion_multiply(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    # Rotation by second, then by first
+    first = np.asarray(first, dtype=np.float64)
+    second = np.asarray(second, dtype=np.float64)
+    w1, x1, y1, z1 = first[..., 0], first[..., 1], first[..., 2], first[..., 3]
+    w2, x2, y2, z2 = second[..., 0], second[..., 1], second[..., 2], second[..., 3]
+
+    product = np.empty(np.broadcast_shapes(first.shape, second.shape))
+    product[..., 0] = w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2
+    product[..., 1] = w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2
+    product[..., 2] = w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2
+    product[..., 3] = w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2
+    return product
+
+
+def quaternions_from_axis_angle(axes: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    # Unit axes, angles in radians
+    half = np.asarray(angles, dtype=np.float64)[..., np.newaxis] / 2
+    return np.concatenate((np.cos(half), np.asarray(axes, dtype=np.float64) * np.sin(half)), axis=-1)
+
+
+def quaternions_from_euler(rotations: np.ndarray) -> np.ndarray:
+    # Euler degrees applied like glRotatef(x) + glRotatef(y) + glRotatef(z)
+    half = np.radians(np.asarray(rotations, dtype=np.float64)) / 2
+    cos_x, cos_y, cos_z = np.moveaxis(np.cos(half), -1, 0)
+    sin_x, sin_y, sin_z = np.moveaxis(np.sin(half), -1, 0)
+
+    # Expanded rotate_x * rotate_y * rotate_z
+    quaternions = np.empty(half.shape[:-1] + (4,))
+    quaternions[..., 0] = cos_x * cos_y * cos_z - sin_x * sin_y * sin_z
+    quaternions[..., 1] = sin_x * cos_y * cos_z + cos_x * sin_y * sin_z
+    quaternions[..., 2] = cos_x * sin_y * cos_z - sin_x * cos_y * sin_z
+    quaternions[..., 3] = cos_x * cos_y * sin_z + sin_x * sin_y * cos_z
+    return quaternions
+
+
+def quaternion_matrices(quaternions: np.ndarray) -> np.ndarray:
+    quaternions = np.asarray(quaternions, dtype=np.float64)
+    w, x, y, z = quaternions[..., 0], quaternions[..., 1], quaternions[..., 2], quaternions[..., 3]
+
+    matrices = np.empty(quaternions.shape[:-1] + (3, 3))
+    matrices[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[..., 0, 1] = 2 * (x * y - w * z)
+    matrices[..., 0, 2] = 2 * (x * z + w * y)
+    matrices[..., 1, 0] = 2 * (x * y + w * z)
+    matrices[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[..., 1, 2] = 2 * (y * z - w * x)
+    matrices[..., 2, 0] = 2 * (x * z - w * y)
+    matrices[..., 2, 1] = 2 * (y * z + w * x)
+    matrices[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return matrices
+
+
+def quaternions_to_euler(quaternions: np.ndarray) -> np.ndarray:
+    # Inverse of quaternions_from_euler with y in [-90, 90]. At y = +-90 only x + z is defined, z is set to 0
+    matrices = quaternion_matrices(quaternions)
+    sin_y = np.clip(matrices[..., 0, 2], -1.0, 1.0)
+    locked = np.abs(sin_y) > 1 - 1e-9
+    x = np.where(locked, np.arctan2(matrices[..., 2, 1], matrices[..., 1, 1]),
+                 np.arctan2(-matrices[..., 1, 2], matrices[..., 2, 2]))
+    z = np.where(locked, 0.0, np.arctan2(-matrices[..., 0, 1], matrices[..., 0, 0]))
+    return np.degrees(np.stack((x, np.arcsin(sin_y), z), axis=-1))
+
+
+def slerp(first: np.ndarray, second: np.ndarray, t) -> np.ndarray:
+    first = np.asarray(first, dtype=np.float64)
+    second = np.asarray(second, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[..., np.newaxis]
+    cos_angle = np.sum(first * second, axis=-1, keepdims=True)
+    # q and -q are the same orientation, take the short way
+    second = np.where(cos_angle < 0, -second, second)
+    cos_angle = np.abs(cos_angle)
+
+    angle = np.arccos(np.minimum(cos_angle, 1.0))
+    sin_angle = np.sin(angle)
+    close = sin_angle < 1e-6
+    safe = np.where(close, 1.0, sin_angle)
+    weight_first = np.where(close, 1 - t, np.sin((1 - t) * angle) / safe)
+    weight_second = np.where(close, t, np.sin(t * angle) / safe)
+    return normalize_quaternions(weight_first * first + weight_second * second)
+
+
+def integrate_orientations(orientations: np.ndarray, angular_velocities: np.ndarray, dt: float) -> np.ndarray:
+    # Turn by the world space angular velocities (radians per second) over dt
+    speeds = np.linalg.norm(angular_velocities, axis=-1)
+    axes = angular_velocities / np.where(speeds > 0, speeds, 1.0)[..., np.newaxis]
+    return normalize_quaternions(quaternion_multiply(quaternions_from_axis_angle(axes, speeds * dt), orientations))
+
+
+def model_matrices(positions: np.ndarray, orientations: np.ndarray) -> np.ndarray:
+    count = len(positions)
+    matrices = np.zeros((count, 4, 4))
+    matrices[:, :3, :3] = quaternion_matrices(orientations)
+    matrices[:, :3, 3] = positions
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
+class TrackedVector(Vector3):
+    # A Vector3 that calls on_change(vector) after every in-place edit (v.x = 1, v[0] = 1, v += w, v.normalize_ip()),
+    # so edits of a vector read from a transform or a PhysicsWorld body reach their owner. Vectors computed from it
+    # are detached and behave like plain ones
+    on_change = None
+
+    def __init__(self, value=(0, 0, 0), on_change=None):
+        super().__init__(*value)
+        Vector3.__setattr__(self, "on_change", on_change)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name != "on_change" and self.on_change is not None:
+            self.on_change(self)
+
+
+def _report_edit(name: str):
+    edit = getattr(Vector3, name)
+
+    def tracked_edit(self, *args):
+        result = edit(self, *args)
+        if self.on_change is not None:
+            self.on_change(self)
+        return result
+    return tracked_edit
+
+
+for _name in ("__setitem__", "__iadd__", "__isub__", "__imul__", "__itruediv__", "__ifloordiv__", "update",
+              "normalize_ip", "scale_to_length", "clamp_magnitude_ip", "move_towards_ip", "reflect_ip", "rotate_ip",
+              "rotate_rad_ip", "rotate_x_ip", "rotate_x_rad_ip", "rotate_y_ip", "rotate_y_rad_ip", "rotate_z_ip",
+              "rotate_z_rad_ip", "from_spherical"):
+    setattr(TrackedVector, _name, _report_edit(_name))
+
+
+class Transform:
+    # Scene graph node: position and orientation (a unit quaternion) relative to the parent, rotation is an
+    # Euler degrees view of the orientation. In-place edits of position mark the cached matrices dirty like
+    # assignments, orientation is read-only and has to be assigned
+    hierarchy_version = 0  # bumped by every set_parent, a SceneGraph rebuilds its node order when it changes
+
+    def __init__(self, position=(0, 0, 0), rotation=(0, 0, 0), parent=None):
+        # Bumped on every change of position or rotation
+        self.transform_version = 0
+        self.parent = None
+        self.children = []
+        self._graph = None
+        self._node = None
+        self._local_matrix = None
+        self._local_version = None
+        self._euler = None
+        self._euler_orientation = None
+
+        self.position = position
+        self.rotation = rotation
+
+        self.previous_position = Vector3(*position)
+        self.previous_orientation = self.orientation
+        # transform_version before and after the last physics step (interpolating)
+        self.previous_version = self.transform_version
+        self.step_version = self.transform_version
+
+        if parent is not None:
+            self.set_parent(parent)
+
+    @property
+    def position(self) -> Vector3:
+        return self._position
+
+    @position.setter
+    def position(self, value):
+        self._position = TrackedVector(value, self._moved)
+        self.transform_version += 1
+
+    def _moved(self, vector=None):
+        self.transform_version += 1
+
+    @property
+    def orientation(self) -> np.ndarray:
+        return self._orientation
+
+    @orientation.setter
+    def orientation(self, value):
+        orientation = normalize_quaternions(value)
+        orientation.flags.writeable = False
+        self._orientation = orientation
+        self.transform_version += 1
+
+    @property
+    def rotation(self) -> Vector3:
+        # The assigned angles until the orientation changes, derived from the orientation after that. Compared by
+        # value, PhysicsWorld turns the orientations of its bodies in bulk
+        orientation = tuple(self.orientation)
+        if self._euler_orientation != orientation:
+            self._euler = Vector3(*quaternions_to_euler(self.orientation))
+            self._euler_orientation = orientation
+        return Vector3(self._euler)
+
+    @rotation.setter
+    def rotation(self, value):
+        euler = Vector3(*value)
+        self.orientation = quaternions_from_euler(tuple(euler))
+        self._euler = euler
+        self._euler_orientation = tuple(self.orientation)
+
+    def rotate(self, angle: float, axis):
+        # angle in radians around a unit axis of the parent space
+        turn = quaternions_from_axis_angle(tuple(axis), angle)
+        self.orientation = normalize_quaternions(quaternion_multiply(turn, self.orientation))
+
+    def set_parent(self, parent):
+        # position and rotation are kept, so the node keeps its offset to the new parent rather than its place
+        node = parent
+        while node is not None:
+            if node is self:
+                raise ValueError("a transform cannot be parented to itself or one of its children")
+            node = node.parent
+
+        if self.parent is not None:
+            self.parent.children.remove(self)
+        self.parent = parent
+        if parent is not None:
+            parent.children.append(self)
+        self.transform_version += 1
+        Transform.hierarchy_version += 1
+
+    def store_previous_transform(self):
+        self.previous_position = Vector3(self.position)
+        self.previous_orientation = self.orientation
+        self.previous_version = self.transform_version
+
+    def store_step_version(self):
+        self.step_version = self.transform_version
+
+    @property
+    def interpolating(self) -> bool:
+        # Moved by the last physics step and not since. Nodes moved by other code, like gameplay updates every frame,
+        # are drawn where they are instead of lagging behind between their pose at the step and now
+        return self.previous_version != self.step_version == self.transform_version
+
+    def interpolated_pose(self, alpha: float = 1.0):
+        # (position, orientation) between the last physics step and now
+        if alpha >= 1.0:
+            return self.position, self.orientation
+        alpha = max(alpha, 0.0)
+        orientation = slerp(self.previous_orientation, self.orientation, alpha)
+        return self.previous_position.lerp(self.position, alpha), orientation
+
+    def interpolated_transform(self, alpha: float = 1.0):
+        position, orientation = self.interpolated_pose(alpha)
+        if alpha >= 1.0:
+            return position, self.rotation
+        return position, Vector3(*quaternions_to_euler(orientation))
+
+    def local_matrix(self, alpha: float = 1.0) -> np.ndarray:
+        if alpha < 1.0 and self.interpolating:
+            position, orientation = self.interpolated_pose(alpha)
+            return model_matrices([tuple(position)], [orientation])[0]
+
+        version = self.transform_version
+        if version != self._local_version:
+            self._local_matrix = model_matrices([tuple(self.position)], [self.orientation])[0]
+            self._local_version = version
+        return self._local_matrix
+
+    @property
+    def rotation_matrix(self) -> np.ndarray:
+        # Derived once per change, together with the local matrix
+        return self.local_matrix()[:3, :3]
+
+    def world_matrix(self, alpha: float = 1.0) -> np.ndarray:
+        # Inside a SceneGraph the matrix of its last update(), which already applied its alpha
+        if self._graph is not None:
+            return self._graph.world_matrices[self._node]
+        local = self.local_matrix(alpha)
+        return local if self.parent is None else self.parent.world_matrix(alpha) @ local
+
+    @property
+    def world_position(self) -> np.ndarray:
+        return self.world_matrix()[:3, 3]
+
+    @property
+    def world_version(self) -> int:
+        # Changes whenever the world matrix may have, a parent moving included
+        if self._graph is not None:
+            return int(self._graph.world_versions[self._node])
+        return self.transform_version
+
+
+class SceneGraph:
+    # Local and world matrices of every added node and its ancestors, ordered by depth. update() recomputes
+    # local matrices only for nodes whose transform_version changed (or that are interpolated between physics
+    # steps) and world matrices only below them, one batched product per hierarchy level
+    def __init__(self):
+        self.members = []
+        self.nodes = []
+        self.parents = np.zeros(0, dtype=np.intp)
+        self.local_matrices = np.zeros((0, 4, 4))
+        self.world_matrices = np.zeros((0, 4, 4))
+        self.versions = np.zeros(0, dtype=np.int64)
+        self.world_versions = np.zeros(0, dtype=np.int64)
+        self.interpolated = np.zeros(0, dtype=bool)
+        self.revision = 0
+
+        self.updated_locals = 0
+        self.updated_worlds = 0
+
+        self._levels = []
+        self._hierarchy_version = None
+        self._membership_changed = True
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, node: Transform):
+        self.members.append(node)
+        self._membership_changed = True
+
+    def add_many(self, nodes: list):
+        self.members.extend(nodes)
+        self._membership_changed = True
+
+    def remove(self, node: Transform):
+        self.members.remove(node)
+        self._membership_changed = True
+
+    def rows(self, nodes: list) -> np.ndarray:
+        # Row of every node in the matrix arrays, -1 for nodes outside the graph
+        return np.fromiter((node._node if node._graph is self else -1 for node in nodes), np.intp, len(nodes))
+
+    def _rebuild(self):
+        depths = {}
+        for node in self.members:
+            chain = []
+            while node is not None and id(node) not in depths:
+                chain.append(node)
+                node = node.parent
+            depth = depths[id(node)][0] if node is not None else -1
+            for ancestor in reversed(chain):
+                depth += 1
+                depths[id(ancestor)] = (depth, ancestor)
+
+        for node in self.nodes:
+            if id(node) not in depths:
+                node._graph = node._node = None
+
+        ordered = sorted(depths.values(), key=lambda entry: entry[0])
+        self.nodes = [node for _, node in ordered]
+        for row, node in enumerate(self.nodes):
+            node._graph = self
+            node._node = row
+
+        count = len(self.nodes)
+        self.parents = np.fromiter((node.parent._node if node.parent is not None else -1 for node in self.nodes),
+                                   np.intp, count)
+        level_depths = np.fromiter((depth for depth, _ in ordered), np.intp, count)
+        starts = np.flatnonzero(np.diff(level_depths, prepend=-1))
+        self._levels = list(zip(starts.tolist(), np.append(starts[1:], count).tolist()))
+
+        # Everything is recomputed after a rebuild
+        self.local_matrices = np.zeros((count, 4, 4))
+        self.world_matrices = np.zeros((count, 4, 4))
+        self.versions = np.full(count, -1, dtype=np.int64)
+        self.world_versions = np.zeros(count, dtype=np.int64)
+        self.interpolated = np.zeros(count, dtype=bool)
+        self._hierarchy_version = Transform.hierarchy_version
+        self._membership_changed = False
+        self.revision += 1
+
+    def update(self, alpha: float = 1.0):
+        if self._membership_changed or self._hierarchy_version != Transform.hierarchy_version:
+            self._rebuild()
+
+        nodes = self.nodes
+        count = len(nodes)
+        versions = np.fromiter((node.transform_version for node in nodes), np.int64, count)
+        interpolate = np.zeros(count, dtype=bool)
+        if alpha < 1.0:
+            previous = np.fromiter((node.previous_version for node in nodes), np.int64, count)
+            stepped = np.fromiter((node.step_version for node in nodes), np.int64, count)
+            interpolate = (previous != stepped) & (stepped == versions)
+
+        # Nodes drawn in between two physics steps last frame need their final matrix back
+        dirty = (versions != self.versions) | interpolate | self.interpolated
+        rows = np.flatnonzero(dirty)
+        if len(rows):
+            positions = np.empty((len(rows), 3))
+            orientations = np.empty((len(rows), 4))
+            for index, row in enumerate(rows.tolist()):
+                positions[index] = tuple(nodes[row].position)
+                orientations[index] = nodes[row].orientation
+
+            moving = np.flatnonzero(interpolate[rows])
+            if len(moving):
+                previous_positions = np.array([tuple(nodes[row].previous_position) for row in rows[moving].tolist()])
+                previous_orientations = np.array([nodes[row].previous_orientation for row in rows[moving].tolist()])
+                blend = max(alpha, 0.0)
+                positions[moving] = previous_positions + (positions[moving] - previous_positions) * blend
+                orientations[moving] = slerp(previous_orientations, orientations[moving], blend)
+            self.local_matrices[rows] = model_matrices(positions, orientations)
+            self.versions[rows] = versions[rows]
+        self.interpolated = interpolate
+
+        # A world matrix changes with its local matrix or its parent's, levels are visited from the roots down
+        parents = self.parents
+        for start, stop in self._levels:
+            if start == 0:
+                roots = np.flatnonzero(dirty[:stop])
+                self.world_matrices[roots] = self.local_matrices[roots]
+                continue
+            dirty[start:stop] |= dirty[parents[start:stop]]
+            level = start + np.flatnonzero(dirty[start:stop])
+            self.world_matrices[level] = self.world_matrices[parents[level]] @ self.local_matrices[level]
+        self.world_versions[dirty] += 1
+
+        self.updated_locals = len(rows)
+        self.updated_worlds = int(np.count_nonzero(dirty))
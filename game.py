@@ -1,8 +1,9 @@
-from engine3d import Engine3D, Actor, Camera, Light, HUDElement, load_texture_on_file
-from engine3d.meshes import gen_sphere
+from engine3d import Engine3D, Camera, Light, HUDElement, Transform
+from engine3d.meshes import gen_sphere_lods
 
 from pygame import Vector3
 
+from functools import partial
 import math
 import imgui
 
@@ -127,21 +128,44 @@ class ControlWindow(HUDElement):
                 
                 if changed:
                     self.fps_counter_ref.visible = checked
+
+                imgui.dummy(0, 5)
+
+                frame_times = self.game_ref.frame_pacer.percentiles()
+                imgui.text(f"Target FPS: {self.game_ref.frame_pacer.target_fps:.0f}")
+                imgui.text(f"Frame time p50/p95/p99: {frame_times[50] * 1000:.1f} / "
+                           f"{frame_times[95] * 1000:.1f} / {frame_times[99] * 1000:.1f} ms")
+
+                timestep = self.game_ref.timestep
+                physics = self.game_ref.physics_engine
+                imgui.text(f"Physics substeps: {timestep.substeps}, alpha: {timestep.alpha:.2f}")
+                imgui.text(f"Accumulated: {timestep.accumulated_time * 1000:.1f} ms")
+                imgui.text(f"Dropped: {timestep.dropped_time:.2f} s ({timestep.dropped_steps} steps)")
+                stats = self.game_ref.render_stats
+                imgui.text(f"Actors drawn: {stats.drawn}, culled: {stats.culled}, draw calls: {stats.draw_calls}")
+                imgui.text(f"Texture binds: {stats.texture_binds}, state changes: {stats.state_changes}, "
+                           f"triangles: {stats.triangles}")
+                planets = [actor.result() for actor in (sun_actor, earth_planet, mars_planet) if actor.done()]
+                imgui.text(f"Planet LODs: {' / '.join(str(planet.lod_level) for planet in planets)}")
+                imgui.text(f"Asset uploads: {self.game_ref.assets.last_upload_time * 1000:.1f} ms")
+                shadows = self.game_ref.shadows
+                if shadows is not None:
+                    imgui.text(f"Shadow faces rendered: {shadows.faces_rendered}, cached: {shadows.faces_cached}")
+                scene_graph = self.game_ref.scene_graph
+                imgui.text(f"Transforms updated: {scene_graph.updated_worlds} of {len(scene_graph)}")
+                imgui.text(f"Bodies simulated: {physics.simulated_bodies}, sleeping: {physics.sleeping_bodies}")
             
             imgui.end()
 
 
 control_window = ControlWindow(fps_counter, game)
 
-game.update_loading_progress(0.3, "Loading assets (assets/textures/sun_texture.png)")
-sun_texture = load_texture_on_file(file="assets/textures/sun_texture.png")
-
-game.update_loading_progress(0.4, "Loading assets (assets/textures/earth_planet_texture.png)")
-earth_texture = load_texture_on_file(file="assets/textures/earth_planet_texture.png")
-
-game.update_loading_progress(0.4, "Loading assets (assets/textures/mars_planet_texture.png)")
-mars_texture = load_texture_on_file(file="assets/textures/mars_planet_texture.png")
-
+# Textures, meshes and actors stream in on the asset loader threads while the scene already renders, the
+# loading screen follows their progress and hides once everything is uploaded
+game.update_loading_progress(0.3, "Loading assets (textures)")
+sun_texture = game.load_texture_async(file="assets/textures/sun_texture.png")
+earth_texture = game.load_texture_async(file="assets/textures/earth_planet_texture.png")
+mars_texture = game.load_texture_async(file="assets/textures/mars_planet_texture.png")
 
 game.update_loading_progress(0.6, "Loading scene (lights)")
 light = Light(
@@ -149,37 +173,22 @@ light = Light(
     color=(1.0, 1.0, 1.0),
     ambient=2.3,
     diffuse=8000,
-    specular=0.5
+    specular=0.5,
+    cast_shadows=True
 )
 game.add_light(light)
 
 game.update_loading_progress(0.7, "Loading scene (actors)")
-sun_actor = Actor(
+sun_actor = game.add_game_object_async(
     position=(0, 0, 0),
     rotation=(0, 0, 0),
-    mesh=gen_sphere(radius=3.1, segments=128),
+    mesh=partial(gen_sphere_lods, radius=3.1, segments=(128, 48, 16)),
     texture=sun_texture,
-    collision=True
+    collision=True,
+    # The light sits inside the sun, its surface would shadow the whole system
+    cast_shadows=False
 )
 
-earth_planet = Actor(
-    position=(0, 0, 16),
-    rotation=(0, 0, 0),
-    mesh=gen_sphere(radius=0.8, segments=256),
-    texture=earth_texture,
-    collision=True
-)
-
-mars_planet = Actor(
-    position=(0, 0, 23),
-    rotation=(0, 0, 0),
-    mesh=gen_sphere(radius=1.6, segments=256),
-    texture=mars_texture,
-    collision=True
-)
-
-game.add_game_objects([sun_actor, earth_planet, mars_planet])
-
 orbit_radius = 16
 orbit_radius_2 = 23
 simulation_speed = 1
@@ -188,6 +197,28 @@ rotation_angle_1 = 0
 angle_2 = 11
 rotation_angle_2 = 7
 
+# The planets hang off pivots in the sun, turning a pivot moves its planet along the orbit
+earth_orbit = Transform(rotation=(0, -math.degrees(angle_1), 0))
+mars_orbit = Transform(rotation=(0, -math.degrees(angle_2), 0))
+
+earth_planet = game.add_game_object_async(
+    position=(orbit_radius, 0, 0),
+    rotation=(0, 0, 0),
+    mesh=partial(gen_sphere_lods, radius=0.8, segments=(256, 64, 16)),
+    texture=earth_texture,
+    collision=True,
+    parent=earth_orbit
+)
+
+mars_planet = game.add_game_object_async(
+    position=(orbit_radius_2, 0, 0),
+    rotation=(0, 0, 0),
+    mesh=partial(gen_sphere_lods, radius=1.6, segments=(256, 64, 16)),
+    texture=mars_texture,
+    collision=True,
+    parent=mars_orbit
+)
+
 
 def update_fps_counter():
     fps_counter.update_fps()
@@ -206,27 +237,26 @@ def update_control_window():
 
 
 def update_planet_orbit():
+    if not (earth_planet.done() and mars_planet.done()):
+        return
+
     global angle_1
     global rotation_angle_1
 
     angle_1 += simulation_speed / 90
-    x = math.cos(angle_1) * orbit_radius
-    z = math.sin(angle_1) * orbit_radius
-    earth_planet.position = Vector3(x, 0, z)
+    earth_orbit.rotation = Vector3(0, -math.degrees(angle_1), 0)
 
     rotation_angle_1 += simulation_speed
-    earth_planet.rotation = Vector3(0, rotation_angle_1, 20)
+    earth_planet.result().rotation = Vector3(0, rotation_angle_1, 20)
 
     global angle_2
     global rotation_angle_2
 
     angle_2 += simulation_speed / 270
-    x = math.cos(angle_2) * orbit_radius_2
-    z = math.sin(angle_2) * orbit_radius_2
-    mars_planet.position = Vector3(x, 0, z)
+    mars_orbit.rotation = Vector3(0, -math.degrees(angle_2), 0)
 
     rotation_angle_2 += simulation_speed
-    mars_planet.rotation = Vector3(0, rotation_angle_2, 20)
+    mars_planet.result().rotation = Vector3(0, rotation_angle_2, 20)
 
 
 game.update_loading_progress(0.9, "Loading engine (registering update functions and hud's)")
@@ -238,7 +268,6 @@ game.add_update_function(func=update_fps_counter)
 game.add_update_function(func=update_control_window)
 game.add_update_function(func=update_planet_orbit)
 
-game.update_loading_progress(1.0, "Scene loaded")
-game.finish_loading()
+game.update_loading_progress(0.95, "Streaming assets")
 
 game.run()
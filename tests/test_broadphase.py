@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from pygame.math import Vector3
+
+from engine3d.actor import Actor
+from engine3d.broadphase import BruteForce, SpatialHashGrid, SweepAndPrune
+from engine3d.collision_shapes import CollisionShape
+from engine3d.meshes import gen_cube
+
+
+MESH = gen_cube(1, 1, 1)
+
+
+def random_body(rng: np.random.Generator) -> Actor:
+    shape = CollisionShape.sphere(rng.uniform(0.2, 1.5)) if rng.random() < 0.5 else \
+        CollisionShape.box(rng.uniform(0.2, 1.5, 3))
+    return Actor(tuple(rng.uniform(-10, 10, 3)), (0, 0, 0), MESH, None, collision=rng.random() < 0.9,
+                 physic=rng.random() < 0.7, collision_shape=shape)
+
+
+def pairs(broad_phase) -> list:
+    broad_phase.update()
+    objects = broad_phase.objects
+    return sorted((id(objects[i]), id(objects[j])) for i, j in zip(*broad_phase.find_pairs()))
+
+
+@pytest.mark.parametrize("broad_phase_type", [SweepAndPrune, SpatialHashGrid])
+@pytest.mark.parametrize("seed", range(3))
+def test_add_and_remove_match_brute_force(broad_phase_type, seed):
+    rng = np.random.default_rng(seed)
+    reference = BruteForce()
+    # A small starting capacity makes SweepAndPrune grow several times
+    broad_phase = broad_phase_type(capacity=4) if broad_phase_type is SweepAndPrune else broad_phase_type()
+
+    bodies = []
+    for step in range(40):
+        action = rng.random()
+        if action < 0.4 or len(bodies) < 2:
+            added = [random_body(rng) for _ in range(int(rng.integers(1, 12)))]
+            if rng.random() < 0.5:
+                for body in added:
+                    reference.add(body)
+                    broad_phase.add(body)
+            else:
+                reference.add_many(added)
+                broad_phase.add_many(added)
+            bodies.extend(added)
+        elif action < 0.7:
+            for _ in range(int(rng.integers(1, min(6, len(bodies))))):
+                body = bodies.pop(int(rng.integers(len(bodies))))
+                reference.remove(body)
+                broad_phase.remove(body)
+        else:
+            for body in bodies:
+                body.position += Vector3(*rng.uniform(-1.5, 1.5, 3))
+
+        assert broad_phase.objects == reference.objects
+        assert pairs(broad_phase) == pairs(reference)
+
+    assert len(bodies) > 0
+    if broad_phase_type is SweepAndPrune:
+        assert sorted(broad_phase._order.tolist()) == list(range(len(bodies)))
+
+
+def test_sweep_and_prune_matches_brute_force_in_a_dense_scene():
+    rng = np.random.default_rng(7)
+    bodies = [random_body(rng) for _ in range(600)]
+    for body in bodies:
+        body.position = Vector3(*rng.uniform(-15, 15, 3))
+    # A floor reaching across every strip and a wall along the sweep axis
+    bodies.append(Actor((0, -16, 0), (0, 0, 0), gen_cube(40, 1, 40), None, collision=True))
+    bodies.append(Actor((0, 0, 16), (0, 0, 0), gen_cube(1, 40, 40), None, collision=True))
+
+    reference = BruteForce()
+    broad_phase = SweepAndPrune()
+    reference.add_many(bodies)
+    broad_phase.add_many(bodies)
+
+    assert pairs(broad_phase) == pairs(reference)
+    assert len(pairs(reference)) > 100
@@ -0,0 +1,96 @@
+import pytest
+
+from engine3d.frame_pacer import FramePacer
+
+
+class FakeClock:
+    # Time only moves when the pacer sleeps or a frame does work, reading it takes tick seconds
+    def __init__(self, tick: float = 0.0, oversleep: float = 0.0):
+        self.now = 0.0
+        self.tick = tick
+        self.oversleep = oversleep
+        self.sleeps = []
+
+    def __call__(self):
+        self.now += self.tick
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 0.0) + self.oversleep
+
+
+def run_frames(pacer: FramePacer, clock: FakeClock, count: int, work_time: float):
+    for _ in range(count):
+        pacer.begin_frame()
+        clock.now += work_time
+        pacer.end_frame()
+
+
+def test_frames_are_paced_to_the_target():
+    clock = FakeClock()
+    pacer = FramePacer(60, clock=clock, sleep=clock.sleep, spin=False)
+
+    run_frames(pacer, clock, 120, 0.005)
+
+    assert len(pacer.frame_times) == 119
+    assert all(frame_time == pytest.approx(1 / 60) for frame_time in pacer.frame_times)
+    assert clock.now == pytest.approx(120 / 60)
+
+
+def test_spinning_finishes_the_wait_after_a_short_sleep():
+    clock = FakeClock(tick=1e-5, oversleep=0.003)
+    pacer = FramePacer(60, clock=clock, sleep=clock.sleep, spin_threshold=0.002)
+
+    run_frames(pacer, clock, 120, 0.005)
+
+    # The first sleep leaves spin_threshold to spin, later ones the measured overshoot of the sleeps
+    assert clock.sleeps[0] == pytest.approx(1 / 60 - 0.005 - 0.002, abs=1e-4)
+    assert pacer.sleep_overshoot == pytest.approx(0.003, abs=1e-4)
+    assert clock.sleeps[-1] == pytest.approx(1 / 60 - 0.005 - pacer.sleep_overshoot, abs=1e-4)
+    # Once the overshoot is known the sleeps wake up before the deadline and spinning hits it
+    assert all(frame_time == pytest.approx(1 / 60, abs=1e-4) for frame_time in list(pacer.frame_times)[-40:])
+
+
+def test_slow_frames_are_not_paced():
+    clock = FakeClock()
+    pacer = FramePacer(60, clock=clock, sleep=clock.sleep, spin=False)
+
+    run_frames(pacer, clock, 10, 0.05)
+
+    assert all(frame_time == pytest.approx(0.05) for frame_time in pacer.frame_times)
+
+
+def test_adaptive_fps_drops_under_load_and_recovers():
+    clock = FakeClock()
+    pacer = FramePacer(60, clock=clock, sleep=clock.sleep, spin=False, adaptive=True, min_fps=30)
+
+    run_frames(pacer, clock, pacer.overload_frames - 1, 0.02)
+    assert pacer.target_fps == 60
+    run_frames(pacer, clock, 1, 0.02)
+    assert pacer.target_fps == pytest.approx(60 * pacer.adapt_factor)
+
+    # Sustained overload stops at min_fps
+    run_frames(pacer, clock, pacer.overload_frames * 20, 0.05)
+    assert pacer.target_fps == 30
+
+    # Light frames bring it back up to the requested rate, never past it
+    run_frames(pacer, clock, pacer.recovery_frames * 20, 0.001)
+    assert pacer.target_fps == 60
+    assert pacer.frame_time == pytest.approx(1 / 60)
+
+
+def test_percentiles():
+    clock = FakeClock()
+    pacer = FramePacer(1000, clock=clock, sleep=clock.sleep, spin=False, history_size=100)
+    assert pacer.percentiles() == {50: 0.0, 95: 0.0, 99: 0.0}
+
+    # Frames of 10, 20, ..., 1000 ms plus one frame to close the last
+    for index in range(1, 102):
+        pacer.begin_frame()
+        clock.now += index / 100
+
+    percentiles = pacer.percentiles()
+    assert percentiles[50] == pytest.approx(0.505)
+    assert percentiles[95] == pytest.approx(0.9505)
+    assert percentiles[99] == pytest.approx(0.9901)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from engine3d.importers import load_obj
+
+
+MIXED_OBJ = """\
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+vt 0 0
+vt 1 0
+vt 1 1
+vt 0 1
+vn 0 0 1
+f 1/1 2/2 3/3 4/4
+f 1 2 3
+f 1/1/1 3/3/1 4/4/1
+f 1//1 2//1 4//1
+f -4/-4 -3/-3 -2/-2
+"""
+
+EXPECTED_FACES = [[0, 1, 2], [0, 2, 3], [0, 1, 2], [0, 2, 3], [0, 1, 3], [0, 1, 2]]
+# UV indices of the corners, -1 - no UV
+EXPECTED_UVS = [[0, 1, 2], [0, 2, 3], [-1, -1, -1], [0, 2, 3], [-1, -1, -1], [0, 1, 2]]
+
+
+@pytest.mark.parametrize("chunk_lines", [2, 5, 1 << 16])
+def test_load_obj_with_mixed_face_formats(tmp_path, chunk_lines):
+    path = tmp_path / "mixed.obj"
+    path.write_text(MIXED_OBJ)
+
+    mesh = load_obj(str(path), chunk_lines=chunk_lines, flip_v=False)
+
+    texture_coords = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=np.float32)
+    expected_uvs = np.array([[texture_coords[i] if i >= 0 else (0, 0) for i in face] for face in EXPECTED_UVS])
+    np.testing.assert_array_equal(mesh.faces, EXPECTED_FACES)
+    np.testing.assert_array_equal(mesh.uvs, expected_uvs)
@@ -0,0 +1,17 @@
+import pytest
+
+from engine3d.mesh_cache import MeshCache
+from engine3d.mesh_format import save_mesh, load_mesh_binary
+from engine3d.meshes import gen_sphere
+
+
+@pytest.mark.parametrize("compress_vertices", [False, True])
+def test_memory_report_of_binary_meshes_matches_the_buffers(tmp_path, compress_vertices):
+    path = str(tmp_path / "sphere.mkmesh")
+    save_mesh(path, gen_sphere(1.0, 16))
+    # An atlas region makes the resource interleave its own vertices instead of using the file's vertex block
+    resource = MeshCache(compress_vertices=compress_vertices).acquire(load_mesh_binary(path), (0.0, 0.0, 0.5, 0.5))
+
+    resource.build_vertex_buffers()
+
+    assert resource.memory_report.indexed_bytes == resource.vertex_data.nbytes + resource.index_data.nbytes
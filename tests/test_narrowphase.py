@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from pygame.math import Vector3
+
+from engine3d.actor import Actor
+from engine3d.collision_shapes import CollisionShape
+from engine3d.meshes import gen_cube
+from engine3d.narrowphase import contact_points, contact_rounds, resolve_collisions
+from engine3d.physics import PhysicsWorld
+from engine3d.transforms import normalize_quaternions
+
+
+STATE_ARRAYS = ("positions", "velocities", "angular_velocities")
+
+
+def random_shape(rng: np.random.Generator) -> CollisionShape:
+    kind = rng.integers(4)
+    if kind == 0:
+        return CollisionShape.sphere(rng.uniform(0.4, 1.0))
+    if kind == 1:
+        return CollisionShape.capsule(rng.uniform(0.3, 0.7), rng.uniform(0.0, 0.8), int(rng.integers(3)))
+    return CollisionShape.box(rng.uniform(0.3, 1.0, 3), oriented=kind == 3)
+
+
+def create_world(seed: int, count: int, spread: float) -> PhysicsWorld:
+    rng = np.random.default_rng(seed)
+    mesh = gen_cube(1, 1, 1)
+    world = PhysicsWorld()
+    actors = []
+    for index in range(count):
+        actor = Actor(tuple(rng.uniform(-spread, spread, 3)), (0, 0, 0), mesh, None, collision=True,
+                      physic=index % 5 != 0, mass=rng.uniform(0.5, 3.0), restitution=rng.uniform(0.0, 1.0),
+                      collision_shape=random_shape(rng))
+        actors.append(actor)
+    world.add_objects(actors)
+    for actor in actors:
+        actor.orientation = normalize_quaternions(rng.normal(size=4))
+        actor.velocity = Vector3(*rng.uniform(-3, 3, 3))
+        actor.angular_velocity = Vector3(*rng.uniform(-2, 2, 3))
+        actor.friction = rng.uniform(0.0, 0.8)
+    return world
+
+
+def find_contacts(world: PhysicsWorld):
+    table = world.shape_table()
+    matrices = world.body_matrices()
+    world.update_broad_phase(matrices)
+    first, second, normals, depths = world.narrow_phase(table, matrices, *world.broad_phase.find_pairs())
+    return first, second, normals, depths, contact_points(table, matrices, first, second)
+
+
+def snapshot(world: PhysicsWorld) -> dict:
+    return {name: getattr(world, name)[:world.count].copy() for name in STATE_ARRAYS}
+
+
+def restore(world: PhysicsWorld, state: dict):
+    for name, values in state.items():
+        getattr(world, name)[:world.count] = values
+
+
+def resolve_one_by_one(world: PhysicsWorld, first, second, normals, depths, points):
+    for i, j, normal, depth, point in zip(first.tolist(), second.tolist(), normals.tolist(), depths.tolist(),
+                                          points.tolist()):
+        world.resolve_collision(world.objects[i], world.objects[j], Vector3(normal), depth, Vector3(point))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_contact_rounds_keep_the_pair_order_of_every_body(seed):
+    world = create_world(seed, 40, 2.5)
+    first, second, _, _, _ = find_contacts(world)
+    dynamic = world.physic[:world.count]
+
+    rounds = list(contact_rounds(first, second, dynamic))
+    assert sorted(np.concatenate(rounds).tolist()) == list(range(len(first)))
+
+    # A dynamic body is in one pair of a round at most, and its pairs come up in their original order
+    last_rows = {}
+    for rows in rounds:
+        bodies = [body for row in rows for body in (first[row], second[row]) if dynamic[body]]
+        assert len(bodies) == len(set(bodies))
+        for row in rows:
+            for body in (first[row], second[row]):
+                if dynamic[body]:
+                    assert last_rows.get(body, -1) < row
+                    last_rows[body] = row
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("spread", [2.5, 6.0])
+def test_batched_resolution_matches_scalar(seed, spread):
+    world = create_world(seed, 40, spread)
+    first, second, normals, depths, points = find_contacts(world)
+    if spread < 3:
+        bodies = np.concatenate((first, second))
+        assert len(np.unique(bodies)) < len(bodies)
+
+    start = snapshot(world)
+    resolve_one_by_one(world, first, second, normals, depths, points)
+    expected = snapshot(world)
+    restore(world, start)
+    resolve_collisions(world, first, second, normals, depths, points)
+
+    for name, values in snapshot(world).items():
+        np.testing.assert_allclose(values, expected[name], rtol=0, atol=1e-9, err_msg=name)
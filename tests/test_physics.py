@@ -0,0 +1,123 @@
+import pytest
+from pygame.math import Vector3
+
+from engine3d.actor import Actor
+from engine3d.collision_shapes import CollisionShape
+from engine3d.meshes import gen_cube
+from engine3d.physics import PhysicsEngine, PhysicsWorld
+
+
+MESH = gen_cube(1, 1, 1)
+
+
+def sphere_actor(position, radius: float = 0.5, physic: bool = True) -> Actor:
+    return Actor(position, (0, 0, 0), MESH, None, collision=True, physic=physic,
+                 collision_shape=CollisionShape.sphere(radius))
+
+
+@pytest.mark.parametrize("engine", [PhysicsEngine, PhysicsWorld])
+@pytest.mark.parametrize("origin", [(0, 0, 0), (120, -7, 45)])
+def test_central_collision_does_not_spin(engine, origin):
+    world = engine()
+    first = sphere_actor(Vector3(origin) + Vector3(-0.45, 0, 0))
+    second = sphere_actor(Vector3(origin) + Vector3(0.45, 0, 0))
+    world.add_objects([first, second])
+    first.orientation = (0.8, 0.2, -0.4, 0.4)
+    first.velocity = Vector3(2, 0, 0)
+    second.velocity = Vector3(-1, 0, 0)
+
+    world.handle_collisions()
+
+    assert first.velocity.x < 0 < second.velocity.x
+    assert first.angular_velocity.length() == pytest.approx(0, abs=1e-12)
+    assert second.angular_velocity.length() == pytest.approx(0, abs=1e-12)
+
+
+def create_stack(engine, height: int = 4, x: float = 4.0, z: float = -3.0):
+    # Boxes on a static floor off its center, the floor top is at y = 0
+    world = engine(basic_gravity=Vector3(0, -9.8, 0))
+    floor = Actor((0, -1, 0), (0, 0, 0), gen_cube(20, 1, 20), None, collision=True)
+    box_mesh = gen_cube(0.5, 0.5, 0.5)
+    boxes = [Actor((x, 0.5 + level, z), (0, 0, 0), box_mesh, None, collision=True, physic=True)
+             for level in range(height)]
+    balls = [sphere_actor((x - 3, 0.5, z + 2 * index)) for index in range(3)]
+    world.add_objects([floor] + boxes + balls)
+    return world, floor, boxes + balls
+
+
+@pytest.mark.parametrize("engine", [PhysicsEngine, PhysicsWorld])
+def test_resting_stack_falls_asleep(engine):
+    world, floor, bodies = create_stack(engine)
+
+    simulated = []
+    for _ in range(240):
+        world.update(1 / 60)
+        simulated.append(world.simulated_bodies)
+        assert not floor.sleeping
+
+    assert all(body.sleeping for body in bodies)
+    assert world.sleeping_bodies == len(bodies)
+    # The static floor never takes part in falling asleep and waking up, and is not integrated at rest
+    assert simulated == sorted(simulated, reverse=True)
+    assert simulated[0] == len(bodies)
+    assert simulated[-1] == 0
+
+
+@pytest.mark.parametrize("engine", [PhysicsEngine, PhysicsWorld])
+def test_impulse_wakes_a_sleeping_stack(engine):
+    world, _, bodies = create_stack(engine)
+    for _ in range(240):
+        world.update(1 / 60)
+    boxes, balls = bodies[:4], bodies[4:]
+    resting_height = boxes[-1].position.y
+
+    boxes[-1].apply_impulse(Vector3(0, 3, 0))
+    world.update(1 / 60)
+
+    assert not any(box.sleeping for box in boxes)
+    assert all(ball.sleeping for ball in balls)
+    assert world.simulated_bodies == len(boxes)
+    assert boxes[-1].position.y > resting_height
+
+
+@pytest.mark.parametrize("engine", [PhysicsEngine, PhysicsWorld])
+def test_static_bodies_at_rest_are_not_simulated(engine):
+    world = engine(basic_gravity=Vector3(0, -9.8, 0))
+    planets = [sphere_actor((10 * index, 0, 0), radius=2, physic=False) for index in range(3)]
+    world.add_objects(planets)
+
+    for _ in range(200):
+        world.update(1 / 60)
+    assert world.simulated_bodies == 0
+    assert [tuple(planet.position) for planet in planets] == [(0, 0, 0), (10, 0, 0), (20, 0, 0)]
+
+    # A static body given a velocity still moves, without gravity
+    planets[0].velocity = Vector3(6, 0, 0)
+    world.update(1 / 60)
+    assert world.simulated_bodies == 1
+    assert tuple(planets[0].position) == pytest.approx((0.1, 0, 0))
+
+
+def test_in_place_edits_reach_the_world_arrays():
+    world = PhysicsWorld()
+    actor = sphere_actor((1, 2, 3))
+    world.add_object(actor)
+    version = actor.transform_version
+
+    actor.velocity.x = 4
+    actor.angular_velocity[2] = -1
+    actor.position.y += 5
+    position = actor.position
+    position += Vector3(1, 0, 0)
+
+    assert tuple(world.velocities[0]) == (4, 0, 0)
+    assert tuple(world.angular_velocities[0]) == (0, 0, -1)
+    assert tuple(world.positions[0]) == (2, 7, 3)
+    assert actor.transform_version > version
+    with pytest.raises(ValueError):
+        actor.orientation[0] = 0.5
+    with pytest.raises(ValueError):
+        actor.inv_inertia_tensor[0, 0] = 2
+
+    world.update(1 / 60)
+    assert actor.position.x == pytest.approx(2 + 4 / 60)
@@ -0,0 +1,54 @@
+import itertools
+
+import numpy as np
+
+from engine3d.mesh_cache import MeshCache
+from engine3d.meshes import gen_cube, gen_sphere
+from engine3d.render_queue import DrawPacket, RecordingBackend, RenderQueue
+
+
+def make_packet(resource, texture: int, x: float, tag: int, transparent: bool = False) -> DrawPacket:
+    # The depth only comes from x, the tag in z tells the packets apart in the recorded transforms
+    matrix = np.identity(4)
+    matrix[:3, 3] = (x, 0.0, tag)
+    return DrawPacket(resource, texture, None, matrix[:3, 3], matrix, transparent, x * x, len(resource.faces) * 3, 0)
+
+
+def drawn_packets(backend: RecordingBackend, packets: list) -> list:
+    by_matrix = {tuple(packet.matrix.ravel()): packet for packet in packets}
+    return [by_matrix[call[1]] for call in backend.calls if call[0] == "push_transform"]
+
+
+def test_flush_sorts_packets_and_skips_redundant_state():
+    cache = MeshCache()
+    cube, sphere = sorted((cache.acquire(gen_cube(1, 1, 1)), cache.acquire(gen_sphere(1.0, 8))), key=id)
+
+    # Opaque packets of 2 textures x 2 meshes in a shuffled order, then 2 transparent ones
+    opaque = [make_packet(resource, texture, x, tag)
+              for tag, (x, texture, resource) in enumerate(itertools.product((5.0, 1.0, 3.0, 4.0, 2.0), (2, 1),
+                                                                               (sphere, cube)))]
+    transparent = [make_packet(cube, 1, x, -1 - tag, transparent=True) for tag, x in enumerate((1.5, 6.5))]
+    packets = [opaque[index] for index in np.random.default_rng(3).permutation(len(opaque))] + transparent[::-1]
+
+    backend = RecordingBackend()
+    queue = RenderQueue(backend)
+    for packet in packets:
+        queue.submit(packet)
+    queue.flush()
+
+    drawn = drawn_packets(backend, packets)
+    groups = [(packet.texture, id(packet.resource)) for packet in drawn[:len(opaque)]]
+    assert groups == sorted(groups)
+    for previous, current in zip(drawn, drawn[1:len(opaque)]):
+        if (previous.texture, previous.resource) == (current.texture, current.resource):
+            assert previous.depth < current.depth
+    assert drawn[len(opaque):] == transparent[::-1]
+
+    assert queue.draw_calls == backend.count("draw_elements") == len(packets)
+    # Texture t1 for the opaque and the transparent packets, t2 once; a mesh bind for each of the 5 groups
+    assert queue.texture_binds == backend.count("bind_texture") == 3
+    assert backend.count("bind_mesh") == 5
+    # Out of the 5 state calls per packet plus GL_TEXTURE_2D on and the 4 restores at the end, only the ones that
+    # change something reach GL
+    assert queue.state_changes + queue.redundant_changes == 1 + 5 * len(packets) + 4
+    assert queue.state_changes == 17
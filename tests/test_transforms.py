@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from pygame.math import Vector3
+
+from engine3d.actor import Actor
+from engine3d.core import Engine3D
+from engine3d.meshes import gen_cube
+from engine3d.physics import PhysicsEngine
+from engine3d.timestep import FixedTimestep
+from engine3d.transforms import SceneGraph, Transform, quaternions_to_euler
+
+
+def create_engine(physics) -> Engine3D:
+    # Only the parts of the engine a frame's physics steps and scene graph update use, without a window
+    engine = Engine3D.__new__(Engine3D)
+    engine.scene_graph = SceneGraph()
+    engine.physics_engine = physics
+    engine.physics_engine.scene_graph = engine.scene_graph
+    engine.timestep = FixedTimestep(step=1 / 60)
+    engine.interpolate_transforms = True
+    return engine
+
+
+def test_only_bodies_moved_by_physics_are_interpolated():
+    engine = create_engine(PhysicsEngine())
+    body = Actor((0, 0, 0), (0, 0, 0), gen_cube(1, 1, 1), None, collision=False, physic=True)
+    body.velocity = Vector3(6, 0, 0)
+    orbit = Transform()
+    planet = Actor((5, 0, 0), (0, 0, 0), gen_cube(1, 1, 1), None, collision=False, parent=orbit)
+    engine.physics_engine.add_object(body)
+    engine.scene_graph.add_many([body, planet])
+
+    graph = engine.scene_graph
+    angle = 0.0
+    interpolated_frames = 0
+    # Frames at 150 FPS against 60 physics steps per second, the orbit is turned by gameplay code every frame
+    for _ in range(20):
+        angle += 3.0
+        orbit.rotation = (0, angle, 0)
+        engine.timestep.advance(1 / 150, engine.step_physics)
+        alpha = engine.timestep.alpha
+        graph.update(alpha)
+
+        expected_planet = orbit.local_matrix() @ planet.local_matrix()
+        np.testing.assert_allclose(planet.world_matrix(), expected_planet, atol=1e-12)
+        np.testing.assert_allclose(orbit.local_matrix(alpha), orbit.local_matrix(), atol=1e-12)
+
+        if body.interpolating:
+            blended = body.previous_position.lerp(body.position, alpha)
+            np.testing.assert_allclose(body.world_matrix()[:3, 3], tuple(blended), atol=1e-12)
+            interpolated_frames += 1
+
+    assert engine.timestep.total_steps == 8
+    # Every frame from the first physics step on, the third one
+    assert interpolated_frames == 18
+
+
+
+@pytest.mark.parametrize("create", [
+    lambda position: Transform(position),
+    lambda position: Actor(position, (0, 0, 0), gen_cube(1, 1, 1), None, collision=False),
+], ids=["transform", "actor"])
+def test_in_place_position_edits_mark_the_transform_moved(create):
+    node = create((1, 2, 3))
+    graph = SceneGraph()
+    graph.add(node)
+    graph.update()
+
+    version = node.transform_version
+    node.position.x += 4
+    node.position[2] = 0
+    node.position.normalize_ip()
+    graph.update()
+
+    assert node.transform_version > version
+    np.testing.assert_allclose(node.world_matrix()[:3, 3], tuple(Vector3(5, 2, 0).normalize()), atol=1e-12)
+
+    # A copy is detached from the node
+    copy = Vector3(node.position)
+    copy.x = 10
+    assert node.position.x != 10
+
+
+def test_rotation_reads_back_as_assigned_until_the_orientation_changes():
+    node = Transform(rotation=(380, 0, 0))
+    node.position = (1, 0, 0)
+    assert tuple(node.rotation) == pytest.approx((380, 0, 0))
+
+    node.rotate(np.pi / 2, (0, 1, 0))
+    assert tuple(node.rotation) == pytest.approx(tuple(quaternions_to_euler(node.orientation)))
+    assert node.rotation.x < 360
+    with pytest.raises(ValueError):
+        node.orientation[0] = 1